@@ -0,0 +1 @@
+"""Naia benchmarks folder."""
@@ -0,0 +1,87 @@
+"""
+Compare ingest throughput of the single, batch, and NDJSON stream callback routes.
+
+Delivery is stubbed out so only HTTP handling, routing, CallbackLoggingRoute, and validation are measured. Requests
+are made in-process through an ASGI transport, so no sockets are involved.
+
+    python -m benchmarks.bench_batch_ingest --count 10000 --batch-size 1000
+"""
+
+import argparse
+import asyncio
+import datetime
+from time import perf_counter
+from typing import Any, Dict, List
+from uuid import uuid4
+
+import httpx
+import ujson
+from cryptography.fernet import Fernet
+
+from notify_aia import Naia
+
+_KEY = 'YXNkZmFzZGZhc2RmYXNkZmFzZGZhc2RmYXNkZmFzZGY='
+
+
+def _callback() -> Dict[str, Any]:
+    now = str(datetime.datetime.now(datetime.timezone.utc))
+    return {
+        'url': 'https://localhost/',
+        'encrypted_token': Fernet(_KEY).encrypt(b'bearer token').decode(),
+        'payload': {
+            'notification_id': str(uuid4()),
+            'to': 'bob@example.com',
+            'status': 'delivered',
+            'created_at': now,
+            'completed_at': now,
+            'sent_at': now,
+            'notification_type': 'email',
+        },
+    }
+
+
+async def _noop(*args: Any, **kwargs: Any) -> None:
+    pass
+
+
+async def _single(client: httpx.AsyncClient, callbacks: List[Dict[str, Any]], batch_size: int) -> None:
+    for callback in callbacks:
+        (await client.post('/callback/send', json=callback)).raise_for_status()
+
+
+async def _batch(client: httpx.AsyncClient, callbacks: List[Dict[str, Any]], batch_size: int) -> None:
+    for i in range(0, len(callbacks), batch_size):
+        (await client.post('/callback/send-batch', json=callbacks[i : i + batch_size])).raise_for_status()
+
+
+async def _stream(client: httpx.AsyncClient, callbacks: List[Dict[str, Any]], batch_size: int) -> None:
+    lines = [ujson.dumps(callback) for callback in callbacks]
+    for i in range(0, len(lines), batch_size):
+        body = '\n'.join(lines[i : i + batch_size]).encode()
+        (await client.post('/callback/send-stream', content=body)).raise_for_status()
+
+
+async def main(count: int, batch_size: int) -> None:
+    """Run each ingest mode against the same set of callbacks and print callbacks accepted per second."""
+    app = Naia().initialize_app(encryption_keys=[_KEY])
+    # Only measure ingest
+    app.callback_client.send_record = _noop  # type: ignore[method-assign]
+    app.callback_client.send_records = _noop  # type: ignore[method-assign]
+    callbacks = [_callback() for _ in range(count)]
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url='http://naia') as client:
+        for name, mode in (('single', _single), ('batch', _batch), ('stream', _stream)):
+            start = perf_counter()
+            await mode(client, callbacks, batch_size)
+            elapsed = perf_counter() - start
+            print(f'{name:>6}: {count / elapsed:12,.0f} callbacks/s ({elapsed:.3f}s)')
+    await app.callback_client.close_client()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--count', type=int, default=10_000)
+    parser.add_argument('--batch-size', type=int, default=1_000)
+    args = parser.parse_args()
+    asyncio.run(main(args.count, args.batch_size))
@@ -0,0 +1,79 @@
+"""
+Compare the per-callback cost of building request bodies and headers for every attempt vs once per callback.
+
+"before" converts the model, lets aiohttp serialize it with json=, and builds the headers on every attempt. "after"
+serializes and builds the headers once, each attempt only wraps the same bytes. No requests are made.
+
+    python -m benchmarks.bench_serialization --count 10000 --attempts 1 10
+"""
+
+import argparse
+import datetime
+from time import perf_counter
+from typing import Any, Callable, List
+from uuid import uuid4
+
+import aiohttp
+import ujson
+
+from notify_aia.clients.callback.processing import CallbackAsyncClient, _headers
+from notify_aia.clients.callback.rest import RequestPayload
+
+
+def _payload() -> RequestPayload:
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return RequestPayload(
+        notification_id=uuid4(),
+        to='bob@example.com',
+        status='delivered',
+        created_at=now,
+        completed_at=now,
+        sent_at=now,
+        notification_type='email',
+    )
+
+
+def _before(payload: RequestPayload, attempts: int) -> None:
+    for _ in range(attempts):
+        aiohttp.JsonPayload(CallbackAsyncClient._convert_model(payload), dumps=ujson.dumps)
+        {'Content-Type': 'application/json', 'Authorization': f'Bearer {"bearer token"}'}
+
+
+def _after(payload: RequestPayload, attempts: int) -> None:
+    body = CallbackAsyncClient._serialize(payload)
+    _headers('bearer token')
+    for _ in range(attempts):
+        aiohttp.BytesPayload(body)
+
+
+def _model_dump_json(payload: RequestPayload, attempts: int) -> None:
+    # Reference only, the wire format differs (ISO 8601 datetimes, unescaped non-ASCII)
+    body = payload.model_dump_json().encode()
+    _headers('bearer token')
+    for _ in range(attempts):
+        aiohttp.BytesPayload(body)
+
+
+def main(count: int, attempts: List[int]) -> None:
+    """Time each strategy and print microseconds per callback."""
+    payloads = [_payload() for _ in range(count)]
+    strategies: List[tuple[str, Callable[[RequestPayload, int], Any]]] = [
+        ('before', _before),
+        ('after', _after),
+        ('model_dump_json', _model_dump_json),
+    ]
+    for attempt_count in attempts:
+        for name, strategy in strategies:
+            start = perf_counter()
+            for payload in payloads:
+                strategy(payload, attempt_count)
+            elapsed = perf_counter() - start
+            print(f'{attempt_count:>3} attempt(s) {name:>15}: {elapsed / count * 1e6:8.2f} us/callback')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--count', type=int, default=10_000)
+    parser.add_argument('--attempts', type=int, nargs='+', default=[1, 10])
+    args = parser.parse_args()
+    main(args.count, args.attempts)
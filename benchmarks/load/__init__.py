@@ -0,0 +1 @@
+"""Naia load benchmark folder."""
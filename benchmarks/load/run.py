@@ -0,0 +1,241 @@
+"""
+End-to-end load test: drive /callback/send at a target rate and measure ingest, delivery, memory, and loop lag.
+
+Naia runs under uvicorn in a child process so its peak RSS and event loop lag are its own. The load generator and the
+stub Service run in this process. Everything is on localhost.
+
+    python -m benchmarks.load.run --rate 500 --duration 10 --latency 0.05 --throttle-rate 0.05 --output load.json
+
+Ingest latency is measured from when each request was scheduled to be sent, so a slow server is not hidden by the
+generator falling behind (coordinated omission).
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import multiprocessing
+import platform
+import socket
+from time import monotonic, perf_counter, time
+from typing import Any, Dict, List, Optional
+from uuid import uuid4
+
+import aiohttp
+from cryptography.fernet import Fernet
+
+from benchmarks.load.server import serve
+from benchmarks.load.stub import LATENCY_MODELS, StubService
+from notify_aia import __version__
+
+_KEY = 'YXNkZmFzZGZhc2RmYXNkZmFzZGZhc2RmYXNkZmFzZGY='
+
+
+class LoadGenerator:
+    """Open loop generator of /callback/send requests."""
+
+    def __init__(
+        self,
+        naia_url: str,
+        callback_url: str,
+        rate: float,
+        duration: float,
+        max_outstanding: int,
+    ) -> None:
+        """Initialize the generator."""
+        self.naia_url = naia_url
+        self.callback_url = callback_url
+        self.rate = rate
+        self.duration = duration
+        self.max_outstanding = max_outstanding
+        self.token = Fernet(_KEY).encrypt(b'bearer token').decode()
+        # notification_id: time.time() the request was scheduled
+        self.scheduled: Dict[str, float] = {}
+        self.accepted: List[str] = []
+        self.rejected: int = 0
+        self.skipped: int = 0
+        self.ingest_latencies: List[float] = []
+        self.elapsed: float = 0.0
+
+    async def run(self) -> None:
+        """Send `rate` requests per second for `duration` seconds."""
+        connector = aiohttp.TCPConnector(limit=self.max_outstanding)
+        outstanding = asyncio.Semaphore(self.max_outstanding)
+        tasks = []
+        async with aiohttp.ClientSession(connector=connector) as session:
+            start = monotonic()
+            for i in range(int(self.rate * self.duration)):
+                due = start + i / self.rate
+                await asyncio.sleep(max(0.0, due - monotonic()))
+                if outstanding.locked():
+                    # Count, rather than queue, what cannot be sent on time
+                    self.skipped += 1
+                    continue
+                await outstanding.acquire()
+                tasks.append(asyncio.create_task(self._send(session, due, outstanding)))
+            await asyncio.gather(*tasks)
+            self.elapsed = monotonic() - start
+
+    async def _send(
+        self,
+        session: aiohttp.ClientSession,
+        due: float,
+        outstanding: asyncio.Semaphore,
+    ) -> None:
+        notification_id = str(uuid4())
+        self.scheduled[notification_id] = time() - (monotonic() - due)
+        try:
+            async with session.post(f'{self.naia_url}/callback/send', json=self._callback(notification_id)) as resp:
+                await resp.read()
+                accepted = resp.status == 202
+        except aiohttp.ClientError:
+            accepted = False
+        finally:
+            outstanding.release()
+        self.ingest_latencies.append(monotonic() - due)
+        if accepted:
+            self.accepted.append(notification_id)
+        else:
+            self.rejected += 1
+
+    def _callback(self, notification_id: str) -> Dict[str, Any]:
+        now = str(datetime.datetime.now(datetime.timezone.utc))
+        return {
+            'url': self.callback_url,
+            'encrypted_token': self.token,
+            'payload': {
+                'notification_id': notification_id,
+                'to': 'bob@example.com',
+                'status': 'delivered',
+                'created_at': now,
+                'completed_at': now,
+                'sent_at': now,
+                'notification_type': 'email',
+            },
+        }
+
+
+async def wait_for_deliveries(
+    generator: LoadGenerator,
+    stub: StubService,
+    timeout: float,
+) -> None:
+    """Wait until every accepted callback was delivered, or `timeout` passes without a new delivery."""
+    last_progress = monotonic()
+    delivered = len(stub.delivered)
+    while len(stub.delivered) < len(generator.accepted) and monotonic() - last_progress < timeout:
+        await asyncio.sleep(0.1)
+        if len(stub.delivered) > delivered:
+            delivered = len(stub.delivered)
+            last_progress = monotonic()
+
+
+def percentile(
+    values: List[float],
+    q: float,
+) -> Optional[float]:
+    """Return the `q` percentile (0-100) by nearest rank, None without values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))]
+
+
+def summarize(
+    generator: LoadGenerator,
+    stub: StubService,
+    naia_stats: Dict[str, Any],
+) -> Dict[str, Any]:
+    """Compute the reported results."""
+    delivery = [stub.delivered[nid] - generator.scheduled[nid] for nid in generator.accepted if nid in stub.delivered]
+    delivery_span = max(stub.delivered.values(), default=0.0) - min(generator.scheduled.values(), default=0.0)
+    lags = naia_stats['loop_lag_samples']
+    return {
+        'sent': len(generator.ingest_latencies),
+        'accepted': len(generator.accepted),
+        'rejected': generator.rejected,
+        'skipped': generator.skipped,
+        'delivered': len(delivery),
+        'accepted_per_second': len(generator.accepted) / generator.elapsed if generator.elapsed else 0.0,
+        'delivered_per_second': len(delivery) / delivery_span if delivery_span > 0 else 0.0,
+        'ingest_latency_p50': percentile(generator.ingest_latencies, 50),
+        'ingest_latency_p99': percentile(generator.ingest_latencies, 99),
+        'delivery_latency_p50': percentile(delivery, 50),
+        'delivery_latency_p99': percentile(delivery, 99),
+        'loop_lag_p50': percentile(lags, 50),
+        'loop_lag_p99': percentile(lags, 99),
+        'loop_lag_max': max(lags, default=None),
+        'peak_rss_bytes': naia_stats['peak_rss_bytes'],
+        'retries_pending_at_exit': naia_stats['scheduler_pending'],
+        'stub_responses': {str(status): count for status, count in sorted(stub.responses.items())},
+    }
+
+
+async def main(args: argparse.Namespace) -> Dict[str, Any]:
+    """Run the load test and return the configuration and results."""
+    stub = StubService(
+        latency=args.latency,
+        latency_model=args.latency_model,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        drip_rate=args.drip_rate,
+    )
+    callback_url = await stub.start()
+
+    context = multiprocessing.get_context('spawn')
+    ready, stop, results = context.Event(), context.Event(), context.Queue()
+    port = _free_port()
+    naia = context.Process(target=serve, args=(port, _KEY, ready, stop, results), daemon=True)
+    naia.start()
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, ready.wait, 30)
+        generator = LoadGenerator(f'http://127.0.0.1:{port}', callback_url, args.rate, args.duration, args.outstanding)
+        wall_start = perf_counter()
+        await generator.run()
+        await wait_for_deliveries(generator, stub, args.drain)
+        wall = perf_counter() - wall_start
+    finally:
+        stop.set()
+    naia_stats = await asyncio.get_running_loop().run_in_executor(None, results.get, True, 30)
+    naia.join(10)
+    await stub.stop()
+
+    return {
+        'naia_version': __version__,
+        'python': platform.python_version(),
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'wall_seconds': wall,
+        'config': vars(args),
+        'results': summarize(generator, stub, naia_stats),
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port: int = sock.getsockname()[1]
+        return port
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rate', type=float, default=200, help='requests per second')
+    parser.add_argument('--duration', type=float, default=10, help='seconds of load')
+    parser.add_argument('--outstanding', type=int, default=500, help='maximum requests awaiting a response')
+    parser.add_argument('--latency', type=float, default=0.01, help='mean stub response seconds')
+    parser.add_argument('--latency-model', choices=sorted(LATENCY_MODELS), default='fixed')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of 500 responses')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='fraction of 429 responses')
+    parser.add_argument('--drip-rate', type=float, default=0.0, help='fraction of slowly dripped responses')
+    parser.add_argument('--drain', type=float, default=10, help='seconds without a delivery before giving up')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = _parse_args()
+    report = asyncio.run(main(args))
+    print(json.dumps(report['results'], indent=2))
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
@@ -0,0 +1,73 @@
+"""Run a Naia app under uvicorn in its own process, reporting its event loop lag and peak RSS when it stops."""
+
+import asyncio
+import resource
+import sys
+from multiprocessing.queues import Queue
+from multiprocessing.synchronize import Event
+from time import monotonic
+from typing import Any, Dict, List
+
+import uvicorn
+
+from notify_aia import Naia
+from notify_aia.log import init_logging
+
+# How often the event loop lag is sampled
+_LAG_INTERVAL: float = 0.01
+
+
+def serve(
+    port: int,
+    key: str,
+    ready: Event,
+    stop: Event,
+    results: 'Queue[Dict[str, Any]]',
+) -> None:
+    """Process target: serve until `stop` is set, then put the process statistics on `results`."""
+    asyncio.run(_serve(port, key, ready, stop, results))
+
+
+async def _serve(
+    port: int,
+    key: str,
+    ready: Event,
+    stop: Event,
+    results: 'Queue[Dict[str, Any]]',
+) -> None:
+    # Per request info records would be measured as well
+    init_logging(level='warning')
+    app = Naia().initialize_app(encryption_keys=[key])
+    server = uvicorn.Server(uvicorn.Config(app, host='127.0.0.1', port=port, log_level='warning', access_log=False))
+    lags: List[float] = []
+    serving = asyncio.create_task(server.serve())
+    monitor = asyncio.create_task(_monitor_lag(lags))
+    while not server.started:
+        await asyncio.sleep(0.01)
+    ready.set()
+    while not stop.is_set():
+        await asyncio.sleep(0.05)
+    server.should_exit = True
+    await serving
+    monitor.cancel()
+    results.put(
+        {
+            'loop_lag_samples': lags,
+            'peak_rss_bytes': _peak_rss_bytes(),
+            'scheduler_pending': app.callback_client.retry_scheduler.pending(),
+        }
+    )
+
+
+async def _monitor_lag(lags: List[float]) -> None:
+    """Sample how late the event loop wakes up from a short sleep."""
+    while True:
+        start = monotonic()
+        await asyncio.sleep(_LAG_INTERVAL)
+        lags.append(max(0.0, monotonic() - start - _LAG_INTERVAL))
+
+
+def _peak_rss_bytes() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
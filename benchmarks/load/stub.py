@@ -0,0 +1,119 @@
+"""
+Local stand-in for a Service's callback endpoint.
+
+Responds after a configurable latency, fails a fraction of requests with 500 or 429, and drips a fraction of response
+bodies slowly. The first successful delivery of each notification is recorded so the harness can measure delivery
+latency.
+"""
+
+import asyncio
+import random
+from time import time
+from typing import Callable, Dict, Optional
+
+import ujson
+from aiohttp import web
+
+LATENCY_MODELS: Dict[str, Callable[[float], float]] = {
+    'fixed': lambda mean: mean,
+    'uniform': lambda mean: random.uniform(0, 2 * mean),
+    'exponential': lambda mean: random.expovariate(1 / mean) if mean else 0.0,
+    # Long tailed, the median is about half the mean
+    'lognormal': lambda mean: random.lognormvariate(0, 1) * mean / 1.65,
+}
+
+
+class StubService:
+    """aiohttp server acting as every Service the callbacks are sent to."""
+
+    def __init__(
+        self,
+        latency: float = 0.01,
+        latency_model: str = 'fixed',
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        drip_rate: float = 0.0,
+        drip_chunks: int = 10,
+        drip_interval: float = 0.05,
+    ) -> None:
+        """
+        Initialize the stub.
+
+        Args:
+        ----
+            latency: float
+                Mean seconds before responding
+            latency_model: str
+                One of LATENCY_MODELS
+            error_rate: float
+                Fraction of requests answered with a 500
+            throttle_rate: float
+                Fraction of requests answered with a 429
+            drip_rate: float
+                Fraction of successful responses whose body is sent in `drip_chunks` chunks, `drip_interval` apart
+            drip_chunks: int
+                Chunks in a dripped body
+            drip_interval: float
+                Seconds between dripped chunks
+
+        """
+        self.latency = latency
+        self.sample_latency = LATENCY_MODELS[latency_model]
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.drip_rate = drip_rate
+        self.drip_chunks = drip_chunks
+        self.drip_interval = drip_interval
+        # notification_id: time.time() of the first successful delivery
+        self.delivered: Dict[str, float] = {}
+        self.responses: Dict[int, int] = {}
+        self.url = ''
+        self._runner: Optional[web.AppRunner] = None
+
+    async def start(
+        self,
+        host: str = '127.0.0.1',
+        port: int = 0,
+    ) -> str:
+        """Start serving and return the callback URL."""
+        app = web.Application()
+        app.router.add_post('/callback', self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        self.url = f'http://{host}:{self._runner.addresses[0][1]}/callback'
+        return self.url
+
+    async def stop(self) -> None:
+        """Stop serving."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _handle(self, request: web.Request) -> web.StreamResponse:
+        body = ujson.loads(await request.read())
+        await asyncio.sleep(self.sample_latency(self.latency))
+        roll = random.random()
+        if roll < self.error_rate:
+            return self._respond(500)
+        if roll < self.error_rate + self.throttle_rate:
+            return self._respond(429)
+        self.delivered.setdefault(body['notification_id'], time())
+        if random.random() < self.drip_rate:
+            return await self._drip(request)
+        return self._respond(200)
+
+    def _respond(self, status: int) -> web.Response:
+        self.responses[status] = self.responses.get(status, 0) + 1
+        return web.Response(status=status, text='{}', content_type='application/json')
+
+    async def _drip(self, request: web.Request) -> web.StreamResponse:
+        self.responses[200] = self.responses.get(200, 0) + 1
+        response = web.StreamResponse(status=200)
+        await response.prepare(request)
+        for _ in range(self.drip_chunks):
+            await response.write(b' ')
+            await asyncio.sleep(self.drip_interval)
+        await response.write_eof()
+        return response
@@ -0,0 +1 @@
+"""Naia micro benchmark folder."""
@@ -0,0 +1,93 @@
+"""
+Fixtures for the per-callback CPU micro-benchmarks. Requires pytest-benchmark.
+
+    pytest benchmarks/micro --benchmark-group-by=func
+
+Each stage is measured for a single item and for a batch of BATCH_SIZE items. The batch mean divided by BATCH_SIZE is
+the per-item cost without the per-call overhead of the benchmark itself.
+"""
+
+import datetime
+import os
+from typing import Any, Callable, Dict, Generator, List
+from uuid import uuid4
+
+import pytest
+from cryptography.fernet import Fernet
+
+from notify_aia.auth.encryption import init_encryption, init_token_cache
+from notify_aia.log import close_logging, init_logging
+
+BATCH_SIZE: int = 10_000
+SIZES = [1, BATCH_SIZE]
+
+
+def make_callback() -> Dict[str, Any]:
+    """Return a /callback/send body with a unique notification id."""
+    now = str(datetime.datetime.now(datetime.timezone.utc))
+    return {
+        'url': 'https://example.com/callback',
+        'encrypted_token': 'token',
+        'payload': {
+            'notification_id': str(uuid4()),
+            'to': 'bob@example.com',
+            'status': 'delivered',
+            'created_at': now,
+            'completed_at': now,
+            'sent_at': now,
+            'notification_type': 'email',
+        },
+    }
+
+
+@pytest.fixture(scope='session', autouse=True)
+def quiet_logging() -> Generator[None, Any, None]:
+    """Keep the cost of logging, but write it nowhere."""
+    with open(os.devnull, 'w') as devnull:
+        init_logging(stream=devnull)
+        yield
+        close_logging()
+    init_logging()
+
+
+@pytest.fixture(scope='session')
+def keys() -> List[str]:
+    """Ten Fernet keys."""
+    return [Fernet.generate_key().decode() for _ in range(10)]
+
+
+@pytest.fixture()
+def uncached_encryption() -> Generator[None, Any, None]:
+    """Measure decryption rather than the token cache."""
+    init_token_cache(max_entries=0)
+    yield
+    init_token_cache()
+
+
+@pytest.fixture()
+def callbacks(request: pytest.FixtureRequest) -> List[Dict[str, Any]]:
+    """`request.param` callbacks."""
+    return [make_callback() for _ in range(request.param)]
+
+
+def use_keys(keys: List[str]) -> Fernet:
+    """
+    Initialize encryption with `keys` and return the Fernet tokens should be encrypted with.
+
+    Tokens are encrypted with the oldest key, the last in order, so only each family's first token checks every key.
+    """
+    init_encryption(list(reversed(keys)), legacy_key=keys[0])
+    return Fernet(keys[0])
+
+
+def measure(
+    benchmark: Any,
+    fn: Callable[[], Any],
+    items: int,
+) -> None:
+    """Benchmark `fn`, which processes `items` items, with fewer rounds for batches."""
+    benchmark.extra_info['items'] = items
+    if items == 1:
+        benchmark(fn)
+    else:
+        benchmark.pedantic(fn, rounds=5, warmup_rounds=1)
@@ -0,0 +1,42 @@
+from typing import Any, List
+
+import pytest
+from itsdangerous import URLSafeSerializer
+
+from benchmarks.micro.conftest import SIZES, measure, use_keys
+from notify_aia.auth.encryption import decrypt, decrypt_many, legacy_verify
+
+
+@pytest.mark.usefixtures('uncached_encryption')
+@pytest.mark.parametrize('key_count', [1, 2, 5, 10])
+@pytest.mark.parametrize('size', SIZES)
+def test_decrypt(benchmark: Any, keys: List[str], key_count: int, size: int) -> None:
+    fernet = use_keys(keys[:key_count])
+    tokens = [fernet.encrypt(f'bearer token {i}'.encode()).decode() for i in range(size)]
+    measure(benchmark, lambda: [decrypt(token) for token in tokens], size)
+
+
+@pytest.mark.usefixtures('uncached_encryption')
+@pytest.mark.parametrize('key_count', [1, 10])
+def test_decrypt_many(benchmark: Any, keys: List[str], key_count: int) -> None:
+    fernet = use_keys(keys[:key_count])
+    tokens = [fernet.encrypt(f'bearer token {i}'.encode()).decode() for i in range(SIZES[-1])]
+    measure(benchmark, lambda: decrypt_many(tokens), len(tokens))
+
+
+@pytest.mark.parametrize('size', SIZES)
+def test_decrypt_cached(benchmark: Any, keys: List[str], size: int) -> None:
+    fernet = use_keys(keys[:1])
+    tokens = [fernet.encrypt(f'bearer token {i}'.encode()).decode() for i in range(size)]
+    for token in tokens:
+        decrypt(token)
+    measure(benchmark, lambda: [decrypt(token) for token in tokens], size)
+
+
+@pytest.mark.usefixtures('uncached_encryption')
+@pytest.mark.parametrize('size', SIZES)
+def test_legacy_verify(benchmark: Any, keys: List[str], size: int) -> None:
+    use_keys(keys[:1])
+    serializer = URLSafeSerializer(keys[0], salt='itsdangerous')
+    tokens = [serializer.dumps(f'bearer token {i}') for i in range(size)]
+    measure(benchmark, lambda: [legacy_verify(token, 'itsdangerous') for token in tokens], size)
@@ -0,0 +1,60 @@
+import asyncio
+from typing import Any, Dict, Type
+
+import pytest
+from fastapi import FastAPI
+from fastapi.routing import APIRoute
+from starlette.types import Message
+
+from benchmarks.micro.conftest import SIZES, measure
+from notify_aia.clients.callback.handlers import CallbackLoggingRoute
+
+_SCOPE = {
+    'type': 'http',
+    'asgi': {'version': '3.0'},
+    'http_version': '1.1',
+    'method': 'POST',
+    'scheme': 'http',
+    'path': '/callback/send',
+    'raw_path': b'/callback/send',
+    'root_path': '',
+    'headers': [],
+    'query_string': b'',
+    'server': ('naia', 80),
+    'client': ('127.0.0.1', 1234),
+}
+
+
+async def endpoint() -> Dict[str, str]:
+    return {'message': 'Accepted'}
+
+
+def make_app(route_class: Type[APIRoute]) -> FastAPI:
+    app = FastAPI()
+    app.router.route_class = route_class
+    app.add_api_route('/callback/send', endpoint, methods=['POST'], status_code=202)
+    return app
+
+
+async def receive() -> Message:
+    return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+
+async def send(message: Message) -> None:
+    if message['type'] == 'http.response.start':
+        assert message['status'] == 202, message
+
+
+@pytest.mark.parametrize('route_class', [APIRoute, CallbackLoggingRoute], ids=['APIRoute', 'CallbackLoggingRoute'])
+@pytest.mark.parametrize('size', SIZES)
+def test_route_handler(benchmark: Any, route_class: Type[APIRoute], size: int) -> None:
+    # Requests go through the whole ASGI app, the difference between the two is the CallbackLoggingRoute wrapper
+    app = make_app(route_class)
+    loop = asyncio.new_event_loop()
+
+    async def handle() -> None:
+        for _ in range(size):
+            await app(dict(_SCOPE), receive, send)
+
+    measure(benchmark, lambda: loop.run_until_complete(handle()), size)
+    loop.close()
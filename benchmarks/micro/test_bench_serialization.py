@@ -0,0 +1,37 @@
+from typing import Any, Dict, List
+
+import pytest
+import ujson
+
+from benchmarks.micro.conftest import SIZES, measure
+from notify_aia.clients.callback.processing import CallbackAsyncClient
+from notify_aia.clients.callback.rest import RequestCallback, RequestPayload
+
+
+def payloads(callbacks: List[Dict[str, Any]]) -> List[RequestPayload]:
+    return [RequestCallback.model_validate(callback).payload for callback in callbacks]
+
+
+@pytest.mark.parametrize('callbacks', SIZES, indirect=True)
+def test_convert_model(benchmark: Any, callbacks: List[Dict[str, Any]]) -> None:
+    models = payloads(callbacks)
+    measure(benchmark, lambda: [CallbackAsyncClient._convert_model(model) for model in models], len(models))
+
+
+@pytest.mark.parametrize('callbacks', SIZES, indirect=True)
+def test_ujson_encode(benchmark: Any, callbacks: List[Dict[str, Any]]) -> None:
+    dicts = [CallbackAsyncClient._convert_model(model) for model in payloads(callbacks)]
+    measure(benchmark, lambda: [ujson.dumps(converted).encode() for converted in dicts], len(dicts))
+
+
+@pytest.mark.parametrize('callbacks', SIZES, indirect=True)
+def test_serialize(benchmark: Any, callbacks: List[Dict[str, Any]]) -> None:
+    models = payloads(callbacks)
+    measure(benchmark, lambda: [CallbackAsyncClient._serialize(model) for model in models], len(models))
+
+
+@pytest.mark.parametrize('callbacks', SIZES, indirect=True)
+def test_model_dump_json(benchmark: Any, callbacks: List[Dict[str, Any]]) -> None:
+    # Reference for _serialize, the wire format differs
+    models = payloads(callbacks)
+    measure(benchmark, lambda: [model.model_dump_json().encode() for model in models], len(models))
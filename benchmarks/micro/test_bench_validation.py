@@ -0,0 +1,31 @@
+from typing import Any, Dict, List
+
+import pytest
+import ujson
+from pydantic import UUID4, AwareDatetime, HttpUrl, TypeAdapter
+
+from benchmarks.micro.conftest import SIZES, make_callback, measure
+from notify_aia.clients.callback.rest import RequestCallback
+
+
+@pytest.mark.parametrize('callbacks', SIZES, indirect=True)
+def test_validate_callback(benchmark: Any, callbacks: List[Dict[str, Any]]) -> None:
+    measure(benchmark, lambda: [RequestCallback.model_validate(callback) for callback in callbacks], len(callbacks))
+
+
+@pytest.mark.parametrize('callbacks', SIZES, indirect=True)
+def test_validate_callback_json(benchmark: Any, callbacks: List[Dict[str, Any]]) -> None:
+    bodies = [ujson.dumps(callback).encode() for callback in callbacks]
+    measure(benchmark, lambda: [RequestCallback.model_validate_json(body) for body in bodies], len(bodies))
+
+
+@pytest.mark.parametrize(
+    ('annotation', 'field'),
+    [(HttpUrl, 'url'), (AwareDatetime, 'created_at'), (UUID4, 'notification_id')],
+    ids=['HttpUrl', 'AwareDatetime', 'UUID4'],
+)
+@pytest.mark.parametrize('size', SIZES)
+def test_validate_field(benchmark: Any, annotation: Any, field: str, size: int) -> None:
+    adapter: TypeAdapter[Any] = TypeAdapter(annotation)
+    values = [callback.get(field) or callback['payload'][field] for callback in (make_callback() for _ in range(size))]
+    measure(benchmark, lambda: [adapter.validate_python(value) for value in values], size)
@@ -0,0 +1,209 @@
+"""Naia admission module."""
+
+import asyncio
+from enum import Enum
+from http import HTTPStatus
+from time import monotonic
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from fastapi import Request
+from fastapi.exceptions import HTTPException
+
+from notify_aia.metrics import ADMISSION_REJECTIONS
+from notify_aia.services import LifespanService
+
+
+class Admission(str, Enum):
+    """Whether new callbacks are accepted."""
+
+    ACCEPT = 'accept'
+    # Past a soft limit, callers should retry later
+    THROTTLE = 'throttle'
+    # Past a hard limit, the request is refused as cheaply as possible
+    SHED = 'shed'
+
+
+class AdmissionController(LifespanService):
+    """
+    Decide whether to accept callbacks from how much work is already held in memory.
+
+    Three signals are compared with a soft and a hard limit each:
+
+    - in flight: accepted callbacks whose first attempt has not finished, plus callbacks waiting to be retried
+    - queued bytes: request bytes of those callbacks
+    - event loop lag: how late the loop wakes from a short sleep, smoothed
+
+    Any signal past its hard limit sheds the request, past its soft limit throttles it.
+    """
+
+    def __init__(
+        self,
+        soft_in_flight: int = 10_000,
+        hard_in_flight: int = 50_000,
+        soft_queued_bytes: int = 64 * 1024 * 1024,
+        hard_queued_bytes: int = 256 * 1024 * 1024,
+        soft_loop_lag: float = 0.2,
+        hard_loop_lag: float = 1.0,
+        retry_after: int = 1,
+        lag_interval: float = 0.05,
+    ) -> None:
+        """
+        Initialize the controller.
+
+        Args:
+        ----
+            soft_in_flight: int
+                Callbacks in flight that start throttling
+            hard_in_flight: int
+                Callbacks in flight that start shedding
+            soft_queued_bytes: int
+                Bytes in flight that start throttling
+            hard_queued_bytes: int
+                Bytes in flight that start shedding
+            soft_loop_lag: float
+                Event loop lag, in seconds, that starts throttling
+            hard_loop_lag: float
+                Event loop lag, in seconds, that starts shedding
+            retry_after: int
+                Seconds sent in the Retry-After header of throttled and shed requests
+            lag_interval: float
+                Seconds between event loop lag samples
+
+        """
+        self.soft_in_flight = soft_in_flight
+        self.hard_in_flight = hard_in_flight
+        self.soft_queued_bytes = soft_queued_bytes
+        self.hard_queued_bytes = hard_queued_bytes
+        self.soft_loop_lag = soft_loop_lag
+        self.hard_loop_lag = hard_loop_lag
+        self.retry_after = retry_after
+        self.lag_interval = lag_interval
+
+        self.admitted: int = 0
+        self.admitted_bytes: int = 0
+        self.loop_lag: float = 0.0
+        # Set when the app shuts down, every request is shed
+        self.draining = False
+        # Work held elsewhere, e.g. the retry scheduler, added to the admitted counts
+        self._in_flight_sources: List[Callable[[], int]] = []
+        self._bytes_sources: List[Callable[[], int]] = []
+        self._monitor: Optional[asyncio.Task[None]] = None
+
+    async def start(self) -> None:
+        """Start sampling event loop lag."""
+        self._monitor = asyncio.create_task(self._sample_lag())
+
+    async def stop(self) -> None:
+        """Stop sampling event loop lag."""
+        if self._monitor is not None:
+            self._monitor.cancel()
+            await asyncio.gather(self._monitor, return_exceptions=True)
+            self._monitor = None
+
+    def add_sources(
+        self,
+        in_flight: Callable[[], int],
+        queued_bytes: Callable[[], int],
+    ) -> None:
+        """Count work held outside of the admitted callbacks, e.g. callbacks waiting to be retried."""
+        self._in_flight_sources.append(in_flight)
+        self._bytes_sources.append(queued_bytes)
+
+    def in_flight(self) -> int:
+        """Return the callbacks held in memory."""
+        return self.admitted + sum(source() for source in self._in_flight_sources)
+
+    def queued_bytes(self) -> int:
+        """Return the bytes of the callbacks held in memory."""
+        return self.admitted_bytes + sum(source() for source in self._bytes_sources)
+
+    def check(self) -> Admission:
+        """Return whether a new request should be accepted, throttled, or shed."""
+        in_flight = self.in_flight()
+        queued_bytes = self.queued_bytes()
+        if (
+            self.draining
+            or in_flight >= self.hard_in_flight
+            or queued_bytes >= self.hard_queued_bytes
+            or self.loop_lag >= self.hard_loop_lag
+        ):
+            return Admission.SHED
+        if (
+            in_flight >= self.soft_in_flight
+            or queued_bytes >= self.soft_queued_bytes
+            or self.loop_lag >= self.soft_loop_lag
+        ):
+            return Admission.THROTTLE
+        return Admission.ACCEPT
+
+    def admit(
+        self,
+        count: int,
+        nbytes: int,
+    ) -> None:
+        """Count accepted callbacks until they are released."""
+        self.admitted += count
+        self.admitted_bytes += nbytes
+
+    def release(
+        self,
+        count: int,
+        nbytes: int,
+    ) -> None:
+        """Stop counting callbacks that were attempted or handed to durable storage."""
+        self.admitted -= count
+        self.admitted_bytes -= nbytes
+
+    async def run_admitted(
+        self,
+        count: int,
+        nbytes: int,
+        call: Callable[..., Awaitable[Any]],
+        *args: Any,
+        **kwargs: Any,
+    ) -> None:
+        """Await `call`, counting `count` admitted requests of `nbytes` until it finishes."""
+        self.admit(count, nbytes)
+        try:
+            await call(*args, **kwargs)
+        finally:
+            self.release(count, nbytes)
+
+    def enforce(self) -> None:
+        """Refuse new work with 429 when past a soft admission limit, 503 past a hard limit."""
+        decision = self.check()
+        if decision is Admission.ACCEPT:
+            return
+        ADMISSION_REJECTIONS.inc(decision.value)
+        if decision is Admission.THROTTLE:
+            status_code, detail = HTTPStatus.TOO_MANY_REQUESTS, 'Too many requests in flight, retry later'
+        else:
+            status_code, detail = HTTPStatus.SERVICE_UNAVAILABLE, 'Overloaded, retry later'
+        raise HTTPException(
+            status_code=status_code,
+            detail=detail,
+            headers={'Retry-After': str(self.retry_after)},
+        )
+
+    def stats(self) -> Dict[str, float]:
+        """Return the signals admission is decided on."""
+        return {
+            'draining': self.draining,
+            'in_flight': self.in_flight(),
+            'queued_bytes': self.queued_bytes(),
+            'loop_lag': self.loop_lag,
+        }
+
+    async def _sample_lag(self) -> None:
+        """Keep an exponentially weighted average of how late the loop wakes up."""
+        while True:
+            start = monotonic()
+            await asyncio.sleep(self.lag_interval)
+            lag = max(0.0, monotonic() - start - self.lag_interval)
+            self.loop_lag += 0.2 * (lag - self.loop_lag)
+
+
+def request_bytes(request: Request) -> int:
+    """Return the request body size from its Content-Length, 0 if it was not sent."""
+    content_length = request.headers.get('content-length', '')
+    return int(content_length) if content_length.isdigit() else 0
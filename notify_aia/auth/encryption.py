@@ -1,17 +1,212 @@
 """Naia encryption module."""
 
-from typing import Any, Iterable, Optional, Union
+import asyncio
+import os
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import chain
+from time import monotonic, time
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Sequence, Tuple, Union
 
-from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+from cryptography.fernet import Fernet, InvalidToken
 from itsdangerous import URLSafeSerializer
 from itsdangerous.exc import BadSignature
 
+from notify_aia.metrics import KEY_CHECKS
+
 t_bytes_str = Union[bytes, str]
 t_secret_key = Union[t_bytes_str, Iterable[bytes], Iterable[str]]
 
 _LEGACY_SALT: Optional[t_bytes_str]
 _LEGACY_SERIALIZATION: URLSafeSerializer
-_SYMMETRIC_ENCRYPTION: MultiFernet
+_SYMMETRIC_ENCRYPTION: 'KeyRing'
+
+# Base64 characters of a Fernet token holding its version and the top 52 bits of its timestamp, ~68 minutes
+_FAMILY_CHARS: int = 10
+
+
+class TokenCache:
+    """
+    Bounded cache of verified tokens and what they decrypt to.
+
+    Entries expire `ttl` seconds after they are added and the least recently used entries are evicted to stay within
+    `max_entries` and `max_bytes`. Sizes are estimated with sys.getsizeof.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10_000,
+        max_bytes: int = 8 * 1024 * 1024,
+        ttl: float = 300.0,
+    ) -> None:
+        """Initialize the cache, max_entries of 0 disables it."""
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self.size_bytes: int = 0
+        # key: (value, expires at, size)
+        self._entries: OrderedDict[Hashable, Tuple[Any, float, int]] = OrderedDict()
+        # Batches are verified on the decryption thread pool
+        self._lock = threading.Lock()
+
+    def get(
+        self,
+        key: Hashable,
+    ) -> Optional[Any]:
+        """Return the cached value for `key`, None if it is missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(
+        self,
+        key: Hashable,
+        value: Any,
+    ) -> None:
+        """Cache `value`, evicting the least recently used entries if the cache is full."""
+        if self.max_entries <= 0:
+            return
+        size = sys.getsizeof(key) + sys.getsizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, monotonic() + self.ttl, size)
+            self.size_bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self.size_bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self._lock:
+            self._entries.clear()
+            self.size_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit, miss, and size statistics."""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self._entries),
+            'bytes': self.size_bytes,
+        }
+
+    def _remove(
+        self,
+        key: Hashable,
+    ) -> None:
+        self.size_bytes -= self._entries.pop(key)[2]
+
+
+class KeyRing:
+    """
+    Fernet keys tried in the order most likely to validate each token, with statistics of which keys validate tokens.
+
+    Like MultiFernet, every key is tried until one validates the token, but tokens are first tried with the key that
+    validated the last token of their family: tokens that start with the same version and timestamp prefix, so were
+    encrypted within the same ~68 minutes and almost always with the same key. After a rotation, tokens encrypted with
+    an older key cost one signature check rather than one per newer key. Tokens of a new family try the keys in order.
+    """
+
+    def __init__(
+        self,
+        fernets: Sequence[Fernet],
+        max_families: int = 4096,
+    ) -> None:
+        """
+        Initialize the key ring.
+
+        Args:
+        ----
+            fernets: Sequence[Fernet]
+                Keys, the newest first
+            max_families: int
+                Token families remembered before the least recently used are forgotten
+
+        """
+        if not fernets:
+            raise ValueError('KeyRing requires at least one key')
+        self.fernets = list(fernets)
+        self.max_families = max_families
+        self._labels = [str(i) for i in range(len(self.fernets))]
+        self._hits = [0] * len(self.fernets)
+        self._misses = [0] * len(self.fernets)
+        self._last_hit: List[Optional[float]] = [None] * len(self.fernets)
+        # Token family: position of the key that validated its last token
+        self._families: OrderedDict[str, int] = OrderedDict()
+        # Tokens are decrypted on the decryption thread pool
+        self._lock = threading.Lock()
+
+    def decrypt(
+        self,
+        token: t_bytes_str,
+    ) -> bytes:
+        """Return the plaintext of `token`. Raises InvalidToken if no key validates it."""
+        family = _token_family(token)
+        with self._lock:
+            first = self._families.get(family, 0)
+        for position in chain((first,), (i for i in range(len(self.fernets)) if i != first)):
+            try:
+                plaintext = self.fernets[position].decrypt(token)
+            except InvalidToken:
+                self._record(position, None)
+                continue
+            self._record(position, family)
+            return plaintext
+        raise InvalidToken
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Return each key's tokens validated, failed checks, last validation (time.time()), and families it owns."""
+        with self._lock:
+            owned = [0] * len(self.fernets)
+            for position in self._families.values():
+                owned[position] += 1
+            return [
+                {
+                    'key': position,
+                    'hits': self._hits[position],
+                    'misses': self._misses[position],
+                    'last_hit': self._last_hit[position],
+                    'families': owned[position],
+                }
+                for position in range(len(self.fernets))
+            ]
+
+    def _record(
+        self,
+        position: int,
+        family: Optional[str],
+    ) -> None:
+        """Count a check by the key at `position`, which validated a token of `family` unless it is None."""
+        KEY_CHECKS.inc(self._labels[position], 'miss' if family is None else 'hit')
+        with self._lock:
+            if family is None:
+                self._misses[position] += 1
+                return
+            self._hits[position] += 1
+            self._last_hit[position] = time()
+            self._families[family] = position
+            self._families.move_to_end(family)
+            if len(self._families) > self.max_families:
+                self._families.popitem(last=False)
+
+
+_TOKEN_CACHE: TokenCache = TokenCache()
+_DECRYPTION_EXECUTOR: Optional[ThreadPoolExecutor] = None
 
 
 def init_encryption(
@@ -34,13 +229,72 @@ def init_encryption(
     """
     global _SYMMETRIC_ENCRYPTION, _LEGACY_SALT, _LEGACY_SERIALIZATION
     # Makes key rotations less of a lift - Key rotation would be a separate, deliberate action against the data store
-    _SYMMETRIC_ENCRYPTION = MultiFernet([Fernet(k) for k in b64_keys])
+    _SYMMETRIC_ENCRYPTION = KeyRing([Fernet(k) for k in b64_keys])
+    # Tokens verified with the previous keys may no longer be valid
+    _TOKEN_CACHE.clear()
 
     if legacy_key:
         _LEGACY_SERIALIZATION = URLSafeSerializer(secret_key=legacy_key, salt=legacy_salt)
         _LEGACY_SALT = legacy_salt
 
 
+def init_token_cache(
+    max_entries: int = 10_000,
+    max_bytes: int = 8 * 1024 * 1024,
+    ttl: float = 300.0,
+) -> None:
+    """
+    Configure the cache of decrypted and verified tokens.
+
+    Args:
+    ----
+        max_entries: int
+            Maximum tokens cached, 0 disables the cache
+        max_bytes: int
+            Approximate memory cap for the cache
+        ttl: float
+            Seconds a token is cached for
+
+    """
+    global _TOKEN_CACHE
+    _TOKEN_CACHE = TokenCache(max_entries=max_entries, max_bytes=max_bytes, ttl=ttl)
+
+
+def token_cache_stats() -> Dict[str, int]:
+    """Return hit, miss, and size statistics for the token cache."""
+    return _TOKEN_CACHE.stats()
+
+
+def key_stats() -> List[Dict[str, Any]]:
+    """
+    Return statistics for each encryption key, in the order given to init_encryption.
+
+    A key with no recent `last_hit` no longer validates tokens and can be retired once no stored token needs it.
+    """
+    return _SYMMETRIC_ENCRYPTION.stats()
+
+
+def init_decryption_executor(
+    max_workers: Optional[int] = None,
+) -> None:
+    """
+    Configure the thread pool used by decrypt_many_async and legacy_verify_many_async.
+
+    Args:
+    ----
+        max_workers: Optional[int]
+            Threads in the pool, defaults to the number of CPUs up to 8
+
+    """
+    global _DECRYPTION_EXECUTOR
+    if _DECRYPTION_EXECUTOR is not None:
+        _DECRYPTION_EXECUTOR.shutdown(wait=False)
+    _DECRYPTION_EXECUTOR = ThreadPoolExecutor(
+        max_workers=max_workers or min(8, os.cpu_count() or 1),
+        thread_name_prefix='naia-decrypt',
+    )
+
+
 def decrypt(
     thing_to_decrypt: t_bytes_str,
 ) -> str:
@@ -57,14 +311,54 @@ def decrypt(
         str: The decrypted string
 
     """
-    decrypted: str = ''
-    try:
-        decrypted = (_SYMMETRIC_ENCRYPTION.decrypt(thing_to_decrypt)).decode()
-    except (AttributeError, NameError) as exc:
-        raise RuntimeError(f'init_encryption() must be called with `keys` set prior to decryption: {exc}')
-    except InvalidToken as exc:
-        raise ValueError(f'Encryption.decrypt signature validation failed: {exc}')
-    return decrypted
+    cached: Optional[str] = _TOKEN_CACHE.get(thing_to_decrypt)
+    if cached is not None:
+        return cached
+    return _decrypt_uncached(thing_to_decrypt)
+
+
+def decrypt_many(
+    things_to_decrypt: Sequence[t_bytes_str],
+) -> List[Union[str, ValueError]]:
+    """
+    Decrypt a batch of strings.
+
+    Args:
+    ----
+        things_to_decrypt: Sequence[t_bytes_str]
+            The objects to be decrypted
+
+    Returns:
+    -------
+        List[Union[str, ValueError]]: The decrypted strings, or the ValueError for any that failed validation
+
+    """
+    return [_verify_or_error(decrypt, thing) for thing in things_to_decrypt]
+
+
+async def decrypt_many_async(
+    things_to_decrypt: Sequence[t_bytes_str],
+    chunk_size: int = 64,
+) -> List[Union[str, ValueError]]:
+    """
+    Decrypt a batch of strings on the decryption thread pool, keeping the crypto work off the event loop.
+
+    Cached tokens are resolved on the event loop, the rest are split into chunks of `chunk_size` that are decrypted
+    in parallel.
+
+    Args:
+    ----
+        things_to_decrypt: Sequence[t_bytes_str]
+            The objects to be decrypted
+        chunk_size: int
+            Tokens per thread pool task
+
+    Returns:
+    -------
+        List[Union[str, ValueError]]: The decrypted strings, or the ValueError for any that failed validation
+
+    """
+    return await _verify_many_async(_decrypt_uncached, list(things_to_decrypt), list(things_to_decrypt), chunk_size)
 
 
 def legacy_verify(
@@ -88,6 +382,85 @@ def legacy_verify(
         Any: The verfiied object
 
     """
+    decoded: Any = _TOKEN_CACHE.get(_legacy_cache_key(thing_to_decode, salt))
+    if decoded is not None:
+        return decoded
+    return _legacy_verify_uncached(thing_to_decode, salt)
+
+
+def legacy_verify_many(
+    things_to_decode: Sequence[t_bytes_str],
+    salt: t_bytes_str = b'',
+) -> List[Any]:
+    """
+    Decode a batch of signed strings.
+
+    Args:
+    ----
+        things_to_decode: Sequence[t_bytes_str]
+            The objects to be decoded
+        salt: t_bytes_str
+            The salt to use during this validation
+
+    Returns:
+    -------
+        List[Any]: The verified objects, or the ValueError for any that failed validation
+
+    """
+    return [_verify_or_error(legacy_verify, thing, salt) for thing in things_to_decode]
+
+
+async def legacy_verify_many_async(
+    things_to_decode: Sequence[t_bytes_str],
+    salt: t_bytes_str = b'',
+    chunk_size: int = 64,
+) -> List[Any]:
+    """
+    Decode a batch of signed strings on the decryption thread pool.
+
+    Args:
+    ----
+        things_to_decode: Sequence[t_bytes_str]
+            The objects to be decoded
+        salt: t_bytes_str
+            The salt to use during this validation
+        chunk_size: int
+            Tokens per thread pool task
+
+    Returns:
+    -------
+        List[Any]: The verified objects, or the ValueError for any that failed validation
+
+    """
+    keys = [_legacy_cache_key(thing, salt) for thing in things_to_decode]
+    return await _verify_many_async(
+        partial(_legacy_verify_uncached, salt=salt),
+        list(things_to_decode),
+        keys,
+        chunk_size,
+    )
+
+
+def _decrypt_uncached(
+    thing_to_decrypt: t_bytes_str,
+) -> str:
+    """Decrypt without consulting the cache, caching the result."""
+    decrypted: str = ''
+    try:
+        decrypted = (_SYMMETRIC_ENCRYPTION.decrypt(thing_to_decrypt)).decode()
+    except (AttributeError, NameError) as exc:
+        raise RuntimeError(f'init_encryption() must be called with `keys` set prior to decryption: {exc}')
+    except InvalidToken as exc:
+        raise ValueError(f'Encryption.decrypt signature validation failed: {exc}')
+    _TOKEN_CACHE.put(thing_to_decrypt, decrypted)
+    return decrypted
+
+
+def _legacy_verify_uncached(
+    thing_to_decode: t_bytes_str,
+    salt: t_bytes_str = b'',
+) -> Any:
+    """Verify without consulting the cache, caching the result."""
     decoded: Any = ''
     try:
         decoded = _LEGACY_SERIALIZATION.loads(thing_to_decode, salt=salt or _LEGACY_SALT)
@@ -95,4 +468,77 @@ def legacy_verify(
         raise RuntimeError(f'init_encryption() must be called prior to decryption: {exc}')
     except BadSignature as exc:
         raise ValueError(f'Encryption.decrypt signature validation failed: {exc}')
+    _TOKEN_CACHE.put(_legacy_cache_key(thing_to_decode, salt), decoded)
     return decoded
+
+
+def _token_family(token: t_bytes_str) -> str:
+    """Return the family of a Fernet token, the prefix shared by tokens encrypted around the same time."""
+    prefix = token[:_FAMILY_CHARS]
+    return prefix.decode('latin-1') if isinstance(prefix, bytes) else prefix
+
+
+def _legacy_cache_key(
+    thing_to_decode: t_bytes_str,
+    salt: t_bytes_str,
+) -> Hashable:
+    return ('legacy', thing_to_decode, salt)
+
+
+def _verify_or_error(
+    verify: Callable[..., Any],
+    *args: Any,
+) -> Any:
+    """Return the verified value, or the ValueError if validation failed."""
+    try:
+        return verify(*args)
+    except ValueError as exc:
+        return exc
+
+
+async def _verify_many_async(
+    verify_uncached: Callable[[t_bytes_str], Any],
+    things: List[t_bytes_str],
+    keys: Sequence[Hashable],
+    chunk_size: int,
+) -> List[Any]:
+    """Resolve cached values on the loop and verify each distinct miss once, in chunks, on the thread pool."""
+    if _DECRYPTION_EXECUTOR is None:
+        init_decryption_executor()
+
+    results: List[Any] = [_TOKEN_CACHE.get(key) for key in keys]
+    positions = _group_misses(results, keys)
+    loop = asyncio.get_running_loop()
+    chunks = [positions[i : i + chunk_size] for i in range(0, len(positions), chunk_size)]
+    verified = await asyncio.gather(
+        *(
+            loop.run_in_executor(
+                _DECRYPTION_EXECUTOR,
+                partial(_verify_chunk, verify_uncached, [things[indexes[0]] for indexes in chunk]),
+            )
+            for chunk in chunks
+        )
+    )
+    for indexes, value in zip((indexes for chunk in chunks for indexes in chunk), chain.from_iterable(verified)):
+        for i in indexes:
+            results[i] = value
+    return results
+
+
+def _group_misses(
+    results: List[Any],
+    keys: Sequence[Hashable],
+) -> List[List[int]]:
+    """Return the positions of each distinct uncached key, a batch usually repeats the same few tokens."""
+    misses: Dict[Hashable, List[int]] = {}
+    for i, result in enumerate(results):
+        if result is None:
+            misses.setdefault(keys[i], []).append(i)
+    return list(misses.values())
+
+
+def _verify_chunk(
+    verify_uncached: Callable[[t_bytes_str], Any],
+    things: List[t_bytes_str],
+) -> List[Any]:
+    return [_verify_or_error(verify_uncached, thing) for thing in things]
@@ -1,11 +1,40 @@
 """Naia async_client module."""
 
+from __future__ import annotations
+
 import asyncio
-from abc import ABCMeta
-from typing import Optional
+from abc import ABCMeta, abstractmethod
+from random import random
+from time import monotonic
+from typing import TYPE_CHECKING, Awaitable, Callable, Generic, List, Optional, Sequence, TypeVar
 
 import aiohttp
 import ujson
+from aiohttp.abc import AbstractResolver
+from tenacity.retry import retry_base
+from tenacity.stop import stop_base
+from tenacity.wait import wait_base
+
+from notify_aia.clients.breaker import CircuitBreaker
+from notify_aia.clients.fairness import DeficitRoundRobin
+from notify_aia.clients.lanes import DEFAULT_LANE, Lane
+from notify_aia.clients.limiter import AdaptiveConcurrencyLimiter
+from notify_aia.clients.resolver import CachingResolver
+from notify_aia.clients.retry import RETRY_CRITERIA, RETRY_STOP, RETRY_WAIT, is_overload, retry_delay
+from notify_aia.clients.scheduler import RecordType, RetryScheduler
+from notify_aia.log import log
+
+if TYPE_CHECKING:  # pragma: no cover
+    from notify_aia.clients.tracing import t_phase_sink
+
+T = TypeVar('T')
+
+# Seconds an attempt for a host that cannot take another request is held back before checking again, see busy_delay
+_BUSY_DELAY: float = 0.1
+
+
+class DeadlineExceeded(Exception):
+    """A request's deadline passed while it waited for a slot, before it was made."""
 
 
 class AsyncClient(metaclass=ABCMeta):
@@ -20,9 +49,31 @@ class AsyncClient(metaclass=ABCMeta):
         self,
         connector: Optional[aiohttp.TCPConnector] = None,
         timeout: Optional[aiohttp.ClientTimeout] = None,
+        trace_sinks: Optional[Sequence[t_phase_sink]] = None,
+        resolver: Optional[AbstractResolver] = None,
     ) -> None:
-        """Initialize the AsyncClient."""
+        """
+        Initialize the AsyncClient.
+
+        Args:
+        ----
+            connector: Optional[aiohttp.TCPConnector]
+                Connection pool, 50 connections per host by default
+            timeout: Optional[aiohttp.ClientTimeout]
+                Request timeouts, 10 seconds total by default
+            trace_sinks: Optional[Sequence[Callable[[RequestPhases], None]]]
+                Receive the phase timings of every request. Phase tracing is not installed if there are none.
+            resolver: Optional[AbstractResolver]
+                DNS resolver of the default connector, a CachingResolver by default. Unused if `connector` is given.
+
+        """
         self._client: Optional[aiohttp.ClientSession] = None
+        self.trace_configs: List[aiohttp.TraceConfig] = []
+        if trace_sinks:
+            # Only import this if it's being used
+            from notify_aia.clients.tracing import phase_trace_config
+
+            self.trace_configs.append(phase_trace_config(trace_sinks))
         default_timeout_total: int = 10
         default_host_pool_size: int = 50
         default_dns_cache_duration: int = 2 * 60
@@ -32,11 +83,20 @@ class AsyncClient(metaclass=ABCMeta):
         )
         # TCPConnector fails with a deprecation warning if the event loop is not active. assert for lower envs
         assert asyncio.get_running_loop() is not None
-        self.connector = connector or aiohttp.TCPConnector(
-            # Awaits a future in `connect` of aiohttp.connector.BaseConnector so one bad host does not block all
-            limit_per_host=default_host_pool_size,
-            ttl_dns_cache=default_dns_cache_duration,
-        )
+        # Closed with the client, None if the connector was given
+        self.resolver: Optional[AbstractResolver] = None
+        if connector is None:
+            self.resolver = resolver or CachingResolver(ttl=default_dns_cache_duration)
+            connector = aiohttp.TCPConnector(
+                # Awaits a future in `connect` of aiohttp.connector.BaseConnector so one bad host does not block all
+                limit_per_host=default_host_pool_size,
+                resolver=self.resolver,
+                # The resolver caches and rotates addresses, the connector's cache would hide its prefetch and metrics
+                use_dns_cache=False,
+            )
+        self.connector = connector
+        # Sockets a single host may use, the total limit if per-host is unlimited (0)
+        self.host_pool_size: int = self.connector.limit_per_host or self.connector.limit or default_host_pool_size
 
     def __del__(self) -> None:
         """Protection to ensure clients are being closed correctly."""
@@ -51,8 +111,9 @@ class AsyncClient(metaclass=ABCMeta):
                 timeout=self.timeout,
                 connector=self.connector,
                 json_serialize=ujson.dumps,
+                trace_configs=self.trace_configs or None,
             )
-            print('Created aiohttp.ClientSession')
+            log('info', 'http.session_created')
         return self._client
 
     async def close_client(self) -> None:
@@ -60,6 +121,230 @@ class AsyncClient(metaclass=ABCMeta):
         if self._client:
             await self._client.close()
             self._client = None
-            print('Closed aiohttp.ClientSession')
+            log('info', 'http.session_closed')
             # TODO: Remove with aiohttp 4.0 - https://github.com/aio-libs/aiohttp/issues/1925#issuecomment-715977247
             await asyncio.sleep(0.250)
+        if self.resolver is not None:
+            # Not owned by the connector, so not closed with it
+            await self.resolver.close()
+
+
+class RetryingAsyncClient(AsyncClient, Generic[RecordType]):
+    """
+    AsyncClient limiting its requests per host and retrying them with a RetryScheduler.
+
+    Each request goes through its host's circuit breaker, concurrency limit, and fair share of the connector's
+    connections. Failed attempts are held by the retry scheduler until their retry is due. Subclasses make requests
+    with _send and implement _attempt_scheduled, which the retry scheduler calls with each due record. Pass one
+    client's connector, limiter, breaker, and fair scheduler to another to share them.
+    """
+
+    def __init__(
+        self,
+        connector: Optional[aiohttp.TCPConnector] = None,
+        timeout: Optional[aiohttp.ClientTimeout] = None,
+        trace_sinks: Optional[Sequence[t_phase_sink]] = None,
+        resolver: Optional[AbstractResolver] = None,
+    ) -> None:
+        """Initialize the class. See AsyncClient for the arguments."""
+        super().__init__(connector=connector, timeout=timeout, trace_sinks=trace_sinks, resolver=resolver)
+
+        # Intialize retry properties
+        self.set_retry_criteria()
+        self.set_retry_stop()
+        self.set_retry_wait()
+        self.set_concurrency_limiter()
+        self.set_fair_scheduler()
+        self.set_circuit_breaker()
+        self.set_retry_scheduler()
+
+    def set_retry_criteria(
+        self,
+        retry_criteria: Optional[retry_base] = None,
+    ) -> None:
+        """Customize retry criteria."""
+        self._retry_criteria = retry_criteria or RETRY_CRITERIA
+
+    def set_retry_stop(
+        self,
+        stop_criteria: Optional[stop_base] = None,
+    ) -> None:
+        """Customize stop criteria."""
+        self._retry_stop = stop_criteria or RETRY_STOP
+
+    def set_retry_wait(
+        self,
+        wait_criteria: Optional[wait_base] = None,
+    ) -> None:
+        """Customize delay between retries."""
+        self._retry_wait = wait_criteria or RETRY_WAIT
+
+    def set_concurrency_limiter(
+        self,
+        limiter: Optional[AdaptiveConcurrencyLimiter] = None,
+    ) -> None:
+        """Customize the per-host concurrency limiter."""
+        self._concurrency_limiter = limiter or AdaptiveConcurrencyLimiter(max_limit=self.host_pool_size)
+
+    @property
+    def concurrency_limiter(self) -> AdaptiveConcurrencyLimiter:
+        """Limiter of the requests in flight to each host."""
+        return self._concurrency_limiter
+
+    def host_limits(self) -> dict[str, int]:
+        """Return the current concurrency limit of every host."""
+        return self._concurrency_limiter.limits()
+
+    def in_flight(self) -> int:
+        """Return the requests in flight to all hosts."""
+        return self._concurrency_limiter.in_flight()
+
+    def set_fair_scheduler(
+        self,
+        scheduler: Optional[DeficitRoundRobin] = None,
+    ) -> None:
+        """Customize how the connector's connections are shared between hosts, e.g. with per-host weights."""
+        self._fair_scheduler = scheduler or DeficitRoundRobin(capacity=self.connector.limit)
+
+    @property
+    def fair_scheduler(self) -> DeficitRoundRobin:
+        """Scheduler sharing the connector's connections between hosts."""
+        return self._fair_scheduler
+
+    def set_circuit_breaker(
+        self,
+        breaker: Optional[CircuitBreaker] = None,
+    ) -> None:
+        """Customize the per-host circuit breaker consulted before each attempt."""
+        self._circuit_breaker = breaker or CircuitBreaker()
+
+    @property
+    def circuit_breaker(self) -> CircuitBreaker:
+        """Breaker consulted before each attempt."""
+        return self._circuit_breaker
+
+    def host_circuits(self) -> dict[str, str]:
+        """Return the circuit state of every host."""
+        return self._circuit_breaker.states()
+
+    def host_capacity(
+        self,
+        host: str,
+    ) -> int:
+        """Return the attempts `host` can take now without waiting for its circuit or concurrency limit."""
+        if self._circuit_breaker.blocked_for(host) or self._circuit_breaker.probing(host):
+            return 0
+        return self._concurrency_limiter.available(host)
+
+    def busy_delay(
+        self,
+        host: str,
+    ) -> float:
+        """Return how long to hold back an attempt for a host without capacity, until its circuit probes or briefly."""
+        return self._circuit_breaker.blocked_for(host) or _BUSY_DELAY * (0.5 + random())
+
+    def set_retry_scheduler(
+        self,
+        scheduler: Optional[RetryScheduler[RecordType]] = None,
+    ) -> None:
+        """Customize the scheduler that holds records until their next attempt is due."""
+        self._retry_scheduler = scheduler or RetryScheduler(self._attempt_scheduled)
+
+    @property
+    def retry_scheduler(self) -> RetryScheduler[RecordType]:
+        """Scheduler holding records until their next attempt is due."""
+        return self._retry_scheduler
+
+    def next_retry_delay(
+        self,
+        attempt_number: int,
+        exc: BaseException,
+        start_time: float,
+    ) -> Optional[float]:
+        """Apply the retry criteria, stop, and wait to a failed attempt. Returns None if it should not be retried."""
+        return retry_delay(
+            self._retry_criteria,
+            self._retry_stop,
+            self._retry_wait,
+            attempt_number,
+            exc,
+            start_time,
+        )
+
+    @abstractmethod
+    async def _attempt_scheduled(
+        self,
+        record: RecordType,
+    ) -> None:
+        """Attempt a record the retry scheduler found due, scheduling it again if its host has no capacity."""
+
+    async def _send(
+        self,
+        host: str,
+        request: Callable[[], Awaitable[T]],
+        lane: Lane = DEFAULT_LANE,
+        deadline: Optional[float] = None,
+    ) -> T:
+        """Make `request` once the host's circuit allows it, recording the outcome with the breaker."""
+        probe = await _within(deadline, self._circuit_breaker.acquire(host))
+        success: Optional[bool] = None
+        try:
+            result = await self._limited(host, request, lane, deadline)
+            success = True
+            return result
+        except DeadlineExceeded:
+            # Not the host's fault, released without an outcome
+            raise
+        except Exception:
+            success = False
+            raise
+        finally:
+            self._circuit_breaker.record(host, success, probe)
+
+    async def _limited(
+        self,
+        host: str,
+        request: Callable[[], Awaitable[T]],
+        lane: Lane = DEFAULT_LANE,
+        deadline: Optional[float] = None,
+    ) -> T:
+        """Make `request` within the host's concurrency limit and feed the outcome back to the limiter."""
+        await _within(deadline, self._acquire(host, lane))
+        start = monotonic()
+        overloaded = False
+        try:
+            return await request()
+        except Exception as exc:
+            overloaded = is_overload(exc)
+            raise
+        finally:
+            self._fair_scheduler.release()
+            self._concurrency_limiter.release(host, monotonic() - start, overloaded)
+
+    async def _acquire(
+        self,
+        host: str,
+        lane: Lane = DEFAULT_LANE,
+    ) -> None:
+        """Take a slot within the host's concurrency limit, then wait for the host's fair turn at a connection."""
+        # In this order so a host waiting on its own limit does not hold connections other hosts could use
+        await self._concurrency_limiter.acquire(host, lane)
+        try:
+            await self._fair_scheduler.acquire(host, lane)
+        except BaseException:
+            # An infinite latency neither grows nor shrinks the host's limit
+            self._concurrency_limiter.release(host, float('inf'), False)
+            raise
+
+
+async def _within(
+    deadline: Optional[float],
+    awaitable: Awaitable[T],
+) -> T:
+    """Await `awaitable`, raising DeadlineExceeded instead if `deadline` passes first."""
+    if deadline is None:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, deadline - monotonic())
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded('Deadline passed waiting for a slot') from None
@@ -0,0 +1,209 @@
+"""Naia breaker module."""
+
+import asyncio
+from collections import deque
+from enum import Enum
+from time import monotonic
+from typing import Deque, Dict, Optional
+
+
+class CircuitState(str, Enum):
+    """Circuit breaker states."""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+
+class HostCircuit:
+    """Circuit state and recent outcomes for one host."""
+
+    __slots__ = ('state', 'outcomes', 'opened_at', 'probes_in_flight', 'probe_successes', 'changed')
+
+    def __init__(
+        self,
+        window_size: int,
+    ) -> None:
+        """Initialize a closed circuit."""
+        self.state = CircuitState.CLOSED
+        # True for each failure in the window
+        self.outcomes: Deque[bool] = deque(maxlen=window_size)
+        self.opened_at: float = 0.0
+        self.probes_in_flight: int = 0
+        self.probe_successes: int = 0
+        # Set, and replaced, whenever the state changes to wake parked requests
+        self.changed = asyncio.Event()
+
+
+class CircuitBreaker:
+    """
+    Per-host circuit breaker.
+
+    - closed: requests flow. Once at least `min_calls` of the last `window_size` requests have completed and
+      `failure_rate` of them failed, the circuit opens.
+    - open: requests are parked, not attempted, for `open_seconds`.
+    - half_open: up to `half_open_probes` requests are let through. `success_threshold` probe successes close the
+      circuit and release every parked request, a probe failure opens it again.
+
+    Only the outcomes of probes, as returned by acquire, decide a half open circuit. A late outcome of a request
+    admitted while the circuit was closed is ignored.
+    """
+
+    def __init__(
+        self,
+        window_size: int = 20,
+        min_calls: int = 10,
+        failure_rate: float = 0.5,
+        open_seconds: float = 30.0,
+        half_open_probes: int = 1,
+        success_threshold: int = 1,
+    ) -> None:
+        """
+        Initialize the breaker.
+
+        Args:
+        ----
+            window_size: int
+                Number of recent outcomes the failure rate is calculated over
+            min_calls: int
+                Outcomes required before the circuit can open
+            failure_rate: float
+                Fraction of failures in the window that opens the circuit
+            open_seconds: float
+                Time an open circuit waits before probing
+            half_open_probes: int
+                Concurrent probe requests allowed while half open
+            success_threshold: int
+                Probe successes required to close the circuit
+
+        """
+        self.window_size = window_size
+        self.min_calls = min(min_calls, window_size)
+        self.failure_rate = failure_rate
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.success_threshold = success_threshold
+        self._hosts: Dict[str, HostCircuit] = {}
+
+    async def acquire(
+        self,
+        host: str,
+    ) -> bool:
+        """Return when a request to `host` may be attempted, parking while the circuit is open. True for a probe."""
+        circuit = self._hosts.get(host)
+        if circuit is None:
+            circuit = self._hosts[host] = HostCircuit(self.window_size)
+
+        wait = self._try_enter(circuit)
+        while wait is not None:
+            changed = circuit.changed
+            try:
+                await asyncio.wait_for(changed.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+            wait = self._try_enter(circuit)
+        return circuit.state is CircuitState.HALF_OPEN
+
+    def record(
+        self,
+        host: str,
+        success: Optional[bool],
+        probe: bool = False,
+    ) -> None:
+        """Record the outcome of a request to `host`, `probe` as returned by acquire. None releases it without one."""
+        circuit = self._hosts[host]
+        if probe:
+            if circuit.state is CircuitState.HALF_OPEN:
+                self._record_probe(circuit, success)
+        elif circuit.state is CircuitState.CLOSED and success is not None:
+            circuit.outcomes.append(not success)
+            if len(circuit.outcomes) >= self.min_calls and self._failures(circuit) >= self.failure_rate:
+                self._open(circuit)
+
+    def blocked_for(
+        self,
+        host: str,
+    ) -> float:
+        """Return how long an open circuit for `host` has before probing, 0.0 if it is not open."""
+        circuit = self._hosts.get(host)
+        if circuit is None or circuit.state is not CircuitState.OPEN:
+            return 0.0
+        return max(0.0, circuit.opened_at + self.open_seconds - monotonic())
+
+    def probing(
+        self,
+        host: str,
+    ) -> bool:
+        """Whether the circuit for `host` is half open with every probe in flight, so an acquire would park."""
+        circuit = self._hosts.get(host)
+        return (
+            circuit is not None
+            and circuit.state is CircuitState.HALF_OPEN
+            and circuit.probes_in_flight >= self.half_open_probes
+        )
+
+    def states(self) -> Dict[str, str]:
+        """Return the circuit state of every host seen."""
+        return {host: circuit.state.value for host, circuit in self._hosts.items()}
+
+    def _try_enter(
+        self,
+        circuit: HostCircuit,
+    ) -> Optional[float]:
+        """Admit a request, returning None, or return how long to park before checking again."""
+        if circuit.state is CircuitState.OPEN:
+            remaining = circuit.opened_at + self.open_seconds - monotonic()
+            if remaining > 0:
+                return remaining
+            self._set_state(circuit, CircuitState.HALF_OPEN)
+        if circuit.state is CircuitState.CLOSED:
+            return None
+        if circuit.probes_in_flight < self.half_open_probes:
+            circuit.probes_in_flight += 1
+            return None
+        # Woken when the probes finish
+        return self.open_seconds
+
+    def _record_probe(
+        self,
+        circuit: HostCircuit,
+        success: Optional[bool],
+    ) -> None:
+        circuit.probes_in_flight = max(0, circuit.probes_in_flight - 1)
+        if success is False:
+            self._open(circuit)
+        elif success:
+            circuit.probe_successes += 1
+            if circuit.probe_successes >= self.success_threshold:
+                circuit.outcomes.clear()
+                self._set_state(circuit, CircuitState.CLOSED)
+        else:
+            # A probe slot opened up
+            self._wake(circuit)
+
+    def _open(
+        self,
+        circuit: HostCircuit,
+    ) -> None:
+        circuit.opened_at = monotonic()
+        self._set_state(circuit, CircuitState.OPEN)
+
+    def _set_state(
+        self,
+        circuit: HostCircuit,
+        state: CircuitState,
+    ) -> None:
+        circuit.state = state
+        circuit.probes_in_flight = 0
+        circuit.probe_successes = 0
+        self._wake(circuit)
+
+    @staticmethod
+    def _wake(circuit: HostCircuit) -> None:
+        """Release parked requests to re-check the circuit."""
+        circuit.changed.set()
+        circuit.changed = asyncio.Event()
+
+    @staticmethod
+    def _failures(circuit: HostCircuit) -> float:
+        return sum(circuit.outcomes) / len(circuit.outcomes)
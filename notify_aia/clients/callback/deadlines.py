@@ -0,0 +1,38 @@
+"""Naia deadlines module."""
+
+from typing import Dict, Mapping, Optional
+
+
+class DeadlinePolicy:
+    """
+    Time to live of callbacks by notification_type, counted from their first attempt.
+
+    Past its deadline a callback is dropped rather than attempted or retried. Callbacks with an `expires_at` use it
+    instead. The default policy sets no deadlines.
+    """
+
+    def __init__(
+        self,
+        ttls: Optional[Mapping[str, float]] = None,
+        default: Optional[float] = None,
+    ) -> None:
+        """
+        Initialize the policy.
+
+        Args:
+        ----
+            ttls: Optional[Mapping[str, float]]
+                notification_type to seconds, e.g. {'sms': 600}
+            default: Optional[float]
+                Seconds for other notification types, None for no deadline
+
+        """
+        self.ttls: Dict[str, float] = dict(ttls or {})
+        self.default = default
+
+    def ttl_for(
+        self,
+        notification_type: str,
+    ) -> Optional[float]:
+        """Return the seconds callbacks of `notification_type` live for, None if they have no deadline."""
+        return self.ttls.get(notification_type, self.default)
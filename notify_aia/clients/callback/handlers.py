@@ -5,10 +5,12 @@ from typing import Any, Callable, Coroutine, Union
 
 from fastapi import Request, status
 from fastapi.exceptions import HTTPException
-from fastapi.logger import logger
 from fastapi.responses import JSONResponse, Response
 from fastapi.routing import APIRoute
 
+from notify_aia.log import log
+from notify_aia.metrics import INGEST_LATENCY
+
 
 class CallbackLoggingRoute(APIRoute):
     """Simple custom route logging for callbacks."""
@@ -16,6 +18,7 @@ class CallbackLoggingRoute(APIRoute):
     def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Union[Response, None]]]:  # type: ignore
         """Define custom handling."""
         original_route_handler = super().get_route_handler()
+        route_path = self.path
 
         async def custom_route_handler(request: Request) -> Union[JSONResponse, Response, None]:
             """Handle route pre and post handling."""
@@ -26,15 +29,26 @@ class CallbackLoggingRoute(APIRoute):
                 resp = await original_route_handler(request)
                 status_code = resp.status_code
             except HTTPException as exc:
-                resp = JSONResponse(content={'error': exc.detail}, status_code=exc.status_code)
+                resp = JSONResponse(content={'error': exc.detail}, status_code=exc.status_code, headers=exc.headers)
             except Exception as exc:
-                logger.critical('UNKNOWN EXCEPTION: %s %s', type(exc).__name__, exc)
+                log('critical', 'route.exception', error_type=type(exc).__name__, error=exc)
                 resp = JSONResponse(
                     content={'error': 'Unexpected error'},
                     status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 )
             finally:
-                logger.info(f'{request.method} {request.url} {status_code} {monotonic() - start:6f}s')
+                duration = monotonic() - start
+                if resp is not None:
+                    status_code = resp.status_code
+                INGEST_LATENCY.observe(duration, route_path, str(status_code))
+                log(
+                    'info',
+                    'route.request',
+                    method=request.method,
+                    path=request.scope['path'],
+                    status=status_code,
+                    duration=duration,
+                )
             return resp
 
         return custom_route_handler
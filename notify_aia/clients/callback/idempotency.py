@@ -0,0 +1,115 @@
+"""Naia idempotency module."""
+
+from collections import OrderedDict
+from itertools import count
+from time import monotonic
+from typing import Any, Dict, Optional, Tuple
+
+from notify_aia.metrics import CALLBACKS_SAVED
+
+
+class CallbackIndex:
+    """
+    Recently seen callbacks, keyed by (notification_id, status).
+
+    A callback whose key was seen within `ttl` seconds is an exact duplicate, e.g. a status resent by a Celery retry,
+    and is dropped. With `coalesce`, every callback also gets a generation and a callback still waiting for an attempt
+    is dropped once a newer status of the same notification arrives, so only the latest status is sent. Newer means
+    received later, the payload does not say when the status changed.
+
+    Entries expire `ttl` seconds after they are added and the oldest are evicted beyond `max_entries`, so memory is
+    bounded whatever the traffic.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 300.0,
+        max_entries: int = 100_000,
+        coalesce: bool = False,
+    ) -> None:
+        """
+        Initialize the index.
+
+        Args:
+        ----
+            ttl: float
+                Seconds a key is remembered
+            max_entries: int
+                Keys remembered before the oldest are forgotten early
+            coalesce: bool
+                Whether waiting callbacks are replaced by newer statuses of the same notification
+
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.coalesce = coalesce
+        self.duplicates: int = 0
+        self.coalesced: int = 0
+        # Insertion order is expiry order because the TTL is fixed
+        self._seen: OrderedDict[Tuple[str, str], float] = OrderedDict()
+        # notification_id: (latest generation, expiry)
+        self._latest: OrderedDict[str, Tuple[int, float]] = OrderedDict()
+        self._generations = count(1)
+
+    def claim(
+        self,
+        notification_id: str,
+        status: str,
+    ) -> Optional[int]:
+        """Record a new callback. Returns its generation, None if it duplicates a recent callback."""
+        now = monotonic()
+        _evict(self._seen, now, self.max_entries)
+        key = (notification_id, status)
+        if key in self._seen:
+            self.duplicates += 1
+            CALLBACKS_SAVED.inc('duplicate')
+            return None
+        self._seen[key] = now + self.ttl
+        generation = next(self._generations)
+        if self.coalesce:
+            _evict(self._latest, now, self.max_entries)
+            # Re-inserted so it moves to the end with its new expiry
+            self._latest.pop(notification_id, None)
+            self._latest[notification_id] = (generation, now + self.ttl)
+        return generation
+
+    def superseded(
+        self,
+        notification_id: str,
+        generation: Optional[int],
+    ) -> bool:
+        """Whether a newer status of the notification was claimed since `generation`, always False unless coalescing."""
+        if not self.coalesce or generation is None:
+            return False
+        latest = self._latest.get(notification_id)
+        if latest is None or latest[0] <= generation:
+            return False
+        self.coalesced += 1
+        CALLBACKS_SAVED.inc('coalesced')
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        """Return the callbacks dropped by reason and the keys remembered."""
+        return {
+            'duplicates': self.duplicates,
+            'coalesced': self.coalesced,
+            'entries': len(self._seen),
+        }
+
+
+def _evict(
+    entries: 'OrderedDict[Any, Any]',
+    now: float,
+    max_entries: int,
+) -> None:
+    """Drop expired entries, then the oldest until there is room for one more."""
+    while entries and _expiry(next(iter(entries.values()))) <= now:
+        entries.popitem(last=False)
+    while len(entries) >= max_entries:
+        entries.popitem(last=False)
+
+
+def _expiry(value: Any) -> float:
+    """Return the expiry of an entry, stored alone or last in a tuple."""
+    expiry: float = value[-1] if isinstance(value, tuple) else value
+    return expiry
@@ -0,0 +1,71 @@
+"""Naia priority module."""
+
+from typing import Dict, Iterable, Mapping, Optional, Tuple
+
+from notify_aia.clients.lanes import DEFAULT_LANE, Lane
+
+# Time sensitive callbacks, e.g. one time passcodes
+HIGH_LANE = Lane('high', 8.0)
+# Every attempt after the first, behind fresh callbacks
+RETRY_LANE = Lane('retry', 1.0)
+
+# (notification_type, status) to a lane name, None matches any value
+t_lane_rules = Mapping[Tuple[Optional[str], Optional[str]], str]
+
+
+class PriorityLanes:
+    """
+    Assign callbacks to priority lanes by notification_type and status, unless the caller names a lane.
+
+    Callbacks of every lane wait for the same per-host limits and connections, and while several lanes are waiting
+    each gets turns in proportion to its share: with the default lanes, 8 high, 4 normal, and 1 retry attempt per
+    round. Retries use the retry lane, so they wait behind fresh callbacks without being starved by them.
+    """
+
+    def __init__(
+        self,
+        rules: Optional[t_lane_rules] = None,
+        lanes: Iterable[Lane] = (HIGH_LANE, DEFAULT_LANE, RETRY_LANE),
+        default: str = DEFAULT_LANE.name,
+        retry: str = RETRY_LANE.name,
+    ) -> None:
+        """
+        Initialize the lanes.
+
+        Args:
+        ----
+            rules: Optional[Mapping[Tuple[Optional[str], Optional[str]], str]]
+                (notification_type, status) to a lane name, e.g. {('sms', 'delivered'): 'high'}. None matches any
+                value, an exact match is preferred over a notification_type match, over a status match.
+            lanes: Iterable[Lane]
+                Lanes callbacks can be assigned to
+            default: str
+                Lane of callbacks no rule matches
+            retry: str
+                Lane of attempts after the first
+
+        """
+        self.lanes: Dict[str, Lane] = {lane.name: lane for lane in lanes}
+        self.rules: Dict[Tuple[Optional[str], Optional[str]], str] = dict(rules or {})
+        for name in (default, retry, *self.rules.values()):
+            if name not in self.lanes:
+                raise ValueError(f'Unknown priority lane {name}')
+        self.default = self.lanes[default]
+        self.retry = self.lanes[retry]
+
+    def lane_for(
+        self,
+        notification_type: str,
+        status: str,
+        priority: Optional[str] = None,
+    ) -> Lane:
+        """Return the lane named by `priority`, or if it is not a lane, the lane the rules assign."""
+        lane = self.lanes.get(priority) if priority is not None else None
+        if lane is not None:
+            return lane
+        name = (
+            self.rules.get((notification_type, status))
+            or self.rules.get((notification_type, None))
+            or self.rules.get((None, status))
+        )
+        return self.lanes[name] if name is not None else self.default
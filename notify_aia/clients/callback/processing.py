@@ -2,43 +2,82 @@
 
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, Any, Optional
+import asyncio
+import sys
+from datetime import datetime
+from functools import partial
+from time import monotonic, time
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Any, Iterable, List, Mapping, Optional, Sequence, Tuple, Union
+from urllib.parse import urlsplit
 
 import aiohttp
-from tenacity import (
-    AsyncRetrying,
-    RetryError,
-    retry_if_exception_type,
-    stop_after_attempt,
-    wait_random_exponential,
-)
-from tenacity.retry import retry_base
-from tenacity.stop import stop_base
-from tenacity.wait import wait_base
-
-from notify_aia.auth.encryption import decrypt, legacy_verify
-from notify_aia.clients.async_client import AsyncClient
+import ujson
+
+from notify_aia.auth.encryption import decrypt, decrypt_many_async, legacy_verify
+from notify_aia.clients.async_client import DeadlineExceeded, RetryingAsyncClient
+from notify_aia.clients.callback.deadlines import DeadlinePolicy
+from notify_aia.clients.callback.idempotency import CallbackIndex
+from notify_aia.clients.callback.priority import PriorityLanes
+from notify_aia.clients.lanes import DEFAULT_LANE, Lane
+from notify_aia.clients.scheduler import RetryRecord
+from notify_aia.log import log
+from notify_aia.metrics import ATTEMPTS_PER_CALLBACK, DELIVERY_LATENCY, RETRIES, host_label, status_class
 
 if TYPE_CHECKING:  # pragma: no cover
+    from aiohttp.abc import AbstractResolver
     from pydantic.networks import HttpUrl
 
-    from notify_aia.clients.callback.rest import RequestPayload
+    from notify_aia.clients.callback.rest import RequestCallback, RequestPayload
+    from notify_aia.clients.tracing import t_phase_sink
 
+# Response body bytes read to return a connection to the pool, see set_response_limits
+_DRAIN_LIMIT: int = 64 * 1024
 
-_RETRY_CRITERIA = retry_if_exception_type(aiohttp.ClientResponseError)
 
-_RETRY_ATTEMPTS: int = 10
-_RETRY_STOP = stop_after_attempt(_RETRY_ATTEMPTS)
+class CallbackRecord(RetryRecord):
+    """A RetryRecord for a callback, with what is checked before each attempt and how its token is verified."""
 
-_RETRY_WAIT = wait_random_exponential(
-    multiplier=2.0,
-    max=60,
-    exp_base=2.0,
-    min=0.0,
-)
+    __slots__ = (
+        'legacy_salt',
+        'notification_id',
+        'generation',
+        'lane',
+        'status',
+        'deadline',
+    )
+
+    def __init__(
+        self,
+        url: str,
+        host: str,
+        encrypted_token: str,
+        body: bytes,
+        attempt_number: int,
+        start_time: float,
+        legacy_salt: Optional[bytes] = None,
+        notification_id: str = '',
+        generation: Optional[int] = None,
+        lane: Optional[Lane] = None,
+        status: str = '',
+        deadline: Optional[float] = None,
+    ) -> None:
+        """Initialize the record."""
+        super().__init__(url, host, encrypted_token, body, attempt_number, start_time)
+        # None unless the token is signed (legacy) rather than encrypted
+        self.legacy_salt = legacy_salt
+        # Checked against the CallbackIndex before each attempt, when coalescing
+        self.notification_id = notification_id
+        self.generation = generation
+        # Priority lane of the first attempt, None for the client's default
+        self.lane = lane
+        # Claimed with notification_id before the first attempt
+        self.status = status
+        # time.monotonic() past which the callback is dropped, None if it has no deadline
+        self.deadline = deadline
 
 
-class CallbackAsyncClient(AsyncClient):
+class CallbackAsyncClient(RetryingAsyncClient[CallbackRecord]):
     """
     Make callbacks to Services.
 
@@ -50,36 +89,73 @@ class CallbackAsyncClient(AsyncClient):
         self,
         connector: Optional[aiohttp.TCPConnector] = None,
         timeout: Optional[aiohttp.ClientTimeout] = None,
+        trace_sinks: Optional[Sequence[t_phase_sink]] = None,
+        resolver: Optional[AbstractResolver] = None,
     ) -> None:
-        """Initialize the class."""
+        """Initialize the class. See AsyncClient for the arguments."""
         self.legacy_salt: bytes = b'itsdangerous'
-        super().__init__(connector=connector, timeout=timeout)
+        super().__init__(connector=connector, timeout=timeout, trace_sinks=trace_sinks, resolver=resolver)
+
+        self.set_callback_index()
+        self.set_priority_lanes()
+        self.set_response_limits()
+        self.set_deadline_policy()
 
-        # Intialize retry properties
-        self.set_retry_criteria()
-        self.set_retry_stop()
-        self.set_retry_wait()
+    def set_callback_index(
+        self,
+        index: Optional[CallbackIndex] = None,
+    ) -> None:
+        """Customize the index that drops duplicate callbacks and, if it coalesces, superseded statuses."""
+        self._callback_index = index or CallbackIndex()
 
-    def set_retry_criteria(
+    @property
+    def callback_index(self) -> CallbackIndex:
+        """Index of recent callbacks, keyed by notification_id and status."""
+        return self._callback_index
+
+    def set_priority_lanes(
         self,
-        retry_criteria: Optional[retry_base] = None,
+        lanes: Optional[PriorityLanes] = None,
     ) -> None:
-        """Customize retry criteria."""
-        self._retry_criteria = retry_criteria or _RETRY_CRITERIA
+        """Customize the priority lanes callbacks are assigned to, e.g. with rules by notification_type and status."""
+        self._priority_lanes = lanes or PriorityLanes()
+
+    @property
+    def priority_lanes(self) -> PriorityLanes:
+        """Priority lanes callbacks are assigned to."""
+        return self._priority_lanes
 
-    def set_retry_stop(
+    def set_response_limits(
         self,
-        stop_criteria: Optional[stop_base] = None,
+        capture_bytes: int = 0,
+        drain_limit: int = _DRAIN_LIMIT,
     ) -> None:
-        """Customize stop criteria."""
-        self._retry_stop = stop_criteria or _RETRY_STOP
+        """
+        Customize how much of each Service response body is read.
 
-    def set_retry_wait(
+        Args:
+        ----
+            capture_bytes: int
+                Bytes kept from the start of each body and logged, truncated bodies end with '...'. 0 discards bodies.
+            drain_limit: int
+                Bytes past the captured start read and discarded so the connection can be reused. Longer bodies close
+                the connection instead, so a verbose Service costs a new connection rather than reading its body.
+
+        """
+        self._capture_bytes = capture_bytes
+        self._drain_limit = drain_limit
+
+    def set_deadline_policy(
         self,
-        wait_criteria: Optional[wait_base] = None,
+        policy: Optional[DeadlinePolicy] = None,
     ) -> None:
-        """Customize delay between retries."""
-        self._retry_wait = wait_criteria or _RETRY_WAIT
+        """Customize how long callbacks of each notification_type live, no deadlines by default."""
+        self._deadline_policy = policy or DeadlinePolicy()
+
+    @property
+    def deadline_policy(self) -> DeadlinePolicy:
+        """Deadlines of callbacks that do not set their own expires_at."""
+        return self._deadline_policy
 
     async def send_callback_request(
         self,
@@ -88,53 +164,452 @@ class CallbackAsyncClient(AsyncClient):
         payload: RequestPayload,
         legacy_salt: bytes = b'',
         legacy: bool = False,
+        deliver_at: Optional[datetime] = None,
+        priority: Optional[str] = None,
+        expires_at: Optional[datetime] = None,
     ) -> None:
-        """Send status callback to a Service endpoint."""
-        bearer_token: Any = None
+        """
+        Send status callback to a Service endpoint, retrying per the retry criteria.
 
+        Only the first attempt is awaited, unless `deliver_at` is in the future. Retries, and delayed callbacks, are
+        made by the retry scheduler. `priority` names a priority lane, overriding the lane rules. The callback is
+        dropped once `expires_at`, or the deadline policy's deadline if it is None, passes.
+        """
+        bearer_token = self._bearer_token(encrypted_token, legacy_salt, legacy)
+        record = self._new_record(
+            url,
+            encrypted_token,
+            payload,
+            (legacy_salt or self.legacy_salt) if legacy else None,
+            priority,
+            deliver_at,
+            expires_at,
+        )
+        await self.send_record(record, bearer_token)
+
+    def to_record(
+        self,
+        callback: RequestCallback,
+    ) -> CallbackRecord:
+        """
+        Convert an accepted callback to the compact record it is held as until it is finished.
+
+        The payload is serialized once and the models are not kept, so only the URL, encrypted token, and request body
+        stay in memory while the callback waits. Send the record with send_record or send_records.
+        """
+        return self._new_record(
+            callback.url,
+            callback.encrypted_token,
+            callback.payload,
+            priority=callback.priority,
+            deliver_at=callback.deliver_at,
+            expires_at=callback.expires_at,
+        )
+
+    async def send_record(
+        self,
+        record: CallbackRecord,
+        bearer_token: Any = None,
+    ) -> None:
+        """
+        Send a callback converted by to_record, retrying per the retry criteria.
+
+        Only the first attempt is awaited, unless the record is not due yet. The token is decrypted unless the
+        `bearer_token` is given.
+        """
+        if _past(record.deadline, max(record.start_time, monotonic())):
+            # It would be due too late, dropped before the token is decrypted
+            _expire(record.url, record.attempt_number - 1)
+            return
+        if bearer_token is None:
+            bearer_token = self._record_bearer_token(record)
+        if not bearer_token:
+            log('warning', 'callback.invalid_token', url=record.url)
+            return
+        record.generation = self._claim(record.notification_id, record.status)
+        if record.generation is not None:
+            await self._start(record, bearer_token)
+
+    async def _start(
+        self,
+        record: CallbackRecord,
+        bearer_token: Any,
+    ) -> None:
+        """Make the first attempt of a claimed record, or schedule it if it was requested for later."""
+        if record.start_time > monotonic():
+            self._retry_scheduler.schedule(record, record.start_time)
+        else:
+            await self._deliver(record, bearer_token)
+
+    async def try_callback_request(
+        self,
+        url: HttpUrl,
+        encrypted_token: str,
+        payload: RequestPayload,
+        attempt_number: int = 1,
+        start_time: Optional[float] = None,
+        legacy_salt: bytes = b'',
+        legacy: bool = False,
+        bearer_token: Any = None,
+        priority: Optional[str] = None,
+        expires_at: Optional[datetime] = None,
+    ) -> Optional[float]:
+        """
+        Make a single callback attempt, leaving any retry to the caller.
+
+        Args:
+        ----
+            url: HttpUrl
+                Service endpoint
+            encrypted_token: str
+                Encrypted (or signed, if legacy) bearer token
+            payload: RequestPayload
+                Callback body
+            attempt_number: int
+                Which attempt this is, starting at 1
+            start_time: Optional[float]
+                time.monotonic() of the first attempt, used by time based stop criteria
+            legacy_salt: bytes
+                Salt for legacy verification
+            legacy: bool
+                Whether the token is signed rather than encrypted
+            bearer_token: Any
+                The already decrypted encrypted_token, e.g. from decrypt_many_async
+            priority: Optional[str]
+                Priority lane of the first attempt, overriding the lane rules. Later attempts use the retry lane.
+            expires_at: Optional[datetime]
+                Drop the callback rather than attempt it after this time, overriding the deadline policy
+
+        Returns:
+        -------
+            Optional[float]: Seconds to wait before the next attempt, None if the callback is finished
+
+        """
+        start_time = monotonic() if start_time is None else start_time
+        deadline = self._deadline(payload, start_time, expires_at)
+        if _past(deadline, monotonic()):
+            _expire(str(url), attempt_number - 1)
+            return None
+        if bearer_token is None:
+            bearer_token = self._bearer_token(encrypted_token, legacy_salt, legacy)
+        if not bearer_token:
+            log('warning', 'callback.invalid_token', url=url)
+            return None
+        if attempt_number == 1 and self._claim(str(payload.notification_id), payload.status) is None:
+            return None
+        return await self._attempt(
+            str(url),
+            _headers(bearer_token),
+            self._serialize(payload),
+            attempt_number,
+            start_time,
+            self._lane(payload, priority) if attempt_number == 1 else self._priority_lanes.retry,
+            deadline,
+        )
+
+    def _bearer_token(
+        self,
+        encrypted_token: str,
+        legacy_salt: bytes,
+        legacy: bool,
+    ) -> Any:
+        """Decrypt, or verify if legacy, the bearer token."""
         if legacy:
-            bearer_token = legacy_verify(encrypted_token, legacy_salt or self.legacy_salt)
+            return legacy_verify(encrypted_token, legacy_salt or self.legacy_salt)
+        return decrypt(encrypted_token)
+
+    def _record_bearer_token(
+        self,
+        record: CallbackRecord,
+    ) -> Any:
+        """Decrypt, or verify if legacy, the bearer token held by a record."""
+        return self._bearer_token(record.encrypted_token, record.legacy_salt or b'', record.legacy_salt is not None)
+
+    async def _attempt(
+        self,
+        url: str,
+        headers: Mapping[str, str],
+        body: bytes,
+        attempt_number: int,
+        start_time: float,
+        lane: Lane = DEFAULT_LANE,
+        deadline: Optional[float] = None,
+    ) -> Optional[float]:
+        """Post the callback once and return the delay before retrying, None if there is nothing left to do."""
+        try:
+            await self._post(url, headers, body, lane, deadline)
+        except Exception as exc:
+            return self._failed(url, attempt_number, start_time, deadline, exc)
+        ATTEMPTS_PER_CALLBACK.observe(attempt_number, 'completed')
+        return None
+
+    def _failed(
+        self,
+        url: str,
+        attempt_number: int,
+        start_time: float,
+        deadline: Optional[float],
+        exc: Exception,
+    ) -> Optional[float]:
+        """Return the delay before retrying a failed attempt, None if the callback gives up or expires instead."""
+        if isinstance(exc, DeadlineExceeded):
+            # No request was made
+            _expire(url, attempt_number - 1)
+            return None
+        delay = self.next_retry_delay(attempt_number, exc, start_time)
+        if delay is None:
+            ATTEMPTS_PER_CALLBACK.observe(attempt_number, 'gave_up')
+            log(
+                'warning',
+                'callback.gave_up',
+                url=url,
+                attempts=attempt_number,
+                error_type=exc.__class__.__name__,
+                error=exc,
+            )
+        elif _past(deadline, monotonic() + delay):
+            # The next attempt would be too late
+            _expire(url, attempt_number)
+            return None
         else:
-            bearer_token = decrypt(encrypted_token)
+            RETRIES.inc(_retry_reason(exc))
+        return delay
 
-        if bearer_token:
-            dict_payload = self._convert_model(payload)
-            url_str = str(url)
+    async def _post(
+        self,
+        url: str,
+        headers: Mapping[str, str],
+        body: bytes,
+        lane: Lane = DEFAULT_LANE,
+        deadline: Optional[float] = None,
+    ) -> None:
+        """Post the callback once the host's circuit and limits allow it."""
+        host = urlsplit(url).netloc
+        await self._send(host, partial(self._post_once, host, url, headers, body, deadline), lane, deadline)
+
+    async def _post_once(
+        self,
+        host: str,
+        url: str,
+        headers: Mapping[str, str],
+        body: bytes,
+        deadline: Optional[float],
+    ) -> None:
+        """Post the callback and handle the response."""
+        start = monotonic()
+        status: Optional[int] = None
+        try:
+            log('debug', 'callback.post', url=url)
+            timeout = self._attempt_timeout(deadline)
+            async with self.client.post(url=url, data=body, headers=headers, timeout=timeout) as resp:
+                status = resp.status
+                await self._handle_response(resp, url)
+        finally:
+            DELIVERY_LATENCY.observe(monotonic() - start, host_label(host), status_class(status))
+
+    def _attempt_timeout(
+        self,
+        deadline: Optional[float],
+    ) -> aiohttp.ClientTimeout:
+        """Return the session timeout, with the total shrunk to the time left before `deadline`."""
+        if deadline is None:
+            return self.timeout
+        # Positive, a total of 0 disables the timeout rather than expiring it
+        remaining = max(deadline - monotonic(), 0.001)
+        return aiohttp.ClientTimeout(
+            total=min(self.timeout.total or remaining, remaining),
+            connect=self.timeout.connect,
+            sock_read=self.timeout.sock_read,
+            sock_connect=self.timeout.sock_connect,
+        )
+
+    async def send_callback_requests(
+        self,
+        callbacks: Iterable[RequestCallback],
+    ) -> None:
+        """Send a batch of status callbacks concurrently, decrypting all of their tokens in one call."""
+        await self.send_records([self.to_record(callback) for callback in callbacks])
+
+    async def send_records(
+        self,
+        records: Sequence[CallbackRecord],
+    ) -> None:
+        """Send a batch of callbacks converted by to_record concurrently, decrypting all of their tokens in one call."""
+        bearer_tokens = await decrypt_many_async([record.encrypted_token for record in records])
+        valid = [
+            (record, bearer_token)
+            for record, bearer_token in zip(records, bearer_tokens)
+            if not isinstance(bearer_token, ValueError) and bearer_token
+        ]
+        # Duplicates within the batch are claimed in order, before any attempt is awaited
+        results = await asyncio.gather(
+            *(self.send_record(record, bearer_token) for record, bearer_token in valid),
+            return_exceptions=True,
+        )
+        invalid = len(records) - len(valid)
+        if invalid:
+            log('warning', 'callback.batch_invalid_tokens', invalid=invalid, total=len(records))
+        failures = [result for result in results if isinstance(result, BaseException)]
+        if failures:
+            log('error', 'callback.batch_failures', failed=len(failures), total=len(results), first=repr(failures[0]))
+
+    @staticmethod
+    async def decode_callbacks(
+        bodies: Sequence[Union[str, bytes]],
+    ) -> List[Tuple[Optional[RequestCallback], Any]]:
+        """
+        Parse serialized RequestCallbacks and decrypt all of their tokens in one call, off the event loop.
+
+        Args:
+        ----
+            bodies: Sequence[Union[str, bytes]]
+                JSON RequestCallbacks
+
+        Returns:
+        -------
+            List[Tuple[Optional[RequestCallback], Any]]: (callback, bearer token) pairs. The callback is None if the
+                body is invalid, the bearer token is a ValueError if the token is invalid.
+
+        """
+        # Only import this if it's being used
+        from notify_aia.clients.callback.rest import RequestCallback
+
+        callbacks: List[Optional[RequestCallback]] = []
+        for body in bodies:
             try:
-                async for post_attempt in AsyncRetrying(
-                    wait=self._retry_wait,
-                    stop=self._retry_stop,
-                    retry=self._retry_criteria,
-                ):
-                    with post_attempt:
-                        print('Making post to: ', url_str)
-                        async with self.client.post(
-                            url=url_str,
-                            json=dict_payload,
-                            headers={
-                                'Content-Type': 'application/json',
-                                'Authorization': f'Bearer {bearer_token}',
-                            },
-                        ) as resp:
-                            await self._handle_response(resp, url_str)
-            except RetryError as exc:
-                print(
-                    f'Retried {url} - {exc.last_attempt.attempt_number} times. '
-                    f'Raised {exc.__cause__.__class__.__name__} - {exc.__cause__}'
-                )
-        else:
-            print(f'Unable to send callback to {url} due to invalid bearer_token generation')
+                callbacks.append(RequestCallback.model_validate_json(body))
+            except ValueError:
+                callbacks.append(None)
+        bearer_tokens = iter(await decrypt_many_async([callback.encrypted_token for callback in callbacks if callback]))
+        return [(callback, next(bearer_tokens) if callback else None) for callback in callbacks]
 
-    async def _handle_response(self, resp: aiohttp.ClientResponse, url: str) -> None:
+    def _claim(
+        self,
+        notification_id: str,
+        status: str,
+    ) -> Optional[int]:
+        """Record a new callback with the index. Returns its generation, None if it is a duplicate."""
+        generation = self._callback_index.claim(notification_id, status)
+        if generation is None:
+            log('debug', 'callback.duplicate', notification_id=notification_id, status=status)
+        return generation
+
+    def _new_record(
+        self,
+        url: HttpUrl,
+        encrypted_token: str,
+        payload: RequestPayload,
+        legacy_salt: Optional[bytes] = None,
+        priority: Optional[str] = None,
+        deliver_at: Optional[datetime] = None,
+        expires_at: Optional[datetime] = None,
+    ) -> CallbackRecord:
+        """Build the record of a callback that has not been attempted yet, in its priority lane."""
+        # Interned, callbacks for a Service share one copy of its URL and host
+        url_str = sys.intern(str(url))
+        # The stop criteria count from the first attempt, not from when it was requested
+        start_time = monotonic() + max(0.0, _seconds_until(deliver_at))
+        return CallbackRecord(
+            url_str,
+            sys.intern(urlsplit(url_str).netloc),
+            encrypted_token,
+            self._serialize(payload),
+            1,
+            start_time,
+            legacy_salt,
+            str(payload.notification_id),
+            lane=self._lane(payload, priority),
+            status=sys.intern(payload.status),
+            deadline=self._deadline(payload, start_time, expires_at),
+        )
+
+    def _deadline(
+        self,
+        payload: RequestPayload,
+        start_time: float,
+        expires_at: Optional[datetime],
+    ) -> Optional[float]:
+        """Return the time.monotonic() deadline of a callback first attempted at `start_time`, None if it has none."""
+        if expires_at is not None:
+            return monotonic() + _seconds_until(expires_at)
+        ttl = self._deadline_policy.ttl_for(payload.notification_type)
+        return start_time + ttl if ttl is not None else None
+
+    def _lane(
+        self,
+        payload: RequestPayload,
+        priority: Optional[str],
+    ) -> Lane:
+        """Return the priority lane of a callback's first attempt."""
+        return self._priority_lanes.lane_for(payload.notification_type, payload.status, priority)
+
+    async def _deliver(
+        self,
+        record: CallbackRecord,
+        bearer_token: Any,
+    ) -> None:
+        """Attempt the callback, handing it to the retry scheduler if the attempt should be retried."""
+        if self._callback_index.superseded(record.notification_id, record.generation):
+            log('debug', 'callback.coalesced', url=record.url, notification_id=record.notification_id)
+            return
+        delay = await self._attempt(
+            record.url,
+            _headers(bearer_token),
+            record.body,
+            record.attempt_number,
+            record.start_time,
+            self._record_lane(record),
+            record.deadline,
+        )
+        if delay is not None:
+            record.attempt_number += 1
+            self._retry_scheduler.schedule(record, monotonic() + delay)
+
+    def _record_lane(
+        self,
+        record: CallbackRecord,
+    ) -> Lane:
+        """Return the priority lane of a record's next attempt, retries wait behind fresh callbacks."""
+        if record.attempt_number > 1:
+            return self._priority_lanes.retry
+        return record.lane or self._priority_lanes.default
+
+    async def _attempt_scheduled(
+        self,
+        record: CallbackRecord,
+    ) -> None:
+        """Attempt a callback the retry scheduler found due. Only the encrypted token is held between attempts."""
+        blocked = self._circuit_breaker.blocked_for(record.host)
+        if _past(record.deadline, monotonic() + blocked):
+            # Expired while waiting, or would be before the circuit probes
+            _expire(record.url, record.attempt_number - 1)
+            return
+        if not self.host_capacity(record.host):
+            # Wait in the scheduler rather than holding one of its workers until the host can take the attempt
+            self._retry_scheduler.schedule(record, monotonic() + self.busy_delay(record.host))
+            return
         try:
+            bearer_token = self._record_bearer_token(record)
+        except ValueError as exc:
+            log('warning', 'callback.invalid_token', url=record.url, error=exc)
+            return
+        await self._deliver(record, bearer_token)
+
+    async def _handle_response(self, resp: aiohttp.ClientResponse, url: str) -> None:
+        """Read the body within the response limits, then raise for retryable statuses and log the others."""
+        body = await _read_body(resp, self._capture_bytes, self._drain_limit)
+        if resp.status < 400:
+            log('debug', 'callback.response', url=url, status=resp.status, body=body)
+        elif resp.status >= 500 or resp.status in (408, 429):
+            # Retryable
             resp.raise_for_status()
-            print(f'Response from {url}: {await resp.text()}')
-        except aiohttp.ClientResponseError as exc:
-            if resp.status >= 500 or resp.status in (408, 429):
-                # Retryable
-                raise
-            else:
-                print(f'Non-retryable exception encountered: {exc}')
+        else:
+            log('warning', 'callback.rejected', url=url, status=resp.status, reason=resp.reason, body=body)
+
+    @classmethod
+    def _serialize(cls, model: RequestPayload) -> bytes:
+        """Serialize the callback body once, byte for byte what the session's json_serialize would send."""
+        return ujson.dumps(cls._convert_model(model)).encode()
 
     @staticmethod
     def _convert_model(model: RequestPayload) -> dict[str, Any]:
@@ -146,3 +621,74 @@ class CallbackAsyncClient(AsyncClient):
         model_dict['sent_at'] = str(model_dict['sent_at'])
 
         return model_dict
+
+
+def _headers(bearer_token: Any) -> Mapping[str, str]:
+    """Build the read-only request headers shared by every attempt made with this bearer token."""
+    return MappingProxyType({'Content-Type': 'application/json', 'Authorization': f'Bearer {bearer_token}'})
+
+
+def _past(
+    deadline: Optional[float],
+    when: float,
+) -> bool:
+    """Whether time.monotonic() `when` is at or after `deadline`, never if there is no deadline."""
+    return deadline is not None and when >= deadline
+
+
+def _expire(
+    url: str,
+    attempts: int,
+) -> None:
+    """Drop a callback whose deadline passed, or would before its next attempt."""
+    ATTEMPTS_PER_CALLBACK.observe(attempts, 'expired')
+    log('warning', 'callback.expired', url=url, attempts=attempts)
+
+
+def _seconds_until(deliver_at: Optional[datetime]) -> float:
+    """Return the seconds until `deliver_at`, 0.0 if it is not set. Naive datetimes are local time."""
+    if deliver_at is None:
+        return 0.0
+    return deliver_at.timestamp() - time()
+
+
+def _retry_reason(exc: BaseException) -> str:
+    """Return the retry reason label for a failed attempt: the response status, or the exception type."""
+    if isinstance(exc, aiohttp.ClientResponseError):
+        return str(exc.status)
+    return exc.__class__.__name__
+
+
+async def _read_body(
+    resp: aiohttp.ClientResponse,
+    capture_bytes: int,
+    drain_limit: int,
+) -> Optional[str]:
+    """Return up to `capture_bytes` of the body, None if capture is off, and discard the rest up to `drain_limit`."""
+    head = bytearray()
+    while len(head) < capture_bytes:
+        chunk = await resp.content.read(capture_bytes - len(head))
+        if not chunk:
+            break
+        head += chunk
+    truncated = await _discard(resp, drain_limit) > 0
+    if not capture_bytes:
+        return None
+    # A multi-byte character cut by the cap is replaced rather than failing the decode
+    return head.decode('utf-8', errors='replace') + ('...' if truncated else '')
+
+
+async def _discard(
+    resp: aiohttp.ClientResponse,
+    limit: int,
+) -> int:
+    """Read and drop the rest of the body so the connection can be reused, closing it instead past `limit` bytes."""
+    discarded = 0
+    while True:
+        chunk = await resp.content.readany()
+        if not chunk:
+            return discarded
+        discarded += len(chunk)
+        if discarded > limit:
+            resp.close()
+            return discarded
@@ -3,12 +3,15 @@
 from __future__ import annotations
 
 import asyncio
-from typing import TYPE_CHECKING, Optional
+from http import HTTPStatus
+from typing import TYPE_CHECKING, AsyncIterator, Dict, List, Optional, Tuple
 
-from fastapi import APIRouter, BackgroundTasks, status
-from pydantic import UUID4, AwareDatetime, BaseModel, HttpUrl
+from fastapi import APIRouter, BackgroundTasks, Request, status
+from fastapi.exceptions import HTTPException
+from pydantic import UUID4, AwareDatetime, BaseModel, HttpUrl, ValidationError
 from typing_extensions import Any
 
+from notify_aia.admission import request_bytes
 from notify_aia.clients.callback.handlers import CallbackLoggingRoute
 
 if TYPE_CHECKING:  # pragma: no cover
@@ -18,6 +21,11 @@ if TYPE_CHECKING:  # pragma: no cover
 _EVENT_LOOP = None
 _APP: Naia
 
+# Upper bound on callbacks accepted by a single batch or stream request
+_MAX_BATCH_SIZE: int = 10_000
+# Upper bound on one line of a streamed batch, so a body without newlines is not buffered whole
+_MAX_LINE_BYTES: int = 1024 * 1024
+
 callback_router = APIRouter(
     prefix='/callback',
     tags=['callback'],
@@ -49,6 +57,13 @@ class RequestCallback(BaseModel):
     url: HttpUrl
     encrypted_token: str
     payload: RequestPayload
+    # Delay the first attempt until this time
+    deliver_at: Optional[AwareDatetime] = None
+    # Priority lane, e.g. 'high', overriding the lanes assigned by notification_type and status. Must be a
+    # configured lane
+    priority: Optional[str] = None
+    # Drop the callback rather than attempt it after this time, overriding the deadline policy
+    expires_at: Optional[AwareDatetime] = None
 
     model_config = {
         'json_schema_extra': {
@@ -77,6 +92,22 @@ class ResponseCallback(BaseModel):
     message: str
 
 
+class BatchItemResult(BaseModel):
+    """Accept or reject result for one item of a batch request."""
+
+    index: int
+    accepted: bool
+    error: Optional[str] = None
+
+
+class ResponseCallbackBatch(BaseModel):
+    """Response to batch callback requests."""
+
+    accepted: int
+    rejected: int
+    results: List[BatchItemResult]
+
+
 def set_app(app: Naia) -> None:
     """Set global app variable."""
     global _APP
@@ -94,15 +125,169 @@ def get_event_loop() -> asyncio.AbstractEventLoop:
 @callback_router.post('/send', status_code=status.HTTP_202_ACCEPTED, summary='Send a callback')
 async def send_callback(
     data: RequestCallback,
+    request: Request,
     background_tasks: BackgroundTasks,
     # api_key: str = Security(validate_admin_auth),
 ) -> ResponseCallback:
     """Send a callback to the specified URL with a bearer token."""
-    # Do not wait for the response
-    background_tasks.add_task(
-        _APP.callback_client.send_callback_request,
-        url=data.url,
-        encrypted_token=data.encrypted_token,
-        payload=data.payload,
-    )
+    _APP.admission.enforce()
+    error = _check_priority(data)
+    if error is not None:
+        raise HTTPException(status_code=HTTPStatus.UNPROCESSABLE_ENTITY, detail=error)
+    if _APP.callback_queue is not None:
+        # Accepted once it is durable, the dispatcher delivers it
+        await _APP.callback_queue.put([data.model_dump_json().encode()], due_at=_due_at(data))
+    else:
+        # Do not wait for the response, or hold the models while waiting
+        record = _APP.callback_client.to_record(data)
+        background_tasks.add_task(
+            _APP.admission.run_admitted,
+            1,
+            request_bytes(request),
+            _APP.callback_client.send_record,
+            record,
+        )
     return ResponseCallback(message='Accepted')
+
+
+@callback_router.post('/send-batch', status_code=status.HTTP_202_ACCEPTED, summary='Send a batch of callbacks')
+async def send_callback_batch(
+    data: List[Any],
+    request: Request,
+    background_tasks: BackgroundTasks,
+) -> ResponseCallbackBatch:
+    """Validate each callback in the batch and send the valid ones. Invalid items are reported, not fatal."""
+    _APP.admission.enforce()
+    _check_batch_size(len(data))
+    validated = [_validate_item(index, item) for index, item in enumerate(data)]
+    return await _enqueue_batch(validated, request_bytes(request), background_tasks)
+
+
+@callback_router.post(
+    '/send-stream',
+    status_code=status.HTTP_202_ACCEPTED,
+    summary='Send newline delimited JSON (NDJSON) callbacks',
+    openapi_extra={
+        'requestBody': {
+            'required': True,
+            'content': {'application/x-ndjson': {'schema': {'type': 'string', 'format': 'binary'}}},
+        }
+    },
+)
+async def send_callback_stream(
+    request: Request,
+    background_tasks: BackgroundTasks,
+) -> ResponseCallbackBatch:
+    """Validate each line of an NDJSON body as a callback and send the valid ones."""
+    # Checked before the body is read, so shedding costs as little as possible
+    _APP.admission.enforce()
+    validated: List[Tuple[Optional[RequestCallback], BatchItemResult]] = []
+    nbytes = 0
+    async for line in _iter_lines(request):
+        _check_batch_size(len(validated) + 1)
+        validated.append(_validate_item(len(validated), line))
+        nbytes += len(line)
+    return await _enqueue_batch(validated, nbytes, background_tasks)
+
+
+def _check_batch_size(size: int) -> None:
+    """Reject batches larger than the configured maximum."""
+    if size > _MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+            detail=f'Batch exceeds the maximum of {_MAX_BATCH_SIZE} callbacks',
+        )
+
+
+def _check_line_size(size: int) -> None:
+    """Reject streamed lines longer than the configured maximum."""
+    if size > _MAX_LINE_BYTES:
+        raise HTTPException(
+            status_code=HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+            detail=f'Line exceeds the maximum of {_MAX_LINE_BYTES} bytes',
+        )
+
+
+async def _iter_lines(request: Request) -> AsyncIterator[bytes]:
+    """Yield the non-blank lines of a streamed request body without buffering the whole body."""
+    remainder = b''
+    async for chunk in request.stream():
+        *lines, remainder = (remainder + chunk).split(b'\n')
+        _check_line_size(max([len(remainder), *map(len, lines)]))
+        for line in lines:
+            if line.strip():
+                yield line
+    if remainder.strip():
+        yield remainder
+
+
+def _validate_item(index: int, item: Any) -> Tuple[Optional[RequestCallback], BatchItemResult]:
+    """Validate one batch item, JSON bytes or an already decoded object, into a RequestCallback."""
+    try:
+        if isinstance(item, bytes):
+            callback = RequestCallback.model_validate_json(item)
+        else:
+            callback = RequestCallback.model_validate(item)
+    except ValidationError as exc:
+        return None, BatchItemResult(index=index, accepted=False, error=_format_errors(exc))
+    error = _check_priority(callback)
+    if error is not None:
+        return None, BatchItemResult(index=index, accepted=False, error=error)
+    return callback, BatchItemResult(index=index, accepted=True)
+
+
+def _check_priority(callback: RequestCallback) -> Optional[str]:
+    """Return why a callback's priority is not one of the client's lanes, None if it is or none was given."""
+    lanes = _APP.callback_client.priority_lanes.lanes
+    if callback.priority is None or callback.priority in lanes:
+        return None
+    return f'priority: Unknown lane {callback.priority!r}, expected one of {", ".join(sorted(lanes))}'
+
+
+def _format_errors(exc: ValidationError) -> str:
+    """Condense a ValidationError into a single line of `location: message` pairs."""
+    errors = []
+    for err in exc.errors():
+        location = '.'.join(str(loc) for loc in err['loc']) or 'item'
+        errors.append(f'{location}: {err["msg"]}')
+    return '; '.join(errors)
+
+
+def _due_at(callback: RequestCallback) -> Optional[float]:
+    """Return when a queued callback should first be attempted, None for immediately."""
+    return callback.deliver_at.timestamp() if callback.deliver_at is not None else None
+
+
+async def _put_batch(callbacks: List[RequestCallback]) -> None:
+    """Queue callbacks, grouped by due time. Concurrent puts share a group commit."""
+    assert _APP.callback_queue is not None
+    groups: Dict[Optional[float], List[bytes]] = {}
+    for callback in callbacks:
+        groups.setdefault(_due_at(callback), []).append(callback.model_dump_json().encode())
+    await asyncio.gather(*(_APP.callback_queue.put(bodies, due_at=due_at) for due_at, bodies in groups.items()))
+
+
+async def _enqueue_batch(
+    validated: List[Tuple[Optional[RequestCallback], BatchItemResult]],
+    nbytes: int,
+    background_tasks: BackgroundTasks,
+) -> ResponseCallbackBatch:
+    """Queue the accepted callbacks, or send them in a single background task, and summarize the results."""
+    callbacks = [callback for callback, _ in validated if callback is not None]
+    if callbacks and _APP.callback_queue is not None:
+        await _put_batch(callbacks)
+    elif callbacks:
+        # One task for the whole batch, background tasks run sequentially
+        records = [_APP.callback_client.to_record(callback) for callback in callbacks]
+        background_tasks.add_task(
+            _APP.admission.run_admitted,
+            len(records),
+            nbytes,
+            _APP.callback_client.send_records,
+            records,
+        )
+    return ResponseCallbackBatch(
+        accepted=len(callbacks),
+        rejected=len(validated) - len(callbacks),
+        results=[result for _, result in validated],
+    )
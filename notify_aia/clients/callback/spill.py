@@ -0,0 +1,180 @@
+"""Naia spill module."""
+
+from __future__ import annotations
+
+import asyncio
+import os
+from datetime import datetime, timezone
+from time import monotonic, time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
+
+import ujson
+
+from notify_aia.clients.callback.priority import PriorityLanes
+from notify_aia.clients.callback.processing import CallbackRecord
+from notify_aia.log import log
+from notify_aia.services import LifespanService
+
+if TYPE_CHECKING:  # pragma: no cover
+    from notify_aia.clients.scheduler import RetryScheduler
+    from notify_aia.queue.base import QueueBackend
+
+# (time.monotonic() the record is due, record), as returned by RetryScheduler.take_pending
+t_pending = Tuple[float, CallbackRecord]
+
+
+class RetrySpillFile(LifespanService):
+    """
+    File that callbacks waiting to be retried are written to on shutdown and restored from on start.
+
+    Each line is a JSON record with its wall clock due time, so the next process, on the same volume, makes the
+    remaining attempts when they are due. Records restored late are attempted immediately.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        scheduler: RetryScheduler[CallbackRecord],
+        lanes: Optional[PriorityLanes] = None,
+    ) -> None:
+        """
+        Initialize the spill for `scheduler` at `path`, created when records are first written.
+
+        Restored records get their lane back from `lanes` by name, the client's priority lanes. Records whose lane is
+        not one of them use the client's default lane.
+        """
+        self.path = path
+        self.scheduler = scheduler
+        self.lanes = lanes or PriorityLanes()
+
+    async def start(self) -> None:
+        """Schedule the records spilled by the previous process and remove the file."""
+        lines = await asyncio.to_thread(self._read)
+        for line in lines:
+            due, record = _load(line, self.lanes)
+            self.scheduler.schedule(record, due)
+        if lines:
+            log('info', 'retry.restored', count=len(lines), path=self.path)
+
+    async def stop(self) -> None:
+        """Nothing to stop, records are written by write while the app drains."""
+
+    async def write(
+        self,
+        pending: Sequence[t_pending],
+    ) -> None:
+        """Durably append records for the next process."""
+        lines = [_dump(due, record) for due, record in pending]
+        await asyncio.to_thread(self._append, lines)
+
+    def _read(self) -> List[str]:
+        try:
+            with open(self.path, encoding='utf-8') as spill:
+                lines = [line for line in spill if line.strip()]
+        except FileNotFoundError:
+            return []
+        os.remove(self.path)
+        return lines
+
+    def _append(
+        self,
+        lines: List[str],
+    ) -> None:
+        with open(self.path, 'a', encoding='utf-8') as spill:
+            spill.writelines(lines)
+            spill.flush()
+            os.fsync(spill.fileno())
+
+
+async def spill_to_queue(
+    queue: QueueBackend,
+    pending: Sequence[t_pending],
+) -> List[t_pending]:
+    """
+    Put records on a queue backend as RequestCallbacks, due when their next attempt was. Concurrent puts share a commit.
+
+    Jobs keep the records' attempts and age, so retries carry on with the same attempt numbers, lane and stop window.
+
+    Returns the records that were not queued: RequestCallback has no legacy token, so records with one are left out.
+    """
+    now, wall_now = monotonic(), time()
+    queued = [(due, record) for due, record in pending if record.legacy_salt is None]
+    await asyncio.gather(
+        *(
+            queue.put(
+                [_request_callback(record)],
+                due_at=wall_now + max(0.0, due - now),
+                attempts=record.attempt_number - 1,
+                created_at=_wall_time(record.start_time),
+            )
+            for due, record in queued
+        )
+    )
+    return [(due, record) for due, record in pending if record.legacy_salt is not None]
+
+
+def _request_callback(record: CallbackRecord) -> bytes:
+    """Return the /callback/send body for a record, the payload is its serialized request body."""
+    return ujson.dumps(
+        {
+            'url': record.url,
+            'encrypted_token': record.encrypted_token,
+            'payload': ujson.loads(record.body),
+            'priority': record.lane.name if record.lane is not None else None,
+            'expires_at': (
+                datetime.fromtimestamp(_wall_time(record.deadline), timezone.utc).isoformat()
+                if record.deadline is not None
+                else None
+            ),
+        }
+    ).encode()
+
+
+def _wall_time(when: float) -> float:
+    """Return the time.time() of time.monotonic() `when`."""
+    return time() + when - monotonic()
+
+
+def _dump(
+    due: float,
+    record: CallbackRecord,
+) -> str:
+    fields: Dict[str, Any] = {
+        'url': record.url,
+        'host': record.host,
+        'encrypted_token': record.encrypted_token,
+        'body': record.body.decode(),
+        'attempt_number': record.attempt_number,
+        # Durations and wall clock times, monotonic() values do not carry across processes
+        'age': monotonic() - record.start_time,
+        'due_at': _wall_time(due),
+        'legacy_salt': record.legacy_salt.decode('latin-1') if record.legacy_salt is not None else None,
+        'notification_id': record.notification_id,
+        'priority': record.lane.name if record.lane is not None else None,
+        'expires_at': _wall_time(record.deadline) if record.deadline is not None else None,
+    }
+    return ujson.dumps(fields) + '\n'
+
+
+def _load(
+    line: str,
+    lanes: PriorityLanes,
+) -> t_pending:
+    fields = ujson.loads(line)
+    legacy_salt = fields['legacy_salt']
+    # Absent from files spilled before deadlines and lanes
+    expires_at = fields.get('expires_at')
+    priority = fields.get('priority')
+    record = CallbackRecord(
+        fields['url'],
+        fields['host'],
+        fields['encrypted_token'],
+        fields['body'].encode(),
+        fields['attempt_number'],
+        monotonic() - fields['age'],
+        legacy_salt.encode('latin-1') if legacy_salt is not None else None,
+        fields['notification_id'],
+        lane=lanes.lanes.get(priority) if priority is not None else None,
+        deadline=monotonic() + expires_at - time() if expires_at is not None else None,
+    )
+    return monotonic() + max(0.0, fields['due_at'] - time()), record
@@ -0,0 +1,443 @@
+"""Naia sqs module."""
+
+from __future__ import annotations
+
+import asyncio
+from collections import Counter
+from contextlib import AsyncExitStack
+from math import ceil
+from time import monotonic, time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+from aiobotocore.session import AioSession, get_session
+
+from notify_aia.log import log
+from notify_aia.services import LifespanService
+
+if TYPE_CHECKING:  # pragma: no cover
+    from notify_aia.clients.callback.processing import CallbackAsyncClient
+    from notify_aia.clients.callback.rest import RequestCallback
+
+# SQS limits
+_MAX_MESSAGES: int = 10
+_MAX_WAIT_SECONDS: int = 20
+_MAX_VISIBILITY_SECONDS: int = 12 * 60 * 60
+_MAX_DELAY_SECONDS: int = 15 * 60
+
+# Message attributes of a message sent again without being attempted, carrying over what its receive count and
+# SentTimestamp said about the original
+_ATTEMPTS: str = 'NaiaAttempts'
+_SENT_TIMESTAMP: str = 'NaiaSentTimestamp'
+
+
+class SqsCallbackConsumer(LifespanService):
+    """
+    Consume callback jobs from SQS and send them with a CallbackAsyncClient.
+
+    Message bodies are JSON RequestCallback objects, the same as the /callback/send body. Several pollers long-poll
+    ReceiveMessage concurrently and the tokens of each received batch are decrypted together. Each message gets one
+    attempt per receive:
+
+    - Delivered, or not retryable, messages are deleted in batches
+    - Messages that should be retried are left on the queue with their visibility timeout extended to the retry
+      delay, so SQS redelivers them when the retry is due. ApproximateReceiveCount is the attempt number.
+    - Messages with a future `deliver_at`, and messages for a Service host that cannot take another request, are not
+      attempted. They are sent again with DelaySeconds, until `deliver_at` or for a second or until the host's circuit
+      probes, and the received copy is deleted. The new copy's message attributes carry the attempts made and the
+      original SentTimestamp, so these receives are not counted as attempts. A busy host's messages do not hold an
+      in-flight slot until it has room.
+
+    While an attempt runs, including time spent waiting for a host's breaker or limiter, its message's visibility is
+    extended every third of `visibility_timeout` so SQS does not redeliver it to be sent a second time.
+    """
+
+    def __init__(
+        self,
+        queue_url: str,
+        callback_client: CallbackAsyncClient,
+        pollers: int = 4,
+        max_in_flight: int = 200,
+        wait_time_seconds: int = _MAX_WAIT_SECONDS,
+        delete_interval: float = 0.5,
+        visibility_timeout: float = 30,
+        session: Optional[AioSession] = None,
+        **client_kwargs: Any,
+    ) -> None:
+        """
+        Initialize the consumer.
+
+        Args:
+        ----
+            queue_url: str
+                SQS queue to consume
+            callback_client: CallbackAsyncClient
+                Makes the callback attempts
+            pollers: int
+                Concurrent ReceiveMessage loops
+            max_in_flight: int
+                Maximum messages being attempted at once
+            wait_time_seconds: int
+                ReceiveMessage long poll duration
+            delete_interval: float
+                Longest time a delivered message waits for a DeleteMessageBatch
+            visibility_timeout: float
+                Seconds a message being attempted is kept invisible for, extended until the attempt finishes
+            session: Optional[AioSession]
+                aiobotocore session, a default session is used if not provided
+            client_kwargs: Any
+                Passed to create_client, e.g. region_name or endpoint_url for a local SQS stand-in
+
+        """
+        self.queue_url = queue_url
+        self.callback_client = callback_client
+        self.pollers = pollers
+        self.max_in_flight = max(max_in_flight, _MAX_MESSAGES)
+        self.wait_time_seconds = min(wait_time_seconds, _MAX_WAIT_SECONDS)
+        self.delete_interval = delete_interval
+        self.visibility_timeout = visibility_timeout
+        self.session = session or get_session()
+        self.client_kwargs = client_kwargs
+
+        # Throughput counters
+        self.receive_calls: int = 0
+        self.received: int = 0
+        self.delivered: int = 0
+        self.retried: int = 0
+        self.dropped: int = 0
+        self.deleted: int = 0
+        self._started_at: Optional[float] = None
+
+        self._sqs: Any = None
+        self._exit_stack: Optional[AsyncExitStack] = None
+        # Messages that can still be attempted, a poller takes up to a batch of them at once
+        self._free: int = self.max_in_flight
+        self._freed = asyncio.Event()
+        self._tasks: List[asyncio.Task[None]] = []
+        self._in_flight: Set[asyncio.Task[None]] = set()
+        self._pending_deletes: List[str] = []
+
+    async def start(self) -> None:
+        """Create the SQS client and start polling."""
+        self._exit_stack = AsyncExitStack()
+        self._sqs = await self._exit_stack.enter_async_context(
+            self.session.create_client('sqs', **self.client_kwargs),
+        )
+        self._started_at = monotonic()
+        self._tasks = [asyncio.create_task(self._poll()) for _ in range(self.pollers)]
+        self._tasks.append(asyncio.create_task(self._delete_periodically()))
+        log('info', 'sqs.polling', queue_url=self.queue_url, pollers=self.pollers)
+
+    async def drain(self) -> None:
+        """Stop receiving messages. Deletes continue until stop."""
+        # The delete task is last
+        pollers, self._tasks = self._tasks[:-1], self._tasks[-1:]
+        for task in pollers:
+            task.cancel()
+        await asyncio.gather(*pollers, return_exceptions=True)
+
+    async def stop(self) -> None:
+        """Stop polling, finish in-flight attempts, delete what was delivered, and close the SQS client."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._in_flight:
+            await asyncio.wait(self._in_flight)
+        await self._flush_deletes()
+        if self._exit_stack is not None:
+            await self._exit_stack.aclose()
+            self._exit_stack = None
+            self._sqs = None
+
+    def stats(self) -> Dict[str, float]:
+        """Return the counters and delivered messages per second since start."""
+        elapsed = monotonic() - self._started_at if self._started_at else 0.0
+        return {
+            'receive_calls': self.receive_calls,
+            'received': self.received,
+            'delivered': self.delivered,
+            'retried': self.retried,
+            'dropped': self.dropped,
+            'deleted': self.deleted,
+            'in_flight': len(self._in_flight),
+            'delivered_per_second': self.delivered / elapsed if elapsed else 0.0,
+        }
+
+    async def _poll(self) -> None:
+        """Receive as many messages as there is capacity to attempt, up to a batch, whenever there is any."""
+        while True:
+            reserved = await self._reserve()
+            try:
+                messages = await self._receive(reserved)
+            except asyncio.CancelledError:
+                # Drained mid-poll, the capacity is not lost to the attempts still finishing
+                self._release(reserved)
+                raise
+            except Exception as exc:
+                self._release(reserved)
+                log(
+                    'error',
+                    'sqs.receive_failed',
+                    queue_url=self.queue_url,
+                    error_type=exc.__class__.__name__,
+                    error=exc,
+                )
+                await asyncio.sleep(1)
+                continue
+            # Unused capacity goes back to the pool
+            self._release(reserved - len(messages))
+            self._dispatch(messages)
+
+    def _dispatch(
+        self,
+        messages: List[Tuple[Dict[str, Any], Optional[RequestCallback], Any]],
+    ) -> None:
+        """Start an attempt for each due message, requeueing the others and those of hosts that cannot take another."""
+        started: Counter[str] = Counter()
+        for message, callback, bearer_token in messages:
+            host = urlsplit(str(callback.url)).netloc if callback is not None else ''
+            delay = _first_due(message, callback) - time() if callback is not None else 0.0
+            if host and started[host] >= self.callback_client.host_capacity(host):
+                delay = max(delay, self.callback_client.busy_delay(host))
+            if delay > 0:
+                # The slot is not needed to send the message again
+                self._release(1)
+                handling = self._requeue(message, delay)
+            else:
+                started[host] += 1
+                handling = self._handle(message, callback, bearer_token)
+            task = asyncio.create_task(handling)
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _receive(
+        self,
+        count: int,
+    ) -> List[Tuple[Dict[str, Any], Optional[RequestCallback], Any]]:
+        """Long poll for up to `count` messages, returning them with their decoded callback and token."""
+        self.receive_calls += 1
+        resp = await self._sqs.receive_message(
+            QueueUrl=self.queue_url,
+            MaxNumberOfMessages=count,
+            WaitTimeSeconds=self.wait_time_seconds,
+            MessageSystemAttributeNames=['ApproximateReceiveCount', 'SentTimestamp'],
+            MessageAttributeNames=[_ATTEMPTS, _SENT_TIMESTAMP],
+        )
+        messages: List[Dict[str, Any]] = resp.get('Messages', [])
+        self.received += len(messages)
+        decoded = await self.callback_client.decode_callbacks([message['Body'] for message in messages])
+        return [(message, callback, bearer_token) for message, (callback, bearer_token) in zip(messages, decoded)]
+
+    async def _handle(
+        self,
+        message: Dict[str, Any],
+        callback: Optional[RequestCallback],
+        bearer_token: Any,
+    ) -> None:
+        """Attempt the callback in a message then delete it or delay its redelivery."""
+        heartbeat = asyncio.create_task(self._keep_invisible(message['ReceiptHandle']))
+        try:
+            delay = await self._attempt(message, callback, bearer_token)
+            heartbeat.cancel()
+            if delay is None:
+                self._delete(message['ReceiptHandle'])
+            else:
+                self.retried += 1
+                await self._sqs.change_message_visibility(
+                    QueueUrl=self.queue_url,
+                    ReceiptHandle=message['ReceiptHandle'],
+                    VisibilityTimeout=min(ceil(delay), _MAX_VISIBILITY_SECONDS),
+                )
+        except Exception as exc:
+            # SQS redelivers the message once its visibility timeout passes
+            log(
+                'error',
+                'sqs.handle_failed',
+                message_id=message.get('MessageId'),
+                error_type=exc.__class__.__name__,
+                error=exc,
+            )
+        finally:
+            heartbeat.cancel()
+            self._release(1)
+
+    async def _keep_invisible(
+        self,
+        receipt_handle: str,
+    ) -> None:
+        """Extend a message's visibility until cancelled, when its attempt finishes."""
+        while True:
+            await asyncio.sleep(self.visibility_timeout / 3)
+            await self._defer(receipt_handle, self.visibility_timeout)
+
+    async def _defer(
+        self,
+        receipt_handle: str,
+        delay: float,
+    ) -> None:
+        """Make a message visible again in `delay` seconds, rounded up."""
+        try:
+            await self._sqs.change_message_visibility(
+                QueueUrl=self.queue_url,
+                ReceiptHandle=receipt_handle,
+                VisibilityTimeout=min(ceil(delay), _MAX_VISIBILITY_SECONDS),
+            )
+        except Exception as exc:
+            log(
+                'warning',
+                'sqs.visibility_failed',
+                queue_url=self.queue_url,
+                error_type=exc.__class__.__name__,
+                error=exc,
+            )
+
+    async def _requeue(
+        self,
+        message: Dict[str, Any],
+        delay: float,
+    ) -> None:
+        """Send an unattempted message again, due in `delay` seconds or at most 15 minutes, and delete this copy."""
+        try:
+            await self._sqs.send_message(
+                QueueUrl=self.queue_url,
+                MessageBody=message['Body'],
+                DelaySeconds=min(ceil(delay), _MAX_DELAY_SECONDS),
+                MessageAttributes={
+                    # This receive was not an attempt
+                    _ATTEMPTS: {'DataType': 'Number', 'StringValue': str(_attempt_number(message) - 1)},
+                    _SENT_TIMESTAMP: {'DataType': 'Number', 'StringValue': str(_sent_timestamp(message))},
+                },
+            )
+        except Exception as exc:
+            # SQS redelivers this copy once its visibility timeout passes
+            log(
+                'warning',
+                'sqs.requeue_failed',
+                message_id=message.get('MessageId'),
+                error_type=exc.__class__.__name__,
+                error=exc,
+            )
+            return
+        self._delete(message['ReceiptHandle'])
+
+    async def _attempt(
+        self,
+        message: Dict[str, Any],
+        callback: Optional[RequestCallback],
+        bearer_token: Any,
+    ) -> Optional[float]:
+        """Make one callback attempt. Returns the retry delay, None when the message is finished with."""
+        if callback is None or isinstance(bearer_token, ValueError):
+            # Malformed body or token, retrying will not help
+            self.dropped += 1
+            log(
+                'warning',
+                'sqs.message_dropped',
+                message_id=message.get('MessageId'),
+                reason=bearer_token or 'invalid RequestCallback',
+            )
+            return None
+
+        delay = await self.callback_client.try_callback_request(
+            url=callback.url,
+            encrypted_token=callback.encrypted_token,
+            payload=callback.payload,
+            attempt_number=_attempt_number(message),
+            start_time=monotonic() - (time() - _first_due(message, callback)),
+            bearer_token=bearer_token,
+            priority=callback.priority,
+            expires_at=callback.expires_at,
+        )
+        if delay is None:
+            self.delivered += 1
+        return delay
+
+    def _delete(
+        self,
+        receipt_handle: str,
+    ) -> None:
+        """Queue a message for the next DeleteMessageBatch, sending it now if a batch is full."""
+        self._pending_deletes.append(receipt_handle)
+        if len(self._pending_deletes) >= _MAX_MESSAGES:
+            task = asyncio.create_task(self._flush_deletes())
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _delete_periodically(self) -> None:
+        """Delete partial batches so delivered messages are not redelivered."""
+        while True:
+            await asyncio.sleep(self.delete_interval)
+            await self._flush_deletes()
+
+    async def _flush_deletes(self) -> None:
+        """Delete all pending messages, up to 10 per request."""
+        while self._pending_deletes:
+            batch = self._pending_deletes[:_MAX_MESSAGES]
+            del self._pending_deletes[:_MAX_MESSAGES]
+            try:
+                resp = await self._sqs.delete_message_batch(
+                    QueueUrl=self.queue_url,
+                    Entries=[{'Id': str(i), 'ReceiptHandle': handle} for i, handle in enumerate(batch)],
+                )
+            except Exception as exc:
+                log(
+                    'error', 'sqs.delete_failed', queue_url=self.queue_url, error_type=exc.__class__.__name__, error=exc
+                )
+                continue
+            self.deleted += len(resp.get('Successful', []))
+            for failure in resp.get('Failed', []):
+                log('warning', 'sqs.delete_rejected', failure=failure)
+
+    async def _reserve(self) -> int:
+        """Wait for room to attempt another message, then take room for up to a batch. Returns how much was taken."""
+        while not self._free:
+            self._freed.clear()
+            await self._freed.wait()
+        # Taken at once, pollers sharing a small capacity never each hold part of a batch
+        reserved = min(self._free, _MAX_MESSAGES)
+        self._free -= reserved
+        return reserved
+
+    def _release(
+        self,
+        count: int,
+    ) -> None:
+        """Return capacity reserved by _reserve."""
+        self._free += count
+        if count:
+            self._freed.set()
+
+
+def _message_attribute(
+    message: Dict[str, Any],
+    name: str,
+) -> Optional[int]:
+    """Return a number message attribute set by _requeue, None if the message was not requeued."""
+    attribute = message.get('MessageAttributes', {}).get(name)
+    return int(attribute['StringValue']) if attribute is not None else None
+
+
+def _attempt_number(message: Dict[str, Any]) -> int:
+    """Return the attempt a receive of the message is, counting the receives of copies it was requeued from."""
+    receive_count = int(message.get('Attributes', {}).get('ApproximateReceiveCount', 1))
+    return (_message_attribute(message, _ATTEMPTS) or 0) + receive_count
+
+
+def _sent_timestamp(message: Dict[str, Any]) -> int:
+    """Return when the message, or the first copy it was requeued from, was sent, in milliseconds."""
+    sent_timestamp = _message_attribute(message, _SENT_TIMESTAMP)
+    if sent_timestamp is None:
+        sent_timestamp = int(message.get('Attributes', {}).get('SentTimestamp', time() * 1000))
+    return sent_timestamp
+
+
+def _first_due(
+    message: Dict[str, Any],
+    callback: RequestCallback,
+) -> float:
+    """Return when a message was first due, when it was sent unless its delivery was delayed."""
+    sent_at = _sent_timestamp(message) / 1000
+    if callback.deliver_at is None:
+        return sent_at
+    return max(sent_at, callback.deliver_at.timestamp())
@@ -0,0 +1,131 @@
+"""Naia fairness module."""
+
+import asyncio
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from notify_aia.clients.lanes import DEFAULT_LANE, Lane, LaneQueue
+
+
+class DeficitRoundRobin:
+    """
+    Share a fixed number of connection slots fairly between hosts.
+
+    While slots are free they are taken immediately. Once they run out, each host waits in its own FIFO queue and free
+    slots are handed out by deficit round robin: every time a host reaches the front of the round it earns its weight
+    in credit and is served one request per credit before the next host's turn. A host's own waiters are served by
+    their priority lanes. A host with a million queued callbacks, or one whose requests take seconds, gets its share
+    rather than every slot, so a quiet host never waits behind it.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 100,
+        weights: Optional[Dict[str, float]] = None,
+        default_weight: float = 1.0,
+    ) -> None:
+        """
+        Initialize the scheduler.
+
+        Args:
+        ----
+            capacity: int
+                Requests in flight across every host, should match the connector's limit. 0 is unlimited.
+            weights: Optional[Dict[str, float]]
+                Host to its share relative to other hosts, weights below 1 earn a request over several rounds
+            default_weight: float
+                Weight of hosts not in `weights`
+
+        """
+        self.capacity = capacity
+        self.weights: Dict[str, float] = {}
+        for host, weight in (weights or {}).items():
+            self.set_weight(host, weight)
+        self.default_weight = _check_weight(default_weight)
+        self._in_flight: int = 0
+        self._queues: Dict[str, LaneQueue] = {}
+        # Hosts with waiters, in round order
+        self._round: Deque[str] = deque()
+        self._deficits: Dict[str, float] = {}
+
+    async def acquire(
+        self,
+        host: str,
+        lane: Lane = DEFAULT_LANE,
+    ) -> None:
+        """Wait for the host's turn at a free slot and take it, the host's higher priority lanes go first."""
+        if not self._round and (not self.capacity or self._in_flight < self.capacity):
+            self._in_flight += 1
+            return
+        waiter: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        queue = self._queues.get(host)
+        if queue is None:
+            queue = self._queues[host] = LaneQueue()
+            self._round.append(host)
+        queue.append(waiter, lane)
+        try:
+            # The slot is handed over by _dispatch
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+
+    def release(self) -> None:
+        """Return a slot and hand free slots to waiting hosts."""
+        self._in_flight -= 1
+        self._dispatch()
+
+    def set_weight(
+        self,
+        host: str,
+        weight: float,
+    ) -> None:
+        """Change the share of `host`."""
+        self.weights[host] = _check_weight(weight)
+
+    def in_flight(self) -> int:
+        """Return the slots taken."""
+        return self._in_flight
+
+    def waiting(self) -> Dict[str, int]:
+        """Return the requests waiting for a slot, by host."""
+        return {host: len(queue) for host, queue in self._queues.items()}
+
+    def _dispatch(self) -> None:
+        """Hand free slots out in deficit round robin order."""
+        while self._round and (not self.capacity or self._in_flight < self.capacity):
+            host = self._round[0]
+            if self._deficits.get(host, 0.0) < 1:
+                # The host's turn starts, it earns its weight
+                self._deficits[host] = self._deficits.get(host, 0.0) + self.weights.get(host, self.default_weight)
+            if self._deficits[host] < 1:
+                self._round.rotate(-1)
+                continue
+            self._serve(host)
+
+    def _serve(
+        self,
+        host: str,
+    ) -> None:
+        """Give the next waiter of the host at the front of the round a slot, ending its turn when it runs out."""
+        queue = self._queues[host]
+        waiter = queue.popleft()
+        # Cancelled waiters are skipped without spending credit
+        if not waiter.done():
+            self._deficits[host] -= 1
+            self._in_flight += 1
+            waiter.set_result(None)
+        if not queue:
+            # Idle hosts do not bank credit
+            del self._queues[host], self._deficits[host]
+            self._round.popleft()
+        elif self._deficits[host] < 1:
+            self._round.rotate(-1)
+
+
+def _check_weight(weight: float) -> float:
+    """Reject weights that would never earn a turn."""
+    if weight <= 0:
+        raise ValueError(f'Weights must be positive, got {weight}')
+    return weight
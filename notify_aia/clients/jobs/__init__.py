@@ -0,0 +1 @@
+"""Naia jobs folder."""
@@ -0,0 +1,241 @@
+"""Naia processing module."""
+
+from __future__ import annotations
+
+import inspect
+from functools import partial
+from time import monotonic
+from typing import TYPE_CHECKING, Any, Dict, Mapping, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+from uuid import uuid4
+
+import aiohttp
+import ujson
+
+from notify_aia.auth.encryption import decrypt
+from notify_aia.clients.async_client import RetryingAsyncClient
+from notify_aia.clients.jobs.templates import JobAuth, JobResponse, JobResult, RequestTemplate
+from notify_aia.clients.retry import retry_delay
+from notify_aia.clients.scheduler import RetryRecord
+from notify_aia.log import log
+from notify_aia.metrics import JOB_LATENCY, status_class
+
+if TYPE_CHECKING:  # pragma: no cover
+    from aiohttp.abc import AbstractResolver
+
+    from notify_aia.clients.jobs.templates import t_job_sink
+    from notify_aia.clients.tracing import t_phase_sink
+
+
+class JobRecord(RetryRecord):
+    """A RetryRecord for a job, with the template it was submitted against and its parameters for the result."""
+
+    __slots__ = ('method', 'template', 'params', 'job_id')
+
+    def __init__(
+        self,
+        template: RequestTemplate,
+        params: Mapping[str, Any],
+        encrypted_token: str,
+        job_id: str,
+    ) -> None:
+        """Render the template's request for `params`, raising ValueError if a parameter is missing."""
+        url = template.render_url(params)
+        super().__init__(url, urlsplit(url).netloc, encrypted_token, template.render_body(params), 1, monotonic())
+        self.method = template.method
+        self.template = template.name
+        self.params = params
+        self.job_id = job_id
+
+
+class JobAsyncClient(RetryingAsyncClient[JobRecord]):
+    """
+    Make outbound requests described by named RequestTemplates, e.g. profile or contact information lookups.
+
+    Jobs are retried, limited per host, and share connections fairly like callbacks. Pass the CallbackAsyncClient's
+    connector, limiter, breaker, and fair scheduler to share them with callbacks, as Naia does. Templates may set
+    their own retry criteria, stop, and wait, the client's are used otherwise.
+    """
+
+    def __init__(
+        self,
+        connector: Optional[aiohttp.TCPConnector] = None,
+        timeout: Optional[aiohttp.ClientTimeout] = None,
+        trace_sinks: Optional[Sequence[t_phase_sink]] = None,
+        sink: Optional[t_job_sink] = None,
+        resolver: Optional[AbstractResolver] = None,
+    ) -> None:
+        """Initialize the class. See AsyncClient for the other arguments, `sink` receives every finished job."""
+        super().__init__(connector=connector, timeout=timeout, trace_sinks=trace_sinks, resolver=resolver)
+        self.sink = sink
+        self.templates: Dict[str, RequestTemplate] = {}
+
+    def register(
+        self,
+        template: RequestTemplate,
+    ) -> None:
+        """Accept jobs for `template`, replacing any template with the same name."""
+        self.templates[template.name] = template
+
+    def prepare(
+        self,
+        name: str,
+        params: Mapping[str, Any],
+        encrypted_token: str = '',
+        job_id: Optional[str] = None,
+    ) -> JobRecord:
+        """
+        Build the record of a job without attempting it, so it can be validated before it is accepted.
+
+        Raises KeyError if no template is registered as `name`, and ValueError if a URL parameter or, for bearer
+        auth, the encrypted token is missing.
+        """
+        template = self.templates.get(name)
+        if template is None:
+            raise KeyError(f'Unknown job template {name}')
+        if template.auth is JobAuth.BEARER and not encrypted_token:
+            raise ValueError(f'Job template {name} requires an encrypted_token')
+        return JobRecord(template, params, encrypted_token, job_id or uuid4().hex)
+
+    async def run(
+        self,
+        record: JobRecord,
+    ) -> None:
+        """Make the first attempt of a prepared job. Retries are made by the retry scheduler."""
+        await self._deliver(record)
+
+    async def submit(
+        self,
+        name: str,
+        params: Mapping[str, Any],
+        encrypted_token: str = '',
+        job_id: Optional[str] = None,
+    ) -> str:
+        """Prepare and run a job, see prepare. Returns its job_id, the result goes to the template's sink."""
+        record = self.prepare(name, params, encrypted_token, job_id)
+        await self.run(record)
+        return record.job_id
+
+    async def _deliver(
+        self,
+        record: JobRecord,
+    ) -> None:
+        """Attempt the job, handing it to the retry scheduler if the attempt should be retried."""
+        template = self.templates[record.template]
+        try:
+            bearer_token = decrypt(record.encrypted_token) if template.auth is JobAuth.BEARER else None
+        except ValueError as exc:
+            log('warning', 'job.invalid_token', job_id=record.job_id, template=record.template, error=exc)
+            await self._finish(record, template, None, None, exc)
+            return
+        delay = await self._attempt(record, template, template.headers_for(bearer_token))
+        if delay is not None:
+            record.attempt_number += 1
+            self._retry_scheduler.schedule(record, monotonic() + delay)
+
+    async def _attempt_scheduled(
+        self,
+        record: JobRecord,
+    ) -> None:
+        """Attempt a job the retry scheduler found due. Only the encrypted token is held between attempts."""
+        if not self.host_capacity(record.host):
+            # Wait in the scheduler rather than holding one of its workers until the host can take the attempt
+            self._retry_scheduler.schedule(record, monotonic() + self.busy_delay(record.host))
+            return
+        await self._deliver(record)
+
+    async def _attempt(
+        self,
+        record: JobRecord,
+        template: RequestTemplate,
+        headers: Mapping[str, str],
+    ) -> Optional[float]:
+        """Make the request once and return the delay before retrying, None once the job is finished."""
+        try:
+            status, body = await self._request(record, template, headers)
+        except Exception as exc:
+            delay = retry_delay(
+                template.retry_criteria or self._retry_criteria,
+                template.retry_stop or self._retry_stop,
+                template.retry_wait or self._retry_wait,
+                record.attempt_number,
+                exc,
+                record.start_time,
+            )
+            if delay is None:
+                final_status = exc.status if isinstance(exc, aiohttp.ClientResponseError) else None
+                await self._finish(record, template, final_status, None, exc)
+            return delay
+        await self._finish(record, template, status, body)
+        return None
+
+    async def _request(
+        self,
+        record: JobRecord,
+        template: RequestTemplate,
+        headers: Mapping[str, str],
+    ) -> Tuple[int, Any]:
+        """Make the request once the host's circuit and limits allow it."""
+        return await self._send(record.host, partial(self._request_once, record, template, headers))
+
+    async def _request_once(
+        self,
+        record: JobRecord,
+        template: RequestTemplate,
+        headers: Mapping[str, str],
+    ) -> Tuple[int, Any]:
+        """Make the request and read the response as the template asks."""
+        start = monotonic()
+        status: Optional[int] = None
+        try:
+            log('debug', 'job.request', job_id=record.job_id, method=record.method, url=record.url)
+            async with self.client.request(
+                record.method, record.url, data=record.body or None, headers=headers
+            ) as resp:
+                status = resp.status
+                return status, await _read_response(resp, template.response)
+        finally:
+            JOB_LATENCY.observe(monotonic() - start, record.template, status_class(status))
+
+    async def _finish(
+        self,
+        record: JobRecord,
+        template: RequestTemplate,
+        status: Optional[int],
+        body: Any,
+        error: Optional[BaseException] = None,
+    ) -> None:
+        """Hand the job's result to its sink. A failing sink is logged, it does not fail the job."""
+        result = JobResult(record.job_id, record.template, record.params, status, body, record.attempt_number, error)
+        log(
+            'info' if result.ok else 'warning',
+            'job.finished',
+            job_id=record.job_id,
+            template=record.template,
+            status=status,
+            attempts=record.attempt_number,
+            error=error,
+        )
+        sink = template.sink or self.sink
+        if sink is None:
+            return
+        try:
+            outcome = sink(result)
+            if inspect.isawaitable(outcome):
+                await outcome
+        except Exception as exc:
+            log('error', 'job.sink_raised', job_id=record.job_id, error_type=exc.__class__.__name__, error=exc)
+
+
+async def _read_response(
+    resp: aiohttp.ClientResponse,
+    response: JobResponse,
+) -> Any:
+    """Raise for retryable statuses, otherwise read the body as `response`. Other error statuses are final results."""
+    if resp.status >= 500 or resp.status in (408, 429):
+        resp.raise_for_status()
+    if response is JobResponse.JSON:
+        return await resp.json(loads=ujson.loads, content_type=None)
+    if response is JobResponse.TEXT:
+        return await resp.text()
+    return None
@@ -0,0 +1,92 @@
+"""Naia rest module."""
+
+from __future__ import annotations
+
+from http import HTTPStatus
+from typing import TYPE_CHECKING, Dict, Optional
+
+from fastapi import APIRouter, BackgroundTasks, Request, status
+from fastapi.exceptions import HTTPException
+from pydantic import BaseModel
+from typing_extensions import Any
+
+from notify_aia.admission import request_bytes
+from notify_aia.clients.callback.handlers import CallbackLoggingRoute
+
+if TYPE_CHECKING:  # pragma: no cover
+    from notify_aia.clients.jobs.processing import JobAsyncClient, JobRecord
+    from notify_aia.naia import Naia
+
+
+_APP: Naia
+
+jobs_router = APIRouter(
+    prefix='/jobs',
+    tags=['jobs'],
+    responses={404: {'description': 'Not found'}},
+    route_class=CallbackLoggingRoute,
+)
+
+
+class RequestJob(BaseModel):
+    """API spec for job requests, submitted against a registered request template."""
+
+    params: Dict[str, Any] = {}
+    # Required by templates with bearer auth
+    encrypted_token: str = ''
+    # Generated if not set, reported with the job's result
+    job_id: Optional[str] = None
+
+    model_config = {
+        'json_schema_extra': {
+            'examples': [
+                {
+                    'params': {'profile_id': '1234'},
+                    'encrypted_token': 'eyJhIjoxMCwiaGVsbG8iOiJieWUiLCJteV9saXN0IjpbMiwzLDUsNywxMV19',
+                }
+            ]
+        }
+    }
+
+
+class ResponseJob(BaseModel):
+    """Response to job requests."""
+
+    job_id: str
+
+
+def set_app(app: Naia) -> None:
+    """Set global app variable."""
+    global _APP
+    _APP = app
+
+
+@jobs_router.post('/{name}', status_code=status.HTTP_202_ACCEPTED, summary='Submit a job')
+async def submit_job(
+    name: str,
+    data: RequestJob,
+    request: Request,
+    background_tasks: BackgroundTasks,
+) -> ResponseJob:
+    """Validate a job against the `name` request template and make its request. The result goes to the sink."""
+    _APP.admission.enforce()
+    job_client = _APP.job_client
+    assert job_client is not None
+    record = _prepare(job_client, name, data)
+    # Do not wait for the response
+    background_tasks.add_task(_APP.admission.run_admitted, 1, request_bytes(request), job_client.run, record)
+    return ResponseJob(job_id=record.job_id)
+
+
+def _prepare(
+    job_client: JobAsyncClient,
+    name: str,
+    data: RequestJob,
+) -> JobRecord:
+    """Build the job's record, 404 if the template is unknown and 422 if the job does not fit it."""
+    try:
+        return job_client.prepare(name, data.params, data.encrypted_token, data.job_id)
+    except KeyError as exc:
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail=exc.args[0]) from exc
+    except ValueError as exc:
+        raise HTTPException(status_code=HTTPStatus.UNPROCESSABLE_ENTITY, detail=str(exc)) from exc
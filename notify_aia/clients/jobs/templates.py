@@ -0,0 +1,165 @@
+"""Naia templates module."""
+
+from __future__ import annotations
+
+from enum import Enum
+from types import MappingProxyType
+from typing import Any, Awaitable, Callable, Dict, Mapping, Optional, Union
+from urllib.parse import quote
+
+import ujson
+from tenacity.retry import retry_base
+from tenacity.stop import stop_base
+from tenacity.wait import wait_base
+
+
+class JobAuth(str, Enum):
+    """Where the Authorization header of a job's requests comes from."""
+
+    NONE = 'none'
+    # The job's encrypted_token, decrypted before each attempt and sent as a bearer token
+    BEARER = 'bearer'
+
+
+class JobResponse(str, Enum):
+    """How the body of a job's final response is read for its JobResult."""
+
+    JSON = 'json'
+    TEXT = 'text'
+    # The body is discarded, only the status is reported
+    NONE = 'none'
+
+
+class JobResult:
+    """Outcome of a job, handed to its template's sink once no attempts are left."""
+
+    __slots__ = ('job_id', 'template', 'params', 'status', 'body', 'attempts', 'error')
+
+    def __init__(
+        self,
+        job_id: str,
+        template: str,
+        params: Mapping[str, Any],
+        status: Optional[int],
+        body: Any,
+        attempts: int,
+        error: Optional[BaseException] = None,
+    ) -> None:
+        """Initialize the result."""
+        self.job_id = job_id
+        self.template = template
+        self.params = params
+        # None if no response was received
+        self.status = status
+        # Read as the template's JobResponse, None if there was no response or it was not read
+        self.body = body
+        self.attempts = attempts
+        # The exception of the last attempt, if it failed without a final response
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        """Whether the job got a successful response."""
+        return self.error is None and self.status is not None and self.status < 400
+
+
+# Receives every finished job, may be a coroutine function
+t_job_sink = Callable[[JobResult], Union[None, Awaitable[None]]]
+# Builds the JSON body of a job's requests from its parameters
+t_body_builder = Callable[[Mapping[str, Any]], Any]
+
+
+class RequestTemplate:
+    """
+    Named description of an outbound request that jobs are submitted against.
+
+    The URL is a `str.format` pattern filled with the job's parameters, each URL encoded, e.g.
+    `https://profile.example.com/v1/profiles/{profile_id}`.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        url: str,
+        method: str = 'GET',
+        auth: JobAuth = JobAuth.NONE,
+        headers: Optional[Mapping[str, str]] = None,
+        body: Optional[t_body_builder] = None,
+        response: JobResponse = JobResponse.JSON,
+        retry_criteria: Optional[retry_base] = None,
+        retry_stop: Optional[stop_base] = None,
+        retry_wait: Optional[wait_base] = None,
+        sink: Optional[t_job_sink] = None,
+    ) -> None:
+        """
+        Initialize the template.
+
+        Args:
+        ----
+            name: str
+                Jobs are submitted by this name
+            url: str
+                URL pattern, `{param}` fields are replaced by URL encoded job parameters
+            method: str
+                HTTP method
+            auth: JobAuth
+                Where the Authorization header comes from
+            headers: Optional[Mapping[str, str]]
+                Sent with every request
+            body: Optional[Callable[[Mapping[str, Any]], Any]]
+                Builds the JSON body from the job's parameters, no body if None
+            response: JobResponse
+                How the final response body is read
+            retry_criteria: Optional[retry_base]
+                Which failed attempts are retried, the JobAsyncClient's criteria if None
+            retry_stop: Optional[stop_base]
+                When to stop retrying, the JobAsyncClient's stop if None
+            retry_wait: Optional[wait_base]
+                Delay between attempts, the JobAsyncClient's wait if None
+            sink: Optional[Callable[[JobResult], Optional[Awaitable[None]]]]
+                Receives the results of this template's jobs, the JobAsyncClient's sink if None
+
+        """
+        self.name = name
+        self.url = url
+        self.method = method.upper()
+        self.auth = JobAuth(auth)
+        headers = dict(headers or {})
+        if body is not None:
+            headers.setdefault('Content-Type', 'application/json')
+        self.headers: Mapping[str, str] = MappingProxyType(headers)
+        self.body = body
+        self.response = JobResponse(response)
+        self.retry_criteria = retry_criteria
+        self.retry_stop = retry_stop
+        self.retry_wait = retry_wait
+        self.sink = sink
+
+    def render_url(
+        self,
+        params: Mapping[str, Any],
+    ) -> str:
+        """Fill the URL pattern with the job's parameters. Raises ValueError if one is missing."""
+        try:
+            return self.url.format_map({key: quote(str(value), safe='') for key, value in params.items()})
+        except KeyError as exc:
+            raise ValueError(f'Job template {self.name} requires parameter {exc}') from exc
+
+    def render_body(
+        self,
+        params: Mapping[str, Any],
+    ) -> bytes:
+        """Serialize the request body built from the job's parameters once, b'' if the template has none."""
+        if self.body is None:
+            return b''
+        return ujson.dumps(self.body(params)).encode()
+
+    def headers_for(
+        self,
+        bearer_token: Any,
+    ) -> Dict[str, str]:
+        """Return the headers of an attempt made with `bearer_token`, ignored unless auth is BEARER."""
+        headers = dict(self.headers)
+        if self.auth is JobAuth.BEARER:
+            headers['Authorization'] = f'Bearer {bearer_token}'
+        return headers
@@ -0,0 +1,119 @@
+"""Naia lanes module."""
+
+import asyncio
+from collections import deque
+from typing import Deque, Dict
+
+
+class Lane:
+    """Priority class of requests, with its share of the turns when requests of several lanes wait for one host."""
+
+    __slots__ = ('name', 'share')
+
+    def __init__(
+        self,
+        name: str,
+        share: float,
+    ) -> None:
+        """Initialize the lane. Raises ValueError if `share` would never earn a turn."""
+        if share <= 0:
+            raise ValueError(f'Lane shares must be positive, got {share}')
+        self.name = name
+        self.share = share
+
+    def __repr__(self) -> str:
+        """Name the lane in logs and test output."""
+        return f'Lane({self.name!r}, {self.share})'
+
+
+# Lane of requests that were not given one, including every request when priority lanes are not used
+DEFAULT_LANE = Lane('normal', 4.0)
+
+
+class LaneQueue:
+    """
+    Waiters for one host, in a FIFO per lane, taken in deficit round robin order between lanes.
+
+    Every time a lane reaches the front of the round it earns its share in credit and gives up one waiter per credit,
+    so a lane with twice the share gets twice the turns while both are waiting. With a single lane it is a FIFO.
+    """
+
+    __slots__ = ('_queues', '_round', '_deficits')
+
+    def __init__(self) -> None:
+        """Initialize an empty queue."""
+        self._queues: Dict[Lane, Deque[asyncio.Future[None]]] = {}
+        # Lanes with waiters, in round order
+        self._round: Deque[Lane] = deque()
+        self._deficits: Dict[Lane, float] = {}
+
+    def __len__(self) -> int:
+        """Return the waiters in every lane."""
+        return sum(len(queue) for queue in self._queues.values())
+
+    def __contains__(
+        self,
+        waiter: object,
+    ) -> bool:
+        """Whether `waiter` is still waiting."""
+        return any(waiter in queue for queue in self._queues.values())
+
+    def append(
+        self,
+        waiter: asyncio.Future[None],
+        lane: Lane = DEFAULT_LANE,
+    ) -> None:
+        """Add a waiter at the back of its lane."""
+        queue = self._queues.get(lane)
+        if queue is None:
+            queue = self._queues[lane] = deque()
+            self._deficits[lane] = 0.0
+            self._round.append(lane)
+        queue.append(waiter)
+
+    def remove(
+        self,
+        waiter: asyncio.Future[None],
+    ) -> None:
+        """Remove a waiter that gave up. Raises ValueError if it is not waiting."""
+        for lane, queue in self._queues.items():
+            if waiter in queue:
+                queue.remove(waiter)
+                if not queue:
+                    self._drop(lane)
+                return
+        raise ValueError('Waiter is not queued')
+
+    def popleft(self) -> asyncio.Future[None]:
+        """Remove and return the next waiter. Raises IndexError if there are none."""
+        if not self._round:
+            raise IndexError('pop from an empty LaneQueue')
+        lane = self._next_lane()
+        queue = self._queues[lane]
+        waiter = queue.popleft()
+        # Waiters that were cancelled do not spend credit
+        if not waiter.done():
+            self._deficits[lane] -= 1
+        if not queue:
+            self._drop(lane)
+        elif self._deficits[lane] < 1:
+            self._round.rotate(-1)
+        return waiter
+
+    def _next_lane(self) -> Lane:
+        """Return the first lane in the round with credit, starting the turns of the lanes before it."""
+        while self._deficits[self._round[0]] < 1:
+            # The lane's turn starts, it earns its share
+            lane = self._round[0]
+            self._deficits[lane] += lane.share
+            if self._deficits[lane] < 1:
+                self._round.rotate(-1)
+        return self._round[0]
+
+    def _drop(
+        self,
+        lane: Lane,
+    ) -> None:
+        """Remove a lane that ran out of waiters, idle lanes do not bank credit."""
+        del self._queues[lane], self._deficits[lane]
+        self._round.remove(lane)
@@ -0,0 +1,167 @@
+"""Naia limiter module."""
+
+import asyncio
+from time import monotonic
+from typing import Dict, Optional
+
+from notify_aia.clients.lanes import DEFAULT_LANE, Lane, LaneQueue
+
+
+class HostLimit:
+    """Concurrency limit and in-flight requests for one host."""
+
+    __slots__ = ('limit', 'in_flight', 'last_decrease', 'waiters')
+
+    def __init__(
+        self,
+        limit: float,
+    ) -> None:
+        """Initialize the host limit."""
+        self.limit = limit
+        self.in_flight: int = 0
+        self.last_decrease: float = 0.0
+        self.waiters = LaneQueue()
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Per-host additive increase, multiplicative decrease (AIMD) concurrency limiter.
+
+    Each host starts at `initial_limit` concurrent requests. Every healthy response, one faster than
+    `latency_target`, while the host is using its limit grows the limit by `increase / limit`, so about `increase`
+    per round trip of the whole window. A 429, 5xx, or timeout multiplies the limit by `decrease_factor`, at most once
+    per `decrease_cooldown` so a burst of failures from a single window only counts once.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 10,
+        min_limit: int = 1,
+        max_limit: int = 50,
+        increase: float = 1.0,
+        decrease_factor: float = 0.5,
+        latency_target: float = 1.0,
+        decrease_cooldown: float = 1.0,
+    ) -> None:
+        """
+        Initialize the limiter.
+
+        Args:
+        ----
+            initial_limit: int
+                Limit for a host that has not been seen before
+            min_limit: int
+                Floor a failing host can be cut to
+            max_limit: int
+                Ceiling, should not exceed the connector's limit_per_host
+            increase: float
+                Growth per full window of healthy responses
+            decrease_factor: float
+                Multiplier applied on overload
+            latency_target: float
+                Slowest response, in seconds, that still counts as healthy
+            decrease_cooldown: float
+                Minimum seconds between decreases for a host
+
+        """
+        self.initial_limit = initial_limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self.latency_target = latency_target
+        self.decrease_cooldown = decrease_cooldown
+        self._hosts: Dict[str, HostLimit] = {}
+
+    async def acquire(
+        self,
+        host: str,
+        lane: Lane = DEFAULT_LANE,
+    ) -> None:
+        """Wait until `host` is below its limit and take a slot, ahead of lower priority lanes while it is not."""
+        host_limit = self._hosts.get(host)
+        if host_limit is None:
+            host_limit = self._hosts[host] = HostLimit(float(self.initial_limit))
+
+        if host_limit.in_flight >= int(host_limit.limit) or host_limit.waiters:
+            waiter: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+            host_limit.waiters.append(waiter, lane)
+            try:
+                # The slot is handed over by _wake
+                await waiter
+            except asyncio.CancelledError:
+                self._abandon(host_limit, waiter)
+                raise
+        else:
+            host_limit.in_flight += 1
+
+    def release(
+        self,
+        host: str,
+        latency: float,
+        overloaded: bool,
+    ) -> None:
+        """Return a slot and adjust the limit for `host` using the outcome of the request."""
+        host_limit = self._hosts[host]
+        host_limit.in_flight -= 1
+        if overloaded:
+            self._decrease(host_limit)
+        elif latency <= self.latency_target and host_limit.in_flight + 1 >= int(host_limit.limit):
+            # Only grow when the current limit is actually being used
+            host_limit.limit = min(float(self.max_limit), host_limit.limit + self.increase / host_limit.limit)
+        self._wake(host_limit)
+
+    def available(
+        self,
+        host: str,
+    ) -> int:
+        """Return the slots an acquire for `host` would take without waiting, 0 while others are already waiting."""
+        host_limit = self._hosts.get(host)
+        if host_limit is None:
+            return self.initial_limit
+        if host_limit.waiters:
+            return 0
+        return max(0, int(host_limit.limit) - host_limit.in_flight)
+
+    def limits(self) -> Dict[str, int]:
+        """Return the current concurrency limit of every host seen."""
+        return {host: int(host_limit.limit) for host, host_limit in self._hosts.items()}
+
+    def in_flight(
+        self,
+        host: Optional[str] = None,
+    ) -> int:
+        """Return requests in flight to `host`, or to every host."""
+        if host is not None:
+            return self._hosts[host].in_flight if host in self._hosts else 0
+        return sum(host_limit.in_flight for host_limit in self._hosts.values())
+
+    def _decrease(
+        self,
+        host_limit: HostLimit,
+    ) -> None:
+        now = monotonic()
+        if now - host_limit.last_decrease >= self.decrease_cooldown:
+            host_limit.limit = max(float(self.min_limit), host_limit.limit * self.decrease_factor)
+            host_limit.last_decrease = now
+
+    @staticmethod
+    def _wake(host_limit: HostLimit) -> None:
+        """Hand free slots to waiters in lane order, then arrival order."""
+        while host_limit.waiters and host_limit.in_flight < int(host_limit.limit):
+            waiter = host_limit.waiters.popleft()
+            if not waiter.done():
+                host_limit.in_flight += 1
+                waiter.set_result(None)
+
+    def _abandon(
+        self,
+        host_limit: HostLimit,
+        waiter: asyncio.Future[None],
+    ) -> None:
+        """Clean up after a cancelled acquire, giving back the slot if it had already been handed over."""
+        if waiter in host_limit.waiters:
+            host_limit.waiters.remove(waiter)
+        elif waiter.done() and not waiter.cancelled():
+            host_limit.in_flight -= 1
+            self._wake(host_limit)
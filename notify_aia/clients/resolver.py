@@ -0,0 +1,175 @@
+"""Naia resolver module."""
+
+import asyncio
+import socket
+from time import monotonic
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiohttp.abc import AbstractResolver
+from aiohttp.resolver import DefaultResolver
+
+from notify_aia.log import log
+from notify_aia.metrics import DNS_LATENCY, DNS_LOOKUPS
+
+# ResolveResult dicts, only a TypedDict in newer aiohttp
+t_addresses = List[Any]
+# (host, port, family)
+t_resolver_key = Tuple[str, int, int]
+
+
+class ResolvedHost:
+    """Cached answer for one host: its addresses, or the error its lookup failed with."""
+
+    __slots__ = ('addresses', 'error', 'expires_at', 'turn')
+
+    def __init__(
+        self,
+        addresses: Optional[t_addresses],
+        error: Optional[OSError],
+        expires_at: float,
+    ) -> None:
+        """Initialize the answer."""
+        self.addresses = addresses
+        self.error = error
+        # time.monotonic() the answer is used until
+        self.expires_at = expires_at
+        # Index of the address returned first next time
+        self.turn = 0
+
+    def next_addresses(self) -> t_addresses:
+        """Return the addresses rotated by one more each call, spreading connections over a host's addresses."""
+        assert self.addresses is not None
+        turn, self.turn = self.turn, (self.turn + 1) % max(1, len(self.addresses))
+        return self.addresses[turn:] + self.addresses[:turn]
+
+
+class CachingResolver(AbstractResolver):
+    """
+    DNS cache in front of another resolver, aiohttp's default (threaded) resolver unless one is given.
+
+    Callbacks that find a host uncached share a single lookup, so a burst for a host whose answer expired costs one
+    query rather than one executor job each. A host used within `prefetch` seconds of its answer expiring is looked up
+    again in the background, so hosts in steady use never wait for DNS. Failed lookups are cached for `negative_ttl`
+    seconds and fail fast, while a failed refresh keeps the previous answer until it expires.
+
+    Like aiohttp's own cache, which this replaces, each answer rotates a host's addresses so new connections are spread
+    over all of them.
+    """
+
+    def __init__(
+        self,
+        resolver: Optional[AbstractResolver] = None,
+        ttl: float = 120.0,
+        negative_ttl: float = 5.0,
+        prefetch: float = 10.0,
+        max_hosts: int = 1000,
+    ) -> None:
+        """
+        Initialize the cache.
+
+        Args:
+        ----
+            resolver: Optional[AbstractResolver]
+                Makes the lookups, e.g. a fake resolver in tests. Closed with the cache.
+            ttl: float
+                Seconds addresses are used for
+            negative_ttl: float
+                Seconds a failed lookup is remembered for
+            prefetch: float
+                Seconds before an answer expires that using it starts a background refresh
+            max_hosts: int
+                Answers cached before the oldest are dropped
+
+        """
+        self.resolver = resolver or DefaultResolver()
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.prefetch = prefetch
+        self.max_hosts = max_hosts
+        # Insertion order is the order answers were stored in
+        self._hosts: Dict[t_resolver_key, ResolvedHost] = {}
+        self._lookups: Dict[t_resolver_key, asyncio.Task[ResolvedHost]] = {}
+
+    async def resolve(
+        self,
+        host: str,
+        port: int = 0,
+        family: int = socket.AF_INET,
+    ) -> t_addresses:
+        """Return the addresses of `host` from the cache, looking them up if needed. Raises OSError if it fails."""
+        key = (host, port, int(family))
+        answer = self._hosts.get(key)
+        now = monotonic()
+        if answer is None or answer.expires_at <= now:
+            DNS_LOOKUPS.inc('coalesced' if key in self._lookups else 'miss')
+            # Shielded, a caller that gives up does not cancel the lookup the others are waiting for
+            answer = await asyncio.shield(self._lookup(key))
+        elif answer.error is not None:
+            DNS_LOOKUPS.inc('negative_hit')
+        else:
+            DNS_LOOKUPS.inc('hit')
+            if answer.expires_at - now < self.prefetch and key not in self._lookups:
+                self._lookup(key).add_done_callback(_refreshed)
+        if answer.error is not None:
+            # Without the traceback of every earlier raise
+            raise answer.error.with_traceback(None)
+        return answer.next_addresses()
+
+    async def close(self) -> None:
+        """Cancel lookups in progress and close the resolver."""
+        for task in self._lookups.values():
+            task.cancel()
+        await asyncio.gather(*self._lookups.values(), return_exceptions=True)
+        await self.resolver.close()
+
+    def cached_hosts(self) -> int:
+        """Return the answers cached, including failures and expired answers not yet replaced."""
+        return len(self._hosts)
+
+    def _lookup(
+        self,
+        key: t_resolver_key,
+    ) -> asyncio.Task[ResolvedHost]:
+        """Return the lookup in progress for `key`, starting one if there is none."""
+        task = self._lookups.get(key)
+        if task is None:
+            task = self._lookups[key] = asyncio.create_task(self._query(key))
+            task.add_done_callback(lambda _: self._lookups.pop(key, None))
+        return task
+
+    async def _query(
+        self,
+        key: t_resolver_key,
+    ) -> ResolvedHost:
+        """Look `key` up with the resolver and cache the answer."""
+        host, port, family = key
+        start = monotonic()
+        try:
+            addresses = await self.resolver.resolve(host, port, socket.AddressFamily(family))
+        except OSError as exc:
+            DNS_LATENCY.observe(monotonic() - start, 'error')
+            previous = self._hosts.get(key)
+            if previous is not None and previous.error is None and previous.expires_at > monotonic():
+                # A failed refresh, the previous addresses are still good
+                return previous
+            return self._store(key, ResolvedHost(None, exc, monotonic() + self.negative_ttl))
+        DNS_LATENCY.observe(monotonic() - start, 'ok')
+        return self._store(key, ResolvedHost(addresses, None, monotonic() + self.ttl))
+
+    def _store(
+        self,
+        key: t_resolver_key,
+        answer: ResolvedHost,
+    ) -> ResolvedHost:
+        """Cache an answer, dropping the oldest beyond `max_hosts`."""
+        self._hosts.pop(key, None)
+        if len(self._hosts) >= self.max_hosts:
+            del self._hosts[next(iter(self._hosts))]
+        self._hosts[key] = answer
+        return answer
+
+
+def _refreshed(task: asyncio.Task[ResolvedHost]) -> None:
+    """Retrieve the outcome of a background refresh nobody awaits, failures are cached or logged."""
+    if not task.cancelled() and task.exception() is not None:
+        log('warning', 'dns.refresh_failed', error=task.exception())
@@ -0,0 +1,60 @@
+"""Naia retry module."""
+
+import asyncio
+from typing import Optional
+
+import aiohttp
+from tenacity import (
+    AsyncRetrying,
+    RetryCallState,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_random_exponential,
+)
+from tenacity.retry import retry_base
+from tenacity.stop import stop_base
+from tenacity.wait import wait_base
+
+# Retryable responses are raised as ClientResponseError, final ones are not raised at all
+RETRY_CRITERIA = retry_if_exception_type(aiohttp.ClientResponseError)
+
+RETRY_ATTEMPTS: int = 10
+RETRY_STOP = stop_after_attempt(RETRY_ATTEMPTS)
+
+RETRY_WAIT = wait_random_exponential(
+    multiplier=2.0,
+    max=60,
+    exp_base=2.0,
+    min=0.0,
+)
+
+
+def retry_delay(
+    retry_criteria: retry_base,
+    retry_stop: stop_base,
+    retry_wait: wait_base,
+    attempt_number: int,
+    exc: BaseException,
+    start_time: float,
+) -> Optional[float]:
+    """Apply the retry criteria, stop, and wait to a failed attempt. Returns None if it should not be retried."""
+    retry_state = RetryCallState(
+        retry_object=AsyncRetrying(wait=retry_wait, stop=retry_stop, retry=retry_criteria),
+        fn=None,
+        args=(),
+        kwargs={},
+    )
+    retry_state.start_time = start_time
+    retry_state.attempt_number = attempt_number
+    retry_state.set_exception((type(exc), exc, exc.__traceback__))
+
+    if not retry_criteria(retry_state) or retry_stop(retry_state):
+        return None
+    return retry_wait(retry_state)
+
+
+def is_overload(exc: BaseException) -> bool:
+    """Whether a failed request indicates the host is overloaded: a timeout, 408, 429, or 5xx."""
+    if isinstance(exc, aiohttp.ClientResponseError):
+        return exc.status >= 500 or exc.status in (408, 429)
+    return isinstance(exc, asyncio.TimeoutError)
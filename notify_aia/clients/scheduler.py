@@ -0,0 +1,178 @@
+"""Naia scheduler module."""
+
+import asyncio
+import heapq
+from itertools import count
+from time import monotonic
+from typing import Awaitable, Callable, Generic, List, Optional, Tuple, TypeVar
+
+from notify_aia.log import log
+from notify_aia.services import LifespanService
+
+
+class RetryRecord:
+    """
+    Everything needed to make the next attempt of a request, without holding models or the plaintext token.
+
+    Subclasses add what their client needs, e.g. CallbackRecord and JobRecord.
+    """
+
+    __slots__ = (
+        'url',
+        'host',
+        'encrypted_token',
+        'body',
+        'attempt_number',
+        'start_time',
+    )
+
+    def __init__(
+        self,
+        url: str,
+        host: str,
+        encrypted_token: str,
+        body: bytes,
+        attempt_number: int,
+        start_time: float,
+    ) -> None:
+        """Initialize the record."""
+        self.url = url
+        self.host = host
+        self.encrypted_token = encrypted_token
+        # Serialized request body, the same bytes for every attempt
+        self.body = body
+        self.attempt_number = attempt_number
+        # time.monotonic() of the first attempt
+        self.start_time = start_time
+
+
+# The RetryRecord subclass a scheduler holds
+RecordType = TypeVar('RecordType', bound=RetryRecord)
+
+
+class RetryScheduler(LifespanService, Generic[RecordType]):
+    """
+    Single timer heap of records waiting for their next attempt.
+
+    One timer task sleeps until the earliest record is due and moves every due record to a ready queue that a fixed
+    pool of workers drains, so waiting records cost a heap entry rather than a sleeping coroutine each. `deliver`
+    should schedule a record again, rather than wait, when its host cannot take the attempt yet, so one slow host
+    never holds every worker.
+    """
+
+    def __init__(
+        self,
+        deliver: Callable[[RecordType], Awaitable[None]],
+        workers: int = 100,
+    ) -> None:
+        """
+        Initialize the scheduler.
+
+        Args:
+        ----
+            deliver: Callable[[RecordType], Awaitable[None]]
+                Makes the attempt for a due record, rescheduling it if necessary
+            workers: int
+                Maximum due records being delivered at once
+
+        """
+        self.deliver = deliver
+        self.workers = workers
+        self._heap: List[Tuple[float, int, RecordType]] = []
+        # Request bytes held by records waiting or ready for an attempt
+        self.pending_bytes: int = 0
+        # Records being delivered by a worker
+        self.attempting: int = 0
+        self._paused = False
+        # Tie breaker so records are never compared
+        self._sequence = count()
+        self._ready: Optional[asyncio.Queue[RecordType]] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task[None]] = []
+
+    @property
+    def running(self) -> bool:
+        """Whether the timer and workers have been started."""
+        return bool(self._tasks)
+
+    async def start(self) -> None:
+        """Start the timer and the worker pool."""
+        if self.running:
+            return
+        self._ready = asyncio.Queue()
+        self._wake = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._timer())]
+        self._tasks.extend(asyncio.create_task(self._worker()) for _ in range(self.workers))
+
+    def pause(self) -> None:
+        """Stop starting attempts, records due or scheduled from now on wait in the heap until take_pending."""
+        self._paused = True
+        if self._tasks:
+            # The timer is always first
+            self._tasks[0].cancel()
+        while self._ready is not None and not self._ready.empty():
+            record = self._ready.get_nowait()
+            heapq.heappush(self._heap, (monotonic(), next(self._sequence), record))
+
+    def take_pending(self) -> List[Tuple[float, RecordType]]:
+        """Remove and return every record waiting for an attempt with its due time, to hand them to another process."""
+        pending = [(due, record) for due, _, record in sorted(self._heap)]
+        self._heap = []
+        self.pending_bytes = 0
+        return pending
+
+    async def stop(self) -> None:
+        """Stop the timer and workers. Records still waiting are abandoned."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self.pending():
+            log('warning', 'retry.abandoned', count=self.pending())
+
+    def schedule(
+        self,
+        record: RecordType,
+        due: float,
+    ) -> None:
+        """Make the next attempt of `record` at `due`, a time.monotonic() value."""
+        if not self.running and not self._paused:
+            # Started lazily for clients used outside of Naia.lifespan
+            asyncio.get_running_loop().create_task(self.start())
+        earliest = self._heap[0][0] if self._heap else None
+        heapq.heappush(self._heap, (due, next(self._sequence), record))
+        self.pending_bytes += len(record.body)
+        if self._wake is not None and (earliest is None or due < earliest):
+            self._wake.set()
+
+    def pending(self) -> int:
+        """Return the number of records waiting or ready for an attempt."""
+        return len(self._heap) + (self._ready.qsize() if self._ready is not None else 0)
+
+    async def _timer(self) -> None:
+        """Move due records to the ready queue, sleeping until the next one is due or an earlier one is scheduled."""
+        assert self._ready is not None and self._wake is not None
+        while True:
+            now = monotonic()
+            while self._heap and self._heap[0][0] <= now:
+                self._ready.put_nowait(heapq.heappop(self._heap)[2])
+            timeout = self._heap[0][0] - now if self._heap else None
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _worker(self) -> None:
+        """Deliver ready records one at a time."""
+        assert self._ready is not None
+        while True:
+            record = await self._ready.get()
+            self.pending_bytes -= len(record.body)
+            self.attempting += 1
+            try:
+                await self.deliver(record)
+            except Exception as exc:
+                log('error', 'retry.attempt_raised', url=record.url, error_type=exc.__class__.__name__, error=exc)
+            finally:
+                self.attempting -= 1
@@ -0,0 +1,256 @@
+"""Naia tracing module."""
+
+from time import monotonic, time
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Optional, Sequence
+
+import aiohttp
+
+from notify_aia.log import log
+from notify_aia.metrics import PHASE_LATENCY, host_label
+
+PHASES = ('queued', 'dns', 'connect', 'request_sent', 'first_byte', 'total')
+
+
+class RequestPhases:
+    """
+    Where the time went for one request, in seconds.
+
+    - queued: waiting for a connection from the pool, non-zero when the connector limits are exhausted
+    - dns: resolving the host, 0.0 when cached
+    - connect: TCP connect and TLS handshake, 0.0 when a pooled connection was reused
+    - request_sent: writing the request headers and body
+    - first_byte: waiting for the response headers
+    - total: start of the request to the response headers
+    """
+
+    __slots__ = (
+        'method',
+        'url',
+        'host',
+        'status',
+        'error',
+        'reused',
+        'started_at',
+        'queued',
+        'dns',
+        'connect',
+        'request_sent',
+        'first_byte',
+        'total',
+    )
+
+    def __init__(
+        self,
+        method: str,
+        url: str,
+        host: str,
+    ) -> None:
+        """Initialize the phases of a request that just started."""
+        self.method = method
+        self.url = url
+        self.host = host
+        self.status: Optional[int] = None
+        self.error: Optional[BaseException] = None
+        self.reused = False
+        # time.time() the request started, for exporters
+        self.started_at = time()
+        self.queued = 0.0
+        self.dns = 0.0
+        self.connect = 0.0
+        self.request_sent = 0.0
+        self.first_byte = 0.0
+        self.total = 0.0
+
+    def durations(self) -> Dict[str, float]:
+        """Return every phase's duration by name."""
+        return {phase: getattr(self, phase) for phase in PHASES}
+
+
+t_phase_sink = Callable[[RequestPhases], None]
+
+
+def phase_trace_config(sinks: Sequence[t_phase_sink]) -> aiohttp.TraceConfig:
+    """
+    Build a TraceConfig that times the phases of each request and passes them to every sink once it finishes.
+
+    Sinks run on the event loop when the response headers arrive, or the request fails, so they must be cheap.
+
+    Args:
+    ----
+        sinks: Sequence[Callable[[RequestPhases], None]]
+            Receive the phases of every finished request, e.g. MetricsPhaseSink or SlowRequestLogSink
+
+    Returns:
+    -------
+        aiohttp.TraceConfig: Pass to a ClientSession's trace_configs
+
+    """
+    tracer = _PhaseTracer(sinks)
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(tracer.on_request_start)
+    trace_config.on_connection_queued_start.append(tracer.on_queued_start)
+    trace_config.on_connection_queued_end.append(tracer.on_queued_end)
+    trace_config.on_connection_create_start.append(tracer.on_create_start)
+    trace_config.on_connection_create_end.append(tracer.on_create_end)
+    trace_config.on_connection_reuseconn.append(tracer.on_reuseconn)
+    trace_config.on_dns_resolvehost_start.append(tracer.on_dns_start)
+    trace_config.on_dns_resolvehost_end.append(tracer.on_dns_end)
+    trace_config.on_request_headers_sent.append(tracer.on_sent)
+    trace_config.on_request_chunk_sent.append(tracer.on_sent)
+    trace_config.on_request_end.append(tracer.on_request_end)
+    trace_config.on_request_exception.append(tracer.on_request_exception)
+    return trace_config
+
+
+class _PhaseTracer:
+    """TraceConfig signal handlers. Phase boundaries are kept on the per-request context until the request finishes."""
+
+    def __init__(
+        self,
+        sinks: Sequence[t_phase_sink],
+    ) -> None:
+        self.sinks = tuple(sinks)
+
+    async def on_request_start(self, session: Any, ctx: SimpleNamespace, params: Any) -> None:
+        ctx.phases = RequestPhases(params.method, str(params.url), params.url.host or '')
+        ctx.start = ctx.connected = ctx.sent = monotonic()
+
+    async def on_queued_start(self, session: Any, ctx: SimpleNamespace, params: Any) -> None:
+        ctx.queued_start = monotonic()
+
+    async def on_queued_end(self, session: Any, ctx: SimpleNamespace, params: Any) -> None:
+        ctx.phases.queued = monotonic() - ctx.queued_start
+
+    async def on_create_start(self, session: Any, ctx: SimpleNamespace, params: Any) -> None:
+        ctx.create_start = monotonic()
+
+    async def on_create_end(self, session: Any, ctx: SimpleNamespace, params: Any) -> None:
+        ctx.connected = monotonic()
+        # DNS resolution happens while the connection is created
+        ctx.phases.connect = ctx.connected - ctx.create_start - ctx.phases.dns
+
+    async def on_reuseconn(self, session: Any, ctx: SimpleNamespace, params: Any) -> None:
+        ctx.connected = monotonic()
+        ctx.phases.reused = True
+
+    async def on_dns_start(self, session: Any, ctx: SimpleNamespace, params: Any) -> None:
+        ctx.dns_start = monotonic()
+
+    async def on_dns_end(self, session: Any, ctx: SimpleNamespace, params: Any) -> None:
+        ctx.phases.dns = monotonic() - ctx.dns_start
+
+    async def on_sent(self, session: Any, ctx: SimpleNamespace, params: Any) -> None:
+        # Headers, then each body chunk, the last one marks the request as sent
+        ctx.sent = monotonic()
+
+    async def on_request_end(self, session: Any, ctx: SimpleNamespace, params: Any) -> None:
+        ctx.phases.status = params.response.status
+        self._finish(ctx)
+
+    async def on_request_exception(self, session: Any, ctx: SimpleNamespace, params: Any) -> None:
+        ctx.phases.error = params.exception
+        self._finish(ctx)
+
+    def _finish(
+        self,
+        ctx: SimpleNamespace,
+    ) -> None:
+        """Derive the remaining durations and hand the phases to the sinks."""
+        now = monotonic()
+        phases: RequestPhases = ctx.phases
+        phases.request_sent = max(0.0, ctx.sent - ctx.connected)
+        phases.first_byte = now - ctx.sent
+        phases.total = now - ctx.start
+        for sink in self.sinks:
+            try:
+                sink(phases)
+            except Exception as exc:
+                log('error', 'trace.sink_raised', sink=sink, error_type=exc.__class__.__name__, error=exc)
+
+
+class MetricsPhaseSink:
+    """Record each phase in the naia_callback_phase_seconds histogram."""
+
+    def __call__(
+        self,
+        phases: RequestPhases,
+    ) -> None:
+        """Record the phases."""
+        host = host_label(phases.host)
+        for phase, duration in phases.durations().items():
+            PHASE_LATENCY.observe(duration, host, phase)
+
+
+class SlowRequestLogSink:
+    """Log the phases of requests that took longer than `threshold` seconds."""
+
+    def __init__(
+        self,
+        threshold: float = 1.0,
+    ) -> None:
+        """Initialize the sink."""
+        self.threshold = threshold
+
+    def __call__(
+        self,
+        phases: RequestPhases,
+    ) -> None:
+        """Log the phases if the request was slow."""
+        if phases.total >= self.threshold:
+            log(
+                'warning',
+                'callback.slow',
+                method=phases.method,
+                url=phases.url,
+                status=phases.status,
+                error=phases.error,
+                reused=phases.reused,
+                **phases.durations(),
+            )
+
+
+class SpanExportSink:
+    """
+    Convert the phases into an OpenTelemetry style span and pass it to `export`.
+
+    The span is a dict with a name, start and end times in Unix nanoseconds, attributes, and one event per phase
+    boundary, so it can be mapped onto an exporter without this package depending on OpenTelemetry.
+    """
+
+    def __init__(
+        self,
+        export: Callable[[Dict[str, Any]], None],
+        name: str = 'naia.callback',
+    ) -> None:
+        """Initialize the sink."""
+        self.export = export
+        self.name = name
+
+    def __call__(
+        self,
+        phases: RequestPhases,
+    ) -> None:
+        """Export the phases as a span."""
+        start = int(phases.started_at * 1e9)
+        events = []
+        elapsed = 0.0
+        for phase in PHASES[:-1]:
+            elapsed += getattr(phases, phase)
+            events.append({'name': phase, 'time_unix_nano': start + int(elapsed * 1e9)})
+        self.export(
+            {
+                'name': self.name,
+                'start_time_unix_nano': start,
+                'end_time_unix_nano': start + int(phases.total * 1e9),
+                'status': 'error' if phases.error is not None else 'ok',
+                'attributes': {
+                    'http.request.method': phases.method,
+                    'url.full': phases.url,
+                    'server.address': phases.host,
+                    'http.response.status_code': phases.status,
+                    'naia.connection.reused': phases.reused,
+                },
+                'events': events,
+            }
+        )
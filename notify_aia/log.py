@@ -0,0 +1,217 @@
+"""Naia log module."""
+
+import atexit
+import queue
+import random
+import sys
+import threading
+from time import monotonic, time
+from typing import IO, Any, Dict, List, Optional, Tuple
+
+import ujson
+
+LEVELS: Dict[str, int] = {'debug': 10, 'info': 20, 'warning': 30, 'error': 40, 'critical': 50}
+
+# (time.time(), level, event, fields)
+t_record = Tuple[float, str, str, Dict[str, Any]]
+
+
+class LogPipeline:
+    """
+    Structured logging that never blocks the caller.
+
+    `emit` puts a cheap tuple on a bounded queue. A background thread formats each record as a line of JSON and writes
+    it to `stream`. Records are dropped, and counted, instead of waiting when the queue is full. Each event type can be
+    sampled, keeping a fraction of its records, and rate limited to a number of records per second.
+    """
+
+    def __init__(
+        self,
+        stream: Optional[IO[str]] = None,
+        level: str = 'info',
+        max_queue: int = 10_000,
+        sample_rates: Optional[Dict[str, float]] = None,
+        rate_limits: Optional[Dict[str, float]] = None,
+    ) -> None:
+        """
+        Initialize the pipeline. The writer thread is started by the first record.
+
+        Args:
+        ----
+            stream: Optional[IO[str]]
+                Where lines are written, stdout if not provided
+            level: str
+                Records below this level are discarded in the caller
+            max_queue: int
+                Records waiting to be written before new ones are dropped
+            sample_rates: Optional[Dict[str, float]]
+                Event type to the fraction of its records kept
+            rate_limits: Optional[Dict[str, float]]
+                Event type to the records per second kept, bursts of up to one second are allowed
+
+        """
+        self.stream = stream or sys.stdout
+        self.level = LEVELS[level]
+        self.sample_rates = sample_rates or {}
+        self.rate_limits = rate_limits or {}
+        self.written: int = 0
+        self.dropped: int = 0
+        self.sampled: int = 0
+        self.rate_limited: int = 0
+        # event: (tokens, last refill)
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._queue: queue.Queue[Optional[t_record]] = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def emit(
+        self,
+        level: str,
+        event: str,
+        fields: Dict[str, Any],
+    ) -> bool:
+        """Queue a record without blocking. Returns False if it was filtered or dropped."""
+        if LEVELS[level] < self.level or not self._admit(event):
+            return False
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait((time(), level, event, fields))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def close(
+        self,
+        timeout: float = 5.0,
+    ) -> None:
+        """Write the queued records and stop the writer thread."""
+        thread = self._thread
+        if thread is None:
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        thread.join(timeout)
+        self._thread = None
+
+    def stats(self) -> Dict[str, int]:
+        """Return records written and records discarded by reason."""
+        return {
+            'written': self.written,
+            'dropped': self.dropped,
+            'sampled': self.sampled,
+            'rate_limited': self.rate_limited,
+            'queued': self._queue.qsize(),
+        }
+
+    def _admit(
+        self,
+        event: str,
+    ) -> bool:
+        """Apply the event's sample rate and rate limit."""
+        sample_rate = self.sample_rates.get(event)
+        if sample_rate is not None and random.random() >= sample_rate:
+            self.sampled += 1
+            return False
+        rate = self.rate_limits.get(event)
+        if rate is not None and not self._take_token(event, rate):
+            self.rate_limited += 1
+            return False
+        return True
+
+    def _take_token(
+        self,
+        event: str,
+        rate: float,
+    ) -> bool:
+        """Token bucket holding up to one second of records."""
+        now = monotonic()
+        tokens, refilled_at = self._buckets.get(event, (rate, now))
+        tokens = min(rate, tokens + (now - refilled_at) * rate)
+        if tokens < 1:
+            self._buckets[event] = (tokens, now)
+            return False
+        self._buckets[event] = (tokens - 1, now)
+        return True
+
+    def _start(self) -> None:
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._write, name='naia-log', daemon=True)
+            self._thread.start()
+        atexit.register(self.close)
+
+    def _write(self) -> None:
+        """Format and write records until close, flushing whenever the queue is empty."""
+        while True:
+            records = self._drain()
+            lines = [_format(record) for record in records if record is not None]
+            try:
+                self.stream.write(''.join(lines))
+                self.stream.flush()
+            except (OSError, ValueError):
+                self.dropped += len(lines)
+            else:
+                self.written += len(lines)
+            if None in records:
+                return
+
+    def _drain(self) -> List[Optional[t_record]]:
+        """Wait for a record then take everything else already queued."""
+        records = [self._queue.get()]
+        while records[-1] is not None:
+            try:
+                records.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return records
+
+
+def _format(record: t_record) -> str:
+    timestamp, level, event, fields = record
+    return ujson.dumps({'ts': timestamp, 'level': level, 'event': event, **fields}, default=str) + '\n'
+
+
+_PIPELINE = LogPipeline()
+
+
+def init_logging(
+    stream: Optional[IO[str]] = None,
+    level: str = 'info',
+    max_queue: int = 10_000,
+    sample_rates: Optional[Dict[str, float]] = None,
+    rate_limits: Optional[Dict[str, float]] = None,
+) -> None:
+    """Replace the log pipeline, writing whatever the current one has queued. See LogPipeline for the arguments."""
+    global _PIPELINE
+    _PIPELINE.close()
+    _PIPELINE = LogPipeline(
+        stream=stream,
+        level=level,
+        max_queue=max_queue,
+        sample_rates=sample_rates,
+        rate_limits=rate_limits,
+    )
+
+
+def log_stats() -> Dict[str, int]:
+    """Return the log pipeline's written and discarded record counts."""
+    return _PIPELINE.stats()
+
+
+def log(
+    level: str,
+    event: str,
+    **fields: Any,
+) -> None:
+    """Log a structured record. Fields are formatted on the writer thread, pass them unformatted."""
+    _PIPELINE.emit(level, event, fields)
+
+
+def close_logging() -> None:
+    """Write queued records and stop the writer thread, it is started again by the next record."""
+    _PIPELINE.close()
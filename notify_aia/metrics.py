@@ -0,0 +1,351 @@
+"""Naia metrics module."""
+
+import inspect
+import threading
+from bisect import bisect_left
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ATTEMPT_BUCKETS: Tuple[float, ...] = (1, 2, 3, 4, 5, 6, 7, 8, 9, 10)
+
+# Label value used for hosts past the cardinality cap
+OTHER_HOST = '_other'
+
+t_labels = Tuple[str, ...]
+t_gauge_value = Union[float, Awaitable[float]]
+
+
+class _Sharded:
+    """
+    Values kept in one shard per recording thread.
+
+    Only the owning thread writes to a shard so recording takes no lock. Collection copies every shard, which is
+    atomic for a dict under the GIL, and merges them.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str],
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._shards: Dict[int, Dict[t_labels, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _shard(self) -> Dict[t_labels, Any]:
+        """Return the calling thread's shard, creating it on first use."""
+        ident = threading.get_ident()
+        shard = self._shards.get(ident)
+        if shard is None:
+            with self._lock:
+                shard = self._shards.setdefault(ident, {})
+        return shard
+
+    def _check(
+        self,
+        label_values: t_labels,
+    ) -> None:
+        if len(label_values) != len(self.labels):
+            raise ValueError(f'{self.name} expects labels {self.labels}, got {label_values}')
+
+
+class Counter(_Sharded):
+    """Monotonically increasing count."""
+
+    def inc(
+        self,
+        *label_values: str,
+        amount: float = 1.0,
+    ) -> None:
+        """Add `amount` to the count for `label_values`."""
+        shard = self._shard()
+        value = shard.get(label_values)
+        if value is None:
+            self._check(label_values)
+            value = 0.0
+        shard[label_values] = value + amount
+
+    def collect(self) -> Dict[t_labels, float]:
+        """Return the count for every label set."""
+        totals: Dict[t_labels, float] = {}
+        for shard in list(self._shards.values()):
+            for key, value in shard.copy().items():
+                totals[key] = totals.get(key, 0.0) + value
+        return totals
+
+    def render(self) -> Iterable[str]:
+        """Yield the Prometheus text lines for the counter."""
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} counter'
+        for key, value in sorted(self.collect().items()):
+            yield f'{self.name}{_format_labels(self.labels, key)} {_format_value(value)}'
+
+
+class Histogram(_Sharded):
+    """Observations counted into fixed buckets."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        """Initialize the histogram with sorted upper bounds, +Inf is implied."""
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(
+        self,
+        value: float,
+        *label_values: str,
+    ) -> None:
+        """Count `value` into its bucket for `label_values`."""
+        shard = self._shard()
+        # Non-cumulative bucket counts, then +Inf, sum, and count
+        counts = shard.get(label_values)
+        if counts is None:
+            self._check(label_values)
+            counts = shard[label_values] = [0.0] * (len(self.buckets) + 3)
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-2] += value
+        counts[-1] += 1
+
+    def collect(self) -> Dict[t_labels, List[float]]:
+        """Return the bucket counts, sum, and count for every label set."""
+        totals: Dict[t_labels, List[float]] = {}
+        for shard in list(self._shards.values()):
+            for key, counts in shard.copy().items():
+                total = totals.setdefault(key, [0.0] * len(counts))
+                for i, count in enumerate(list(counts)):
+                    total[i] += count
+        return totals
+
+    def render(self) -> Iterable[str]:
+        """Yield the Prometheus text lines for the histogram."""
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} histogram'
+        for key, counts in sorted(self.collect().items()):
+            cumulative = 0.0
+            for bound, count in zip((*self.buckets, float('inf')), counts):
+                cumulative += count
+                labels = _format_labels((*self.labels, 'le'), (*key, _format_value(bound)))
+                yield f'{self.name}_bucket{labels} {_format_value(cumulative)}'
+            labels = _format_labels(self.labels, key)
+            yield f'{self.name}_sum{labels} {_format_value(counts[-2])}'
+            yield f'{self.name}_count{labels} {_format_value(counts[-1])}'
+
+
+class Gauge:
+    """Value read when metrics are collected, e.g. a queue depth."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        read: Callable[[], t_gauge_value],
+    ) -> None:
+        """Initialize the gauge with a callable returning its value, or an awaitable of it."""
+        self.name = name
+        self.documentation = documentation
+        self.read = read
+
+    async def render(self) -> List[str]:
+        """Return the Prometheus text lines for the gauge."""
+        value = self.read()
+        if inspect.isawaitable(value):
+            value = await value
+        return [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} gauge',
+            f'{self.name} {_format_value(value)}',
+        ]
+
+
+class HostLabels:
+    """Cap the distinct host label values. Hosts past the first `max_hosts` share OTHER_HOST."""
+
+    def __init__(
+        self,
+        max_hosts: int = 200,
+    ) -> None:
+        """Initialize the cap."""
+        self.max_hosts = max_hosts
+        self._hosts: Set[str] = set()
+
+    def __call__(
+        self,
+        host: str,
+    ) -> str:
+        """Return the label value for `host`."""
+        if host in self._hosts:
+            return host
+        if len(self._hosts) >= self.max_hosts:
+            return OTHER_HOST
+        self._hosts.add(host)
+        return host
+
+
+class MetricsRegistry:
+    """Metrics exposed together in the Prometheus text format."""
+
+    def __init__(self) -> None:
+        """Initialize an empty registry."""
+        self._metrics: Dict[str, Union[Counter, Histogram]] = {}
+        self._gauges: Dict[str, Gauge] = {}
+
+    def counter(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+    ) -> Counter:
+        """Register a counter."""
+        counter = Counter(name, documentation, labels)
+        self._metrics[name] = counter
+        return counter
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        """Register a histogram."""
+        histogram = Histogram(name, documentation, labels, buckets)
+        self._metrics[name] = histogram
+        return histogram
+
+    def gauge(
+        self,
+        name: str,
+        documentation: str,
+        read: Callable[[], t_gauge_value],
+    ) -> Gauge:
+        """Register a gauge, replacing any gauge with the same name."""
+        gauge = Gauge(name, documentation, read)
+        self._gauges[name] = gauge
+        return gauge
+
+    async def render(self) -> str:
+        """Return every metric in the Prometheus text format."""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        for gauge in self._gauges.values():
+            lines.extend(await gauge.render())
+        return '\n'.join(lines) + '\n'
+
+
+def _format_labels(
+    names: Sequence[str],
+    values: Sequence[str],
+) -> str:
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return f'{{{pairs}}}'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+REGISTRY = MetricsRegistry()
+
+INGEST_LATENCY = REGISTRY.histogram(
+    'naia_ingest_latency_seconds',
+    'Time to handle callback API requests',
+    labels=('route', 'status'),
+)
+DELIVERY_LATENCY = REGISTRY.histogram(
+    'naia_delivery_latency_seconds',
+    'Time for each callback attempt, by Service host and response status class',
+    labels=('host', 'status'),
+)
+JOB_LATENCY = REGISTRY.histogram(
+    'naia_job_latency_seconds',
+    'Time for each job attempt, by request template and response status class',
+    labels=('template', 'status'),
+)
+ATTEMPTS_PER_CALLBACK = REGISTRY.histogram(
+    'naia_callback_attempts',
+    'Attempts made for each finished callback',
+    labels=('outcome',),
+    buckets=ATTEMPT_BUCKETS,
+)
+PHASE_LATENCY = REGISTRY.histogram(
+    'naia_callback_phase_seconds',
+    'Time spent in each phase of callback requests, when phase tracing is enabled',
+    labels=('host', 'phase'),
+)
+RETRIES = REGISTRY.counter(
+    'naia_callback_retries_total',
+    'Callback attempts that will be retried, by reason',
+    labels=('reason',),
+)
+ADMISSION_REJECTIONS = REGISTRY.counter(
+    'naia_admission_rejections_total',
+    'Callback API requests refused by admission control, by decision',
+    labels=('decision',),
+)
+CALLBACKS_SAVED = REGISTRY.counter(
+    'naia_callbacks_saved_total',
+    'Callbacks dropped without a request, as a duplicate or replaced by a newer status',
+    labels=('reason',),
+)
+DNS_LOOKUPS = REGISTRY.counter(
+    'naia_dns_lookups_total',
+    'Host lookups by the DNS cache, by result: hit, negative_hit, coalesced with a query in progress, or miss',
+    labels=('result',),
+)
+DNS_LATENCY = REGISTRY.histogram(
+    'naia_dns_query_seconds',
+    'Time for each DNS query made for the DNS cache, by outcome',
+    labels=('outcome',),
+)
+KEY_CHECKS = REGISTRY.counter(
+    'naia_encryption_key_checks_total',
+    'Token signature checks when decrypting, by key position in init_encryption (0 is the newest) and result',
+    labels=('key', 'result'),
+)
+
+_HOST_LABELS = HostLabels()
+
+
+def init_metrics(
+    max_hosts: int = 200,
+) -> None:
+    """
+    Configure metric label limits.
+
+    Args:
+    ----
+        max_hosts: int
+            Distinct Service hosts labelled before the rest are reported as OTHER_HOST
+
+    """
+    global _HOST_LABELS
+    _HOST_LABELS = HostLabels(max_hosts)
+
+
+def host_label(host: str) -> str:
+    """Return the host label value for `host`, within the cardinality cap."""
+    return _HOST_LABELS(host)
+
+
+def status_class(status: Optional[int]) -> str:
+    """Return the status label value for a response status, 'error' if there was no response."""
+    return f'{status // 100}xx' if status else 'error'
@@ -2,22 +2,28 @@
 
 from __future__ import annotations
 
+import asyncio
 from collections.abc import AsyncGenerator
 from contextlib import asynccontextmanager
+from time import monotonic
 from typing import TYPE_CHECKING, Any, Callable, Coroutine, Dict, Iterable, List, Mapping, Optional, Sequence, TypeVar
 
 from fastapi import APIRouter, FastAPI, Response
 from fastapi.datastructures import Default
 from fastapi.params import Depends
-from fastapi.responses import UJSONResponse
+from fastapi.responses import JSONResponse, UJSONResponse
 from fastapi.utils import generate_unique_id
 from starlette.middleware import Middleware
 from starlette.requests import Request
 from starlette.routing import BaseRoute
 
 from notify_aia import __version__
+from notify_aia.admission import Admission, AdmissionController
 from notify_aia.auth.encryption import init_encryption, t_bytes_str, t_secret_key
 from notify_aia.clients.async_client import AsyncClient
+from notify_aia.log import close_logging, log
+from notify_aia.metrics import CONTENT_TYPE, REGISTRY
+from notify_aia.services import LifespanService
 
 if TYPE_CHECKING:  # pragma: no cover
     from contextlib import AbstractAsyncContextManager
@@ -25,9 +31,16 @@ if TYPE_CHECKING:  # pragma: no cover
     from fastapi.routing import APIRoute
 
     from notify_aia.clients.callback.processing import CallbackAsyncClient
+    from notify_aia.clients.callback.spill import RetrySpillFile, t_pending
+    from notify_aia.clients.jobs.processing import JobAsyncClient
+    from notify_aia.clients.jobs.templates import RequestTemplate, t_job_sink
+    from notify_aia.queue.base import QueueBackend
 
 AppType = TypeVar('AppType', bound='Naia')
 
+# Seconds between checks for attempts still in progress while draining
+_DRAIN_POLL_INTERVAL: float = 0.05
+
 
 class Naia(FastAPI):
     """Wrapper around FastAPI to configure a naia app."""
@@ -77,7 +90,14 @@ class Naia(FastAPI):
     ) -> None:
         """Initialize the app."""
         self.callback_client: CallbackAsyncClient
+        self.job_client: Optional[JobAsyncClient] = None
+        self.admission: AdmissionController
+        self.callback_queue: Optional[QueueBackend] = None
+        self.retry_spill: Optional[RetrySpillFile] = None
+        # Seconds shutdown waits for callback attempts in progress
+        self.drain_deadline: float = 30.0
         self._async_clients: List[AsyncClient] = []
+        self._services: List[LifespanService] = []
 
         super().__init__(
             debug=debug,
@@ -100,7 +120,8 @@ class Naia(FastAPI):
             exception_handlers=exception_handlers,
             on_startup=on_startup,
             on_shutdown=on_shutdown,
-            lifespan=lifespan,
+            # Naia.lifespan starts services and closes clients unless the caller provides their own
+            lifespan=lifespan if lifespan is not None else self.lifespan,
             terms_of_service=terms_of_service,
             contact=contact,
             license_info=license_info,
@@ -124,12 +145,82 @@ class Naia(FastAPI):
         app: FastAPI,
     ) -> AsyncGenerator[Any, Any]:
         """Clean up the app."""
-        print('Starting app')
+        log('info', 'app.starting')
+        for service in self._services:
+            await service.start()
         yield
         # Clean up - test with kill -15 (SIGTERM)
-        print('cleaning up')
-        for client in self._async_clients:
-            await client.close_client()
+        log('info', 'app.stopping')
+        if hasattr(self, 'callback_client'):
+            # initialize_app was called
+            await self.drain()
+        for service in reversed(self._services):
+            await service.stop()
+        # Concurrently, each close waits for the session's connections to close
+        await asyncio.gather(*(client.close_client() for client in self._async_clients))
+        close_logging()
+
+    async def drain(self) -> Dict[str, int]:
+        """
+        Stop taking new callbacks, let attempts in progress finish, and hand callbacks waiting to be retried over.
+
+        New callback requests are shed and every service stops taking new work. Attempts in progress get until
+        `drain_deadline`. Callbacks waiting to be retried go to the callback queue if there is one, otherwise, or if
+        they have legacy tokens, to the retry spill file.
+
+        Returns the callbacks whose attempt finished while draining (drained), were handed over (spilled), and were
+        lost because their attempt was cut off or there was nowhere to hand them over to (lost).
+        """
+        deadline = monotonic() + self.drain_deadline
+        self.admission.draining = True
+        for service in reversed(self._services):
+            await service.drain()
+        scheduler = self.callback_client.retry_scheduler
+        scheduler.pause()
+
+        started_with = attempting = self._attempting()
+        while (attempting or self.callback_client.in_flight()) and monotonic() < deadline:
+            await asyncio.sleep(_DRAIN_POLL_INTERVAL)
+            attempting = self._attempting()
+        pending = scheduler.take_pending()
+        unspilled = await self._spill(pending)
+
+        report = {
+            'drained': max(0, started_with - attempting),
+            'spilled': len(pending) - unspilled,
+            'lost': attempting + unspilled,
+        }
+        log('warning' if report['lost'] else 'info', 'app.drained', **report)
+        return report
+
+    def _attempting(self) -> int:
+        """Return the callbacks accepted by the API or retried by the scheduler with an attempt in progress."""
+        return self.admission.admitted + self.callback_client.retry_scheduler.attempting
+
+    async def _spill(
+        self,
+        pending: List[t_pending],
+    ) -> int:
+        """Hand callbacks waiting to be retried to the callback queue or retry spill. Returns how many were not."""
+        try:
+            if self.callback_queue is not None and pending:
+                # Only import this if it's being used
+                from notify_aia.clients.callback.spill import spill_to_queue
+
+                pending = await spill_to_queue(self.callback_queue, pending)
+            if self.retry_spill is not None and pending:
+                await self.retry_spill.write(pending)
+                pending = []
+        except Exception as exc:
+            log('error', 'app.spill_failed', count=len(pending), error_type=exc.__class__.__name__, error=exc)
+        return len(pending)
+
+    def add_service(
+        self,
+        service: LifespanService,
+    ) -> None:
+        """Register a service to be started and stopped with the app."""
+        self._services.append(service)
 
     def initialize_app(
         self,
@@ -138,17 +229,35 @@ class Naia(FastAPI):
         routers: Optional[Iterable[APIRouter]] = None,
         encryption_legacy_key: Optional[t_secret_key] = '',
         encryption_legacy_salt: Optional[t_bytes_str] = '',
+        callback_queue: Optional[QueueBackend] = None,
+        callback_sqs_queue_url: Optional[str] = None,
+        admission: Optional[AdmissionController] = None,
+        retry_spill_path: Optional[str] = None,
+        drain_deadline: float = 30.0,
+        job_templates: Optional[Iterable[RequestTemplate]] = None,
+        job_sink: Optional[t_job_sink] = None,
     ) -> 'Naia':
-        """Prepare the app with encryption, callback clients, and routers."""
+        """Prepare the app with encryption, callback and job clients, admission control, queues, and routers."""
         init_encryption(
             b64_keys=encryption_keys,
             legacy_key=encryption_legacy_key,
             legacy_salt=encryption_legacy_salt,
         )
         self._initialize_callback_client(callback_client)
+        self._initialize_job_client(job_templates, job_sink)
+        self._initialize_admission(admission)
+        self._initialize_retry_spill(retry_spill_path)
+        self.drain_deadline = drain_deadline
+        self._initialize_callback_queue(callback_queue)
+        self._initialize_sqs_consumer(callback_sqs_queue_url)
+        self._initialize_metrics()
         self._initialize_routers(routers)
         return self
 
+    async def metrics(self) -> Response:
+        """Expose delivery metrics in the Prometheus text format."""
+        return Response(content=await REGISTRY.render(), media_type=CONTENT_TYPE)
+
     def _initialize_callback_client(
         self,
         callback_client: Optional[CallbackAsyncClient] = None,
@@ -162,6 +271,118 @@ class Naia(FastAPI):
 
         self.callback_client = callback_client
         self._async_clients.append(callback_client)
+        # Registered first so it stops after the services that feed it
+        self.add_service(callback_client.retry_scheduler)
+
+    def _initialize_job_client(
+        self,
+        templates: Optional[Iterable[RequestTemplate]] = None,
+        sink: Optional[t_job_sink] = None,
+    ) -> None:
+        """Accept jobs for request templates, sharing the callback client's connections and per-host protections."""
+        if templates is None:
+            return
+        # Only import this if it's being used
+        from notify_aia.clients.jobs.processing import JobAsyncClient
+
+        callback_client = self.callback_client
+        job_client = JobAsyncClient(connector=callback_client.connector, timeout=callback_client.timeout, sink=sink)
+        job_client.set_concurrency_limiter(callback_client.concurrency_limiter)
+        job_client.set_fair_scheduler(callback_client.fair_scheduler)
+        job_client.set_circuit_breaker(callback_client.circuit_breaker)
+        for template in templates:
+            job_client.register(template)
+
+        self.job_client = job_client
+        self._async_clients.append(job_client)
+        self.add_service(job_client.retry_scheduler)
+
+    async def ready(self) -> Response:
+        """Report whether this worker is accepting callbacks, 503 while admission control refuses them."""
+        decision = self.admission.check()
+        status_code = 200 if decision is Admission.ACCEPT else 503
+        return JSONResponse(content={'status': decision.value, **self.admission.stats()}, status_code=status_code)
+
+    def _initialize_admission(
+        self,
+        admission: Optional[AdmissionController] = None,
+    ) -> None:
+        """Limit work held in memory, counting retries waiting in the clients, and add the /ready route."""
+        if admission is None:
+            admission = AdmissionController()
+        callback_retries = self.callback_client.retry_scheduler
+        admission.add_sources(callback_retries.pending, lambda: callback_retries.pending_bytes)
+        if self.job_client is not None:
+            job_retries = self.job_client.retry_scheduler
+            admission.add_sources(job_retries.pending, lambda: job_retries.pending_bytes)
+        self.admission = admission
+        self.add_service(admission)
+        self.add_api_route('/ready', self.ready, methods=['GET'], include_in_schema=False)
+
+    def _initialize_retry_spill(
+        self,
+        path: Optional[str] = None,
+    ) -> None:
+        """Write callbacks waiting to be retried to `path` on shutdown, and restore them on start."""
+        if path is None:
+            return
+        # Only import this if it's being used
+        from notify_aia.clients.callback.spill import RetrySpillFile
+
+        self.retry_spill = RetrySpillFile(
+            path,
+            self.callback_client.retry_scheduler,
+            self.callback_client.priority_lanes,
+        )
+        self.add_service(self.retry_spill)
+
+    def _initialize_callback_queue(
+        self,
+        callback_queue: Optional[QueueBackend] = None,
+    ) -> None:
+        """Route callbacks through a durable queue, drained by a dispatcher, instead of background tasks."""
+        if callback_queue is None:
+            return
+        # Only import this if it's being used
+        from notify_aia.queue.dispatcher import QueueDispatcher
+
+        self.callback_queue = callback_queue
+        self.add_service(QueueDispatcher(callback_queue, self.callback_client))
+
+    def _initialize_sqs_consumer(
+        self,
+        queue_url: Optional[str] = None,
+    ) -> None:
+        """Consume callbacks from an SQS queue using the default AWS configuration. Use add_service to customize."""
+        if queue_url is None:
+            return
+        # Only import this if it's being used
+        from notify_aia.clients.callback.sqs import SqsCallbackConsumer
+
+        self.add_service(SqsCallbackConsumer(queue_url, self.callback_client))
+
+    def _initialize_metrics(self) -> None:
+        """Register the gauges read from this app's callback client and queue, and the /metrics route."""
+        callback_client = self.callback_client
+        REGISTRY.gauge(
+            'naia_callbacks_in_flight',
+            'Callback requests waiting for a response',
+            callback_client.in_flight,
+        )
+        REGISTRY.gauge(
+            'naia_retries_scheduled',
+            'Callbacks waiting in the retry scheduler',
+            callback_client.retry_scheduler.pending,
+        )
+        REGISTRY.gauge(
+            'naia_callbacks_waiting_for_connection',
+            'Callback requests waiting for a fair turn at a connection',
+            lambda: sum(callback_client.fair_scheduler.waiting().values()),
+        )
+        REGISTRY.gauge('naia_event_loop_lag_seconds', 'Smoothed event loop lag', lambda: self.admission.loop_lag)
+        if self.callback_queue is not None:
+            REGISTRY.gauge('naia_queue_depth', 'Jobs in the callback queue', self.callback_queue.pending)
+        self.add_api_route('/metrics', self.metrics, methods=['GET'], include_in_schema=False)
 
     def _initialize_routers(
         self,
@@ -173,7 +394,17 @@ class Naia(FastAPI):
             from notify_aia.clients.callback.rest import callback_router, set_app
 
             set_app(self)
-            routers = [callback_router]
+            routers = [callback_router, *self._job_routers()]
 
         for router in routers:
             self.include_router(router)
+
+    def _job_routers(self) -> List[APIRouter]:
+        """Return the jobs router if there is a job client."""
+        if self.job_client is None:
+            return []
+        # Only import this if it's being used
+        from notify_aia.clients.jobs import rest
+
+        rest.set_app(self)
+        return [rest.jobs_router]
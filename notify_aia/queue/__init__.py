@@ -0,0 +1 @@
+"""Naia queue folder."""
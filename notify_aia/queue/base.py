@@ -0,0 +1,110 @@
+"""Naia queue base module."""
+
+import asyncio
+from abc import ABCMeta, abstractmethod
+from typing import List, Optional, Sequence
+
+
+class QueuedJob:
+    """A job claimed from a queue backend."""
+
+    __slots__ = ('job_id', 'body', 'attempts', 'created_at', 'due_at')
+
+    def __init__(
+        self,
+        job_id: int,
+        body: bytes,
+        attempts: int,
+        created_at: float,
+        due_at: float,
+    ) -> None:
+        """Initialize the job."""
+        self.job_id = job_id
+        # Serialized RequestCallback
+        self.body = body
+        # Attempts already made
+        self.attempts = attempts
+        # time.time() values
+        self.created_at = created_at
+        self.due_at = due_at
+
+
+class QueueBackend(metaclass=ABCMeta):
+    """
+    Persistent store of jobs waiting to be delivered.
+
+    Jobs are claimed with a lease. A job that is neither completed nor rescheduled before its lease expires is
+    handed out again, so delivery is at-least-once.
+    """
+
+    def __init__(self) -> None:
+        """Initialize the backend."""
+        self._new_jobs: Optional[asyncio.Event] = None
+
+    async def open(self) -> None:
+        """Open the backend. Jobs leased by a previous process become available again. Subclasses call super()."""
+        self._new_jobs = asyncio.Event()
+
+    @abstractmethod
+    async def close(self) -> None:
+        """Flush outstanding writes and close the backend."""
+
+    @abstractmethod
+    async def put(
+        self,
+        bodies: Sequence[bytes],
+        due_at: Optional[float] = None,
+        attempts: int = 0,
+        created_at: Optional[float] = None,
+    ) -> None:
+        """
+        Durably store new jobs. When this returns the jobs survive a process crash.
+
+        Jobs are due at `due_at`, or now. Jobs carried over from elsewhere, e.g. a retry scheduler, keep the attempts
+        already made and when they were created, both default to a new job's.
+        """
+
+    @abstractmethod
+    async def claim(
+        self,
+        limit: int,
+    ) -> List[QueuedJob]:
+        """Lease up to `limit` jobs that are due, oldest due first."""
+
+    @abstractmethod
+    async def complete(
+        self,
+        job_ids: Sequence[int],
+    ) -> None:
+        """Remove finished jobs."""
+
+    @abstractmethod
+    async def retry(
+        self,
+        job_id: int,
+        attempts: int,
+        due_at: float,
+    ) -> None:
+        """Release a leased job to be claimed again at `due_at` (time.time())."""
+
+    @abstractmethod
+    async def pending(self) -> int:
+        """Return the number of jobs not yet completed."""
+
+    async def wait_for_jobs(
+        self,
+        timeout: float,
+    ) -> None:
+        """Wait up to `timeout` seconds for a put to this backend."""
+        if self._new_jobs is None:
+            raise RuntimeError('open() must be called before waiting for jobs')
+        try:
+            await asyncio.wait_for(self._new_jobs.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._new_jobs.clear()
+
+    def _signal_new_jobs(self) -> None:
+        """Wake anything waiting in wait_for_jobs."""
+        if self._new_jobs is not None:
+            self._new_jobs.set()
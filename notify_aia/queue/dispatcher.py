@@ -0,0 +1,233 @@
+"""Naia dispatcher module."""
+
+from __future__ import annotations
+
+import asyncio
+from collections import Counter, deque
+from time import monotonic, time
+from typing import TYPE_CHECKING, Any, Deque, Dict, List, Optional, Sequence, Set, Tuple
+from urllib.parse import urlsplit
+
+from notify_aia.log import log
+from notify_aia.services import LifespanService
+
+if TYPE_CHECKING:  # pragma: no cover
+    from notify_aia.clients.callback.processing import CallbackAsyncClient
+    from notify_aia.clients.callback.rest import RequestCallback
+    from notify_aia.queue.base import QueueBackend, QueuedJob
+
+# A claimed job with its decoded callback and bearer token
+t_claimed = Tuple['QueuedJob', Optional['RequestCallback'], Any]
+# Seconds between checks of whether parked jobs' hosts have room
+_PARKED_POLL: float = 0.05
+
+
+class QueueDispatcher(LifespanService):
+    """
+    Drain a queue backend into a CallbackAsyncClient.
+
+    Each claimed job gets one attempt and the tokens of a claimed batch are decrypted together, off the event loop.
+    A job that should be retried is written back to the queue with its next due time instead of sleeping in memory,
+    so pending retries survive a restart.
+
+    A job for a Service host that cannot take another request is parked: kept in memory, still leased, and started
+    once the host has room, so it neither holds one of the `concurrency` slots nor is rewritten while it waits. Jobs
+    claimed beyond `max_parked`, and jobs parked for `park_seconds`, are written back `defer_seconds` later, or when
+    the host's circuit probes, without counting an attempt.
+    """
+
+    def __init__(
+        self,
+        queue: QueueBackend,
+        callback_client: CallbackAsyncClient,
+        concurrency: int = 100,
+        poll_interval: float = 1.0,
+        max_parked: int = 1000,
+        park_seconds: float = 60.0,
+        defer_seconds: float = 5.0,
+    ) -> None:
+        """
+        Initialize the dispatcher.
+
+        Args:
+        ----
+            queue: QueueBackend
+                Where jobs are claimed from
+            callback_client: CallbackAsyncClient
+                Makes the callback attempts
+            concurrency: int
+                Maximum attempts in flight
+            poll_interval: float
+                Longest time to wait before checking for due retries
+            max_parked: int
+                Jobs waiting in memory for their host to have room
+            park_seconds: float
+                Longest a job waits in memory, should be well under the queue's lease
+            defer_seconds: float
+                Delay of jobs written back because their host had no room
+
+        """
+        self.queue = queue
+        self.callback_client = callback_client
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.max_parked = max_parked
+        self.park_seconds = park_seconds
+        self.defer_seconds = defer_seconds
+        # Host to its parked jobs and when each was parked (time.monotonic()), oldest first
+        self._parked: Dict[str, Deque[Tuple[float, t_claimed]]] = {}
+        self.parked: int = 0
+        self._in_flight: Set[asyncio.Task[None]] = set()
+        self._task: Optional[asyncio.Task[None]] = None
+
+    async def start(self) -> None:
+        """Open the queue and start draining it, beginning with anything left by a previous process."""
+        await self.queue.open()
+        self._task = asyncio.create_task(self._run())
+
+    async def drain(self) -> None:
+        """Stop claiming jobs. The queue stays open, e.g. for callbacks handed over by the retry scheduler."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def stop(self) -> None:
+        """Stop claiming jobs, let in-flight attempts finish, and close the queue."""
+        await self.drain()
+        if self._in_flight:
+            await asyncio.wait(self._in_flight)
+        # Released rather than left leased, the host had no room for them
+        await self._write_back([claimed for parked in self._parked.values() for _, claimed in parked], 0.0)
+        self._parked, self.parked = {}, 0
+        await self.queue.close()
+
+    async def _run(self) -> None:
+        """Claim due jobs whenever there is room for more attempts, starting parked jobs first."""
+        while True:
+            await self._unpark()
+            if len(self._in_flight) >= self.concurrency:
+                await asyncio.wait(self._in_flight, return_when=asyncio.FIRST_COMPLETED)
+                continue
+            if self.parked >= self.max_parked:
+                # Claiming more would only write them back, wait for a host to have room
+                await asyncio.sleep(_PARKED_POLL)
+                continue
+            jobs = await self.queue.claim(self.concurrency - len(self._in_flight))
+            if not jobs:
+                await self.queue.wait_for_jobs(_PARKED_POLL if self.parked else self.poll_interval)
+            await self._dispatch(jobs)
+
+    async def _dispatch(
+        self,
+        jobs: List[QueuedJob],
+    ) -> None:
+        """Start an attempt for each claimed job, parking the jobs of hosts that cannot take another request."""
+        decoded = await self.callback_client.decode_callbacks([job.body for job in jobs])
+        started: Counter[str] = Counter()
+        overflow: List[t_claimed] = []
+        for job, (callback, bearer_token) in zip(jobs, decoded):
+            host = _host(callback)
+            if not host or (host not in self._parked and started[host] < self.callback_client.host_capacity(host)):
+                started[host] += 1
+                self._start((job, callback, bearer_token))
+            elif self.parked < self.max_parked:
+                self._parked.setdefault(host, deque()).append((monotonic(), (job, callback, bearer_token)))
+                self.parked += 1
+            else:
+                overflow.append((job, callback, bearer_token))
+        await self._write_back(overflow, self.defer_seconds)
+
+    async def _unpark(self) -> None:
+        """Start parked jobs whose host has room, and write back the jobs parked for too long."""
+        stale: List[t_claimed] = []
+        for host in list(self._parked):
+            parked = self._parked[host]
+            self._start_parked(host, parked)
+            while parked and monotonic() - parked[0][0] >= self.park_seconds:
+                stale.append(parked.popleft()[1])
+            if not parked:
+                del self._parked[host]
+        self.parked = sum(len(parked) for parked in self._parked.values())
+        await self._write_back(stale, self.defer_seconds)
+
+    def _start_parked(
+        self,
+        host: str,
+        parked: Deque[Tuple[float, t_claimed]],
+    ) -> None:
+        """Start as many of a host's parked jobs as it, and the dispatcher, have room for."""
+        room = min(self.callback_client.host_capacity(host), self.concurrency - len(self._in_flight))
+        for _ in range(min(room, len(parked))):
+            self._start(parked.popleft()[1])
+
+    def _start(
+        self,
+        claimed: t_claimed,
+    ) -> None:
+        """Attempt a claimed job in the background."""
+        task = asyncio.create_task(self._deliver(*claimed))
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+
+    async def _write_back(
+        self,
+        jobs: Sequence[t_claimed],
+        delay: float,
+    ) -> None:
+        """Release jobs that were not attempted, due after `delay` or when their host's circuit probes if later."""
+        await asyncio.gather(
+            *(
+                self.queue.retry(
+                    job.job_id,
+                    # Not an attempt, the job keeps its attempt count
+                    job.attempts,
+                    time() + max(delay, self.callback_client.circuit_breaker.blocked_for(_host(callback))),
+                )
+                for job, callback, _ in jobs
+            )
+        )
+
+    async def _deliver(
+        self,
+        job: QueuedJob,
+        callback: Optional[RequestCallback],
+        bearer_token: Any,
+    ) -> None:
+        """Make one attempt for the job then complete it or schedule its retry."""
+        delay: Optional[float] = None
+        if callback is None or isinstance(bearer_token, ValueError):
+            # Malformed body or token, retrying will not help
+            log('warning', 'queue.job_dropped', job_id=job.job_id, reason=bearer_token or 'invalid RequestCallback')
+        else:
+            delay = await self.callback_client.try_callback_request(
+                url=callback.url,
+                encrypted_token=callback.encrypted_token,
+                payload=callback.payload,
+                attempt_number=job.attempts + 1,
+                # Carry the age of the job over from previous attempts, possibly in a previous process
+                start_time=monotonic() - (time() - _first_due(job, callback)),
+                bearer_token=bearer_token,
+                priority=callback.priority,
+                expires_at=callback.expires_at,
+            )
+
+        if delay is None:
+            await self.queue.complete([job.job_id])
+        else:
+            await self.queue.retry(job.job_id, job.attempts + 1, time() + delay)
+
+
+def _host(callback: Optional[RequestCallback]) -> str:
+    """Return the Service host of a callback, '' if its body was invalid."""
+    return urlsplit(str(callback.url)).netloc if callback is not None else ''
+
+
+def _first_due(
+    job: QueuedJob,
+    callback: RequestCallback,
+) -> float:
+    """Return when the job was first due, its creation unless delivery was delayed."""
+    if callback.deliver_at is None:
+        return job.created_at
+    return max(job.created_at, callback.deliver_at.timestamp())
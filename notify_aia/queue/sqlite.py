@@ -0,0 +1,239 @@
+"""Naia sqlite queue module."""
+
+import asyncio
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from time import time
+from typing import Any, Callable, List, Optional, Sequence, Tuple, TypeVar
+
+from notify_aia.queue.base import QueueBackend, QueuedJob
+
+T = TypeVar('T')
+
+_CREATE_TABLE = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    body BLOB NOT NULL,
+    attempts INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    due_at REAL NOT NULL,
+    leased_until REAL NOT NULL
+)
+"""
+_CREATE_INDEX = 'CREATE INDEX IF NOT EXISTS jobs_due_at ON jobs (due_at)'
+_INSERT = 'INSERT INTO jobs (body, attempts, created_at, due_at, leased_until) VALUES (?, ?, ?, ?, 0)'
+_SELECT_DUE = (
+    'SELECT id, body, attempts, created_at, due_at FROM jobs '
+    'WHERE due_at <= ? AND leased_until <= ? ORDER BY due_at LIMIT ?'
+)
+_LEASE = 'UPDATE jobs SET leased_until = ? WHERE id = ?'
+_DELETE = 'DELETE FROM jobs WHERE id = ?'
+_RETRY = 'UPDATE jobs SET attempts = ?, due_at = ?, leased_until = 0 WHERE id = ?'
+
+t_write = Tuple[str, List[Tuple[Any, ...]]]
+
+
+class SqliteQueueBackend(QueueBackend):
+    """
+    SQLite queue in WAL mode with group commit.
+
+    All database work runs on one dedicated thread. Writes issued while a commit is in progress, or within
+    `commit_interval` of the first write, share a single transaction and therefore a single fsync.
+
+    Opening the database releases every lease, so each process should use its own database file.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        commit_interval: float = 0.002,
+        lease_seconds: float = 300.0,
+        synchronous: str = 'FULL',
+    ) -> None:
+        """
+        Initialize the backend.
+
+        Args:
+        ----
+            path: str
+                Database file, created if it does not exist
+            commit_interval: float
+                Seconds to wait for more writes to join a commit
+            lease_seconds: float
+                How long a claimed job is reserved before it may be claimed again
+            synchronous: str
+                SQLite synchronous pragma, FULL survives power loss, NORMAL only process crashes
+
+        """
+        super().__init__()
+        self.path = path
+        self.commit_interval = commit_interval
+        self.lease_seconds = lease_seconds
+        self.synchronous = synchronous
+        # Stats - transactions committed and write statements they contained
+        self.commits: int = 0
+        self.writes: int = 0
+
+        self._conn: Optional[sqlite3.Connection] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending_writes: List[Tuple[t_write, asyncio.Future[None]]] = []
+        self._flush_task: Optional[asyncio.Task[None]] = None
+
+    async def open(self) -> None:
+        """Open the database, creating the schema if necessary, and release leases from a previous process."""
+        await super().open()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='naia-sqlite')
+        await self._run(self._open_sync)
+
+    async def close(self) -> None:
+        """Wait for outstanding writes and close the database."""
+        if self._flush_task is not None:
+            await self._flush_task
+        if self._executor is not None:
+            await self._run(self._close_sync)
+            self._executor.shutdown()
+            self._executor = None
+
+    async def put(
+        self,
+        bodies: Sequence[bytes],
+        due_at: Optional[float] = None,
+        attempts: int = 0,
+        created_at: Optional[float] = None,
+    ) -> None:
+        """Durably store new jobs, sharing the commit with any other concurrent writes."""
+        now = time()
+        await self._write(_INSERT, [(body, attempts, created_at or now, due_at or now) for body in bodies])
+        self._signal_new_jobs()
+
+    async def claim(
+        self,
+        limit: int,
+    ) -> List[QueuedJob]:
+        """Lease up to `limit` due jobs."""
+        return await self._run(self._claim_sync, limit, time())
+
+    async def complete(
+        self,
+        job_ids: Sequence[int],
+    ) -> None:
+        """Delete finished jobs."""
+        await self._write(_DELETE, [(job_id,) for job_id in job_ids])
+
+    async def retry(
+        self,
+        job_id: int,
+        attempts: int,
+        due_at: float,
+    ) -> None:
+        """Record the attempt and release the lease so the job is claimed again at `due_at`."""
+        await self._write(_RETRY, [(attempts, due_at, job_id)])
+
+    async def pending(self) -> int:
+        """Return the number of stored jobs."""
+        return await self._run(self._count_sync)
+
+    async def _run(
+        self,
+        func: Callable[..., T],
+        *args: Any,
+    ) -> T:
+        """Run `func` on the database thread."""
+        if self._executor is None:
+            raise RuntimeError('open() must be called before using the queue')
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def _write(
+        self,
+        sql: str,
+        rows: List[Tuple[Any, ...]],
+    ) -> None:
+        """Queue a write for the next group commit and wait for it to be committed."""
+        future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        self._pending_writes.append(((sql, rows), future))
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush())
+        await future
+
+    async def _flush(self) -> None:
+        """Commit pending writes until there are none left, writes arriving during a commit join the next one."""
+        await asyncio.sleep(self.commit_interval)
+        while self._pending_writes:
+            batch, self._pending_writes = self._pending_writes, []
+            try:
+                await self._run(self._commit_sync, [write for write, _ in batch])
+            except Exception as exc:
+                self._resolve(batch, exc)
+            else:
+                self._resolve(batch, None)
+        self._flush_task = None
+
+    @staticmethod
+    def _resolve(
+        batch: List[Tuple[t_write, asyncio.Future[None]]],
+        exc: Optional[Exception],
+    ) -> None:
+        """Wake the writers of a committed, or failed, batch."""
+        for _, future in batch:
+            if future.done():
+                continue
+            if exc is None:
+                future.set_result(None)
+            else:
+                future.set_exception(exc)
+
+    def _open_sync(self) -> None:
+        conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(f'PRAGMA synchronous={self.synchronous}')
+        conn.execute(_CREATE_TABLE)
+        conn.execute(_CREATE_INDEX)
+        # Anything leased was in flight when the previous process stopped
+        conn.execute('UPDATE jobs SET leased_until = 0 WHERE leased_until > 0')
+        self._conn = conn
+
+    def _close_sync(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            raise RuntimeError('open() must be called before using the queue')
+        return self._conn
+
+    def _commit_sync(
+        self,
+        writes: List[t_write],
+    ) -> None:
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for sql, rows in writes:
+                conn.executemany(sql, rows)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        self.commits += 1
+        self.writes += len(writes)
+
+    def _claim_sync(
+        self,
+        limit: int,
+        now: float,
+    ) -> List[QueuedJob]:
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            jobs = [QueuedJob(*row) for row in conn.execute(_SELECT_DUE, (now, now, limit))]
+            conn.executemany(_LEASE, [(now + self.lease_seconds, job.job_id) for job in jobs])
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return jobs
+
+    def _count_sync(self) -> int:
+        count: int = self._connection().execute('SELECT COUNT(*) FROM jobs').fetchone()[0]
+        return count
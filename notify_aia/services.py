@@ -0,0 +1,18 @@
+"""Naia services module."""
+
+from abc import ABCMeta, abstractmethod
+
+
+class LifespanService(metaclass=ABCMeta):
+    """Background work started and stopped with the app by Naia.lifespan."""
+
+    @abstractmethod
+    async def start(self) -> None:
+        """Start the service. Called in registration order when the app starts."""
+
+    async def drain(self) -> None:
+        """Stop taking new work, before any service is stopped. Work already taken is finished by stop."""
+
+    @abstractmethod
+    async def stop(self) -> None:
+        """Stop the service. Called in reverse registration order when the app shuts down."""
@@ -3,6 +3,7 @@ from typing import Iterable
 import pytest
 from cryptography.fernet import Fernet
 from itsdangerous import URLSafeSerializer
+from pytest_mock import MockerFixture
 
 import notify_aia.auth.encryption as naia_encr
 
@@ -160,3 +161,157 @@ def test_ut_legacy_verify_invalid_signature() -> None:
     naia_encr.init_encryption(b64_keys=key, legacy_key=key)
     with pytest.raises(ValueError, match='validation failed'):
         naia_encr.legacy_verify(signed)
+
+
+def test_wb_decrypt_uses_token_cache(mocker: MockerFixture) -> None:
+    naia_encr.init_encryption(default_keys)
+    naia_encr.init_token_cache()
+    enc_str = Fernet(default_keys[0]).encrypt(b'cached token')
+    spy = mocker.spy(naia_encr._SYMMETRIC_ENCRYPTION, 'decrypt')
+
+    assert naia_encr.decrypt(enc_str) == 'cached token'
+    assert naia_encr.decrypt(enc_str) == 'cached token'
+    spy.assert_called_once()
+    assert naia_encr.token_cache_stats()['hits'] == 1
+    assert naia_encr.token_cache_stats()['misses'] == 1
+
+
+def test_wb_legacy_verify_uses_token_cache(mocker: MockerFixture) -> None:
+    naia_encr.init_encryption(default_keys, legacy_key=default_keys[0])
+    naia_encr.init_token_cache()
+    signed = URLSafeSerializer(secret_key=default_keys[0]).dumps('legacy token')
+    spy = mocker.spy(naia_encr._LEGACY_SERIALIZATION, 'loads')
+
+    assert naia_encr.legacy_verify(signed) == 'legacy token'
+    assert naia_encr.legacy_verify(signed) == 'legacy token'
+    spy.assert_called_once()
+
+
+def test_wb_init_encryption_invalidates_token_cache() -> None:
+    naia_encr.init_encryption(default_keys)
+    naia_encr.init_token_cache()
+    enc_str = Fernet(default_keys[1]).encrypt(b'rotated out')
+    assert naia_encr.decrypt(enc_str) == 'rotated out'
+
+    # The key that made the token is retired
+    naia_encr.init_encryption(default_keys[:1])
+    assert naia_encr.token_cache_stats()['entries'] == 0
+    with pytest.raises(ValueError, match='validation failed'):
+        naia_encr.decrypt(enc_str)
+
+
+def test_wb_key_ring_tries_family_key_first() -> None:
+    keys = [Fernet.generate_key() for _ in range(3)]
+    naia_encr.init_encryption(keys)
+    naia_encr.init_token_cache(max_entries=0)
+    encrypted_at = 1_700_000_000
+    old = [Fernet(keys[2]).encrypt_at_time(f'old {i}'.encode(), encrypted_at + i) for i in range(3)]
+
+    assert [naia_encr.decrypt(token) for token in old] == ['old 0', 'old 1', 'old 2']
+    # Only the first token of the family tried the newer keys
+    assert [(key['hits'], key['misses']) for key in naia_encr.key_stats()] == [(0, 1), (0, 1), (3, 0)]
+
+    # The family's key is tried first, then the keys in order
+    new = Fernet(keys[0]).encrypt_at_time(b'new', encrypted_at)
+    assert naia_encr.decrypt(new) == 'new'
+    stats = naia_encr.key_stats()
+    assert [(key['hits'], key['misses'], key['families']) for key in stats] == [(1, 1, 1), (0, 1, 0), (3, 1, 0)]
+    # Never validated a token, a candidate for retirement
+    assert stats[1]['last_hit'] is None
+    assert stats[2]['last_hit'] is not None
+
+    with pytest.raises(ValueError, match='validation failed'):
+        naia_encr.decrypt(Fernet(Fernet.generate_key()).encrypt(b'unknown'))
+    assert [key['misses'] for key in naia_encr.key_stats()] == [2, 2, 2]
+    naia_encr.init_token_cache()
+
+
+def test_ut_token_cache_ttl(mocker: MockerFixture) -> None:
+    clock = mocker.patch.object(naia_encr, 'monotonic', return_value=100.0)
+    cache = naia_encr.TokenCache(ttl=10)
+    cache.put(b'token', 'plaintext')
+    assert cache.get(b'token') == 'plaintext'
+
+    clock.return_value = 111.0
+    assert cache.get(b'token') is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_ut_token_cache_lru_eviction() -> None:
+    cache = naia_encr.TokenCache(max_entries=2)
+    cache.put(b'a', 'a')
+    cache.put(b'b', 'b')
+    # Use a so b is least recently used
+    cache.get(b'a')
+    cache.put(b'c', 'c')
+    assert cache.get(b'b') is None
+    assert cache.get(b'a') == 'a'
+    assert cache.stats()['evictions'] == 1
+
+
+def test_ut_token_cache_memory_cap() -> None:
+    cache = naia_encr.TokenCache(max_bytes=1024)
+    for i in range(100):
+        cache.put(f'token {i}'.encode(), 'x' * 100)
+    assert 0 < cache.stats()['bytes'] <= 1024
+    assert cache.stats()['entries'] < 100
+
+
+def test_ut_token_cache_disabled() -> None:
+    cache = naia_encr.TokenCache(max_entries=0)
+    cache.put(b'token', 'plaintext')
+    assert cache.get(b'token') is None
+
+
+def test_wb_decrypt_many() -> None:
+    naia_encr.init_encryption(default_keys)
+    tokens = [Fernet(key).encrypt(f'token {i}'.encode()) for i, key in enumerate(default_keys)]
+
+    results = naia_encr.decrypt_many([*tokens, b'invalid'])
+    assert results[:2] == ['token 0', 'token 1']
+    assert isinstance(results[2], ValueError)
+
+
+@pytest.mark.asyncio
+async def test_wb_decrypt_many_async(mocker: MockerFixture) -> None:
+    naia_encr.init_encryption(default_keys)
+    naia_encr.init_token_cache()
+    naia_encr.init_decryption_executor(2)
+    cached = Fernet(default_keys[0]).encrypt(b'cached')
+    naia_encr.decrypt(cached)
+    repeated = Fernet(default_keys[1]).encrypt(b'repeated')
+    spy = mocker.spy(naia_encr._SYMMETRIC_ENCRYPTION, 'decrypt')
+
+    results = await naia_encr.decrypt_many_async([cached, repeated, b'invalid', repeated], chunk_size=1)
+    assert results[:2] == ['cached', 'repeated']
+    assert isinstance(results[2], ValueError)
+    assert results[3] == 'repeated'
+    # Cached tokens are not decrypted and repeated tokens are decrypted once
+    assert spy.call_count == 2
+
+
+def test_wb_legacy_verify_many() -> None:
+    naia_encr.init_encryption(default_keys, legacy_key=default_keys[0])
+    signed = URLSafeSerializer(secret_key=default_keys[0]).dumps('legacy token')
+
+    results = naia_encr.legacy_verify_many([signed, 'invalid'])
+    assert results[0] == 'legacy token'
+    assert isinstance(results[1], ValueError)
+
+
+@pytest.mark.asyncio
+async def test_wb_legacy_verify_many_async() -> None:
+    naia_encr.init_encryption(default_keys, legacy_key=default_keys[0], legacy_salt=b'salty')
+    signed = URLSafeSerializer(secret_key=default_keys[0], salt=b'pepper').dumps('legacy token')
+
+    results = await naia_encr.legacy_verify_many_async([signed, signed, 'invalid'], salt=b'pepper')
+    assert results[:2] == ['legacy token', 'legacy token']
+    assert isinstance(results[2], ValueError)
+
+
+@pytest.mark.asyncio
+async def test_ut_decrypt_many_async_not_initialized() -> None:
+    naia_encr.init_token_cache()
+    naia_encr._SYMMETRIC_ENCRYPTION = None  # type: ignore
+    with pytest.raises(RuntimeError, match='init_encryption'):
+        await naia_encr.decrypt_many_async(['test'])
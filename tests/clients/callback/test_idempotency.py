@@ -0,0 +1,117 @@
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Tuple
+from uuid import uuid4
+
+import pytest
+from pydantic.networks import HttpUrl
+from pytest_mock import MockerFixture
+
+from notify_aia.clients.callback.idempotency import CallbackIndex
+from notify_aia.clients.callback.rest import RequestPayload
+from notify_aia.metrics import CALLBACKS_SAVED
+from notify_aia.naia import Naia
+
+
+def test_ut_index_drops_duplicates() -> None:
+    index = CallbackIndex()
+    first = index.claim('n1', 'sending')
+    assert first is not None
+    assert index.claim('n1', 'sending') is None
+    assert index.claim('n1', 'delivered') is not None
+    assert index.stats() == {'duplicates': 1, 'coalesced': 0, 'entries': 2}
+    # Generations are only compared when coalescing
+    assert not index.superseded('n1', first)
+
+
+def test_wb_index_forgets_after_ttl(mocker: MockerFixture) -> None:
+    clock = mocker.patch('notify_aia.clients.callback.idempotency.monotonic', return_value=100.0)
+    index = CallbackIndex(ttl=10.0)
+    index.claim('n1', 'delivered')
+    clock.return_value = 110.0
+    assert index.claim('n1', 'delivered') is not None
+    assert index.stats()['entries'] == 1
+
+
+def test_wb_index_bounded() -> None:
+    index = CallbackIndex(max_entries=2)
+    for status in ('created', 'sending', 'delivered'):
+        index.claim('n1', status)
+    assert index.stats()['entries'] == 2
+    # The oldest key was evicted early
+    assert index.claim('n1', 'created') is not None
+
+
+def test_wb_index_coalesces() -> None:
+    before = CALLBACKS_SAVED.collect().get(('coalesced',), 0.0)
+    index = CallbackIndex(coalesce=True)
+    sending = index.claim('n1', 'sending')
+    delivered = index.claim('n1', 'delivered')
+    other = index.claim('n2', 'sending')
+    assert index.superseded('n1', sending)
+    assert not index.superseded('n1', delivered)
+    assert not index.superseded('n2', other)
+    assert index.stats()['coalesced'] == 1
+    assert CALLBACKS_SAVED.collect()[('coalesced',)] == before + 1
+
+
+@pytest.mark.asyncio
+async def test_wb_client_drops_duplicate(
+    delivered_payload: RequestPayload,
+    get_app: Naia,
+    enc_key: Tuple[str],
+    encrypted_str: Callable[[str], str],
+    mocker: MockerFixture,
+) -> None:
+    get_app.initialize_app(enc_key)
+    client = get_app.callback_client
+    mock_attempt = mocker.patch.object(client, '_attempt', return_value=None)
+    token = encrypted_str('some bearer token')
+
+    for _ in range(2):
+        await client.send_callback_request(
+            url=HttpUrl('https://localhost/'),
+            encrypted_token=token,
+            payload=delivered_payload,
+        )
+    delay = await client.try_callback_request(
+        url=HttpUrl('https://localhost/'),
+        encrypted_token=token,
+        payload=delivered_payload,
+    )
+    assert delay is None
+    assert mock_attempt.call_count == 1
+    assert client.callback_index.duplicates == 2
+
+
+@pytest.mark.asyncio
+async def test_wb_client_coalesces_waiting_callback(
+    delivered_payload: RequestPayload,
+    get_app: Naia,
+    enc_key: Tuple[str],
+    encrypted_str: Callable[[str], str],
+    mocker: MockerFixture,
+) -> None:
+    get_app.initialize_app(enc_key)
+    client = get_app.callback_client
+    client.set_callback_index(CallbackIndex(coalesce=True))
+    mock_attempt = mocker.patch.object(client, '_attempt', return_value=None)
+    token = encrypted_str('some bearer token')
+    sending = delivered_payload.model_copy(update={'status': 'sending', 'notification_id': uuid4()})
+
+    await client.send_callback_request(
+        url=HttpUrl('https://localhost/'),
+        encrypted_token=token,
+        payload=sending,
+        deliver_at=datetime.now(timezone.utc) + timedelta(seconds=60),
+    )
+    await client.send_callback_request(
+        url=HttpUrl('https://localhost/'),
+        encrypted_token=token,
+        payload=sending.model_copy(update={'status': 'delivered'}),
+    )
+    # The delayed status is dropped when it comes due instead of being sent after the newer one
+    (_, _, record), *_ = client.retry_scheduler._heap
+    await client._attempt_scheduled(record)
+    assert mock_attempt.call_count == 1
+    assert b'"status":"delivered"' in mock_attempt.call_args.args[2]
+    await client.retry_scheduler.stop()
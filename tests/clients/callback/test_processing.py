@@ -1,15 +1,38 @@
-from typing import Callable, Optional, Tuple
+import asyncio
+import gc
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from time import monotonic
+from typing import Any, Callable, Dict, Optional, Tuple
 from unittest.mock import MagicMock, patch
+from uuid import uuid4
 
+import aiohttp
 import pytest
+import ujson
 from pydantic.networks import HttpUrl
+from pytest_mock import MockerFixture
+from tenacity import retry_if_exception_type, stop_after_delay, wait_fixed
 
 from notify_aia.auth.encryption import t_secret_key
+from notify_aia.clients.breaker import CircuitBreaker
+from notify_aia.clients.callback.deadlines import DeadlinePolicy
+from notify_aia.clients.callback.priority import HIGH_LANE, RETRY_LANE, PriorityLanes
 from notify_aia.clients.callback.processing import CallbackAsyncClient
-from notify_aia.clients.callback.rest import RequestPayload
+from notify_aia.clients.callback.rest import RequestCallback, RequestPayload
+from notify_aia.clients.limiter import AdaptiveConcurrencyLimiter
+from notify_aia.clients.scheduler import RetryScheduler
+from notify_aia.metrics import ATTEMPTS_PER_CALLBACK, DELIVERY_LATENCY, RETRIES
 from notify_aia.naia import Naia
 
 
+async def wait_for_calls(mock: MagicMock, count: int) -> None:
+    for _ in range(100):
+        if mock.call_count >= count:
+            return
+        await asyncio.sleep(0.01)
+
+
 async def initialize_app(
     app: Naia,
     enc_key: Tuple[str],
@@ -41,11 +64,12 @@ async def test_wb_send_callback_request(
     get_app: Naia,
     enc_key: Tuple[str],
     encrypted_str: Callable[[str], str],
+    service_response: Callable[..., MagicMock],
 ) -> None:
     url = HttpUrl('https://localhost/')
     await initialize_app(get_app, enc_key)
     bearer_token = encrypted_str('some bearer token')
-    mock_post.return_value = {'status_code': 200}
+    mock_post.post.return_value = service_response()
 
     await get_app.callback_client.send_callback_request(
         url=url,
@@ -62,11 +86,12 @@ async def test_wb_send_callback_legacy_request(
     get_app: Naia,
     enc_key: Tuple[str],
     legacy_verify_str: Callable[[str], str],
+    service_response: Callable[..., MagicMock],
 ) -> None:
     url = HttpUrl('https://localhost/')
     await initialize_app(get_app, enc_key, legacy_key=enc_key[0])
     bearer_token = legacy_verify_str('some bearer token')
-    mock_post.return_value = {'status_code': 200}
+    mock_post.post.return_value = service_response()
 
     await get_app.callback_client.send_callback_request(
         url=url,
@@ -74,3 +99,504 @@ async def test_wb_send_callback_legacy_request(
         payload=delivered_payload,
         legacy=True,
     )
+
+
+@pytest.mark.asyncio
+async def test_wb_send_callback_requests_gathers_batch(
+    delivered_payload: RequestPayload,
+    get_app: Naia,
+    enc_key: Tuple[str],
+    encrypted_str: Callable[[str], str],
+    mocker: MockerFixture,
+) -> None:
+    await initialize_app(get_app, enc_key)
+    mock_deliver = mocker.patch.object(
+        get_app.callback_client,
+        '_deliver',
+        side_effect=[None, RuntimeError('boom'), None],
+    )
+    callback = RequestCallback(
+        url=HttpUrl('https://localhost/'),
+        encrypted_token=encrypted_str('some bearer token'),
+        payload=delivered_payload,
+    )
+    invalid = callback.model_copy(update={'encrypted_token': 'not a token'})
+    others = [
+        callback.model_copy(update={'payload': delivered_payload.model_copy(update={'notification_id': uuid4()})})
+        for _ in range(2)
+    ]
+
+    # One failure does not stop the rest of the batch, invalid tokens are skipped
+    await get_app.callback_client.send_callback_requests([callback, invalid, *others])
+    assert mock_deliver.call_count == 3
+    assert {call.args[1] for call in mock_deliver.call_args_list} == {'some bearer token'}
+
+
+@pytest.mark.asyncio
+async def test_ut_next_retry_delay_retryable() -> None:
+    cc = CallbackAsyncClient()
+    exc = aiohttp.ClientResponseError(MagicMock(), (), status=503)
+    delay = cc.next_retry_delay(1, exc, monotonic())
+    assert delay is not None
+    assert 0 <= delay <= 60
+
+
+@pytest.mark.asyncio
+async def test_ut_next_retry_delay_stops_after_attempts() -> None:
+    cc = CallbackAsyncClient()
+    exc = aiohttp.ClientResponseError(MagicMock(), (), status=503)
+    assert cc.next_retry_delay(10, exc, monotonic()) is None
+
+
+@pytest.mark.asyncio
+async def test_ut_next_retry_delay_not_retryable() -> None:
+    cc = CallbackAsyncClient()
+    assert cc.next_retry_delay(1, ValueError('nope'), monotonic()) is None
+
+
+@pytest.mark.asyncio
+async def test_wb_next_retry_delay_uses_custom_policy() -> None:
+    cc = CallbackAsyncClient()
+    cc.set_retry_criteria(retry_if_exception_type(ValueError))
+    cc.set_retry_wait(wait_fixed(3))
+    cc.set_retry_stop(stop_after_delay(30))
+    assert cc.next_retry_delay(50, ValueError(), monotonic()) == 3
+    # Time based stop criteria see the age of the first attempt
+    assert cc.next_retry_delay(2, ValueError(), monotonic() - 31) is None
+
+
+@pytest.mark.asyncio
+async def test_wb_send_callback_request_retries_until_success(
+    delivered_payload: RequestPayload,
+    get_app: Naia,
+    enc_key: Tuple[str],
+    encrypted_str: Callable[[str], str],
+    mocker: MockerFixture,
+) -> None:
+    await initialize_app(get_app, enc_key)
+    client = get_app.callback_client
+    client.set_retry_wait(wait_fixed(0))
+    mock_attempt = mocker.patch.object(client, '_attempt', side_effect=[0.0, 0.0, None])
+
+    await client.send_callback_request(
+        url=HttpUrl('https://localhost/'),
+        encrypted_token=encrypted_str('some bearer token'),
+        payload=delivered_payload,
+    )
+    # Only the first attempt is awaited, the retries are made by the scheduler
+    assert mock_attempt.call_count == 1
+    await wait_for_calls(mock_attempt, 3)
+    assert [call.args[3] for call in mock_attempt.call_args_list] == [1, 2, 3]
+    assert client.retry_scheduler.pending() == 0
+    await client.retry_scheduler.stop()
+
+
+@pytest.mark.asyncio
+async def test_wb_send_callback_request_deliver_at(
+    delivered_payload: RequestPayload,
+    get_app: Naia,
+    enc_key: Tuple[str],
+    encrypted_str: Callable[[str], str],
+    mocker: MockerFixture,
+) -> None:
+    await initialize_app(get_app, enc_key)
+    client = get_app.callback_client
+    mock_attempt = mocker.patch.object(client, '_attempt', return_value=None)
+
+    await client.send_callback_request(
+        url=HttpUrl('https://localhost/'),
+        encrypted_token=encrypted_str('some bearer token'),
+        payload=delivered_payload,
+        deliver_at=datetime.now(timezone.utc) + timedelta(seconds=0.05),
+    )
+    assert mock_attempt.call_count == 0
+    assert client.retry_scheduler.pending() == 1
+    await wait_for_calls(mock_attempt, 1)
+    # The bearer token is decrypted again when the attempt is due
+    assert mock_attempt.call_args.args[1]['Authorization'] == 'Bearer some bearer token'
+    await client.retry_scheduler.stop()
+
+
+@pytest.mark.asyncio
+async def test_wb_scheduled_attempt_waits_for_open_circuit(
+    delivered_payload: RequestPayload,
+    get_app: Naia,
+    enc_key: Tuple[str],
+    encrypted_str: Callable[[str], str],
+    mocker: MockerFixture,
+) -> None:
+    await initialize_app(get_app, enc_key)
+    client = get_app.callback_client
+    breaker = CircuitBreaker(window_size=1, min_calls=1, open_seconds=60)
+    client.set_circuit_breaker(breaker)
+    await breaker.acquire('localhost')
+    breaker.record('localhost', False)
+    mock_attempt = mocker.patch.object(client, '_attempt', return_value=None)
+    schedule = mocker.spy(client.retry_scheduler, 'schedule')
+
+    record = client._new_record(HttpUrl('https://localhost/'), encrypted_str('some bearer token'), delivered_payload)
+    await client._attempt_scheduled(record)
+    # Put back in the heap until the circuit probes instead of holding a worker
+    assert mock_attempt.call_count == 0
+    (call,) = schedule.call_args_list
+    assert call.args[0] is record
+    assert call.args[1] - monotonic() > 59
+    await client.retry_scheduler.stop()
+
+
+@pytest.mark.asyncio
+@patch('notify_aia.clients.callback.processing.CallbackAsyncClient.client')
+async def test_wb_slow_host_does_not_hold_scheduler_workers(
+    mock_client: MagicMock,
+    delivered_payload: RequestPayload,
+    get_app: Naia,
+    enc_key: Tuple[str],
+    encrypted_str: Callable[[str], str],
+    service_response: Callable[..., MagicMock],
+    mocker: MockerFixture,
+) -> None:
+    await initialize_app(get_app, enc_key)
+    client = get_app.callback_client
+    client.set_concurrency_limiter(AdaptiveConcurrencyLimiter(initial_limit=1, max_limit=1))
+    client.set_retry_scheduler(RetryScheduler(client._attempt_scheduled, workers=4))
+    mock_client.post.return_value = service_response()
+    delivered: Dict[str, float] = {}
+
+    async def handle_response(resp: Any, url: str) -> None:
+        if 'slow' in url:
+            await asyncio.sleep(0.2)
+        delivered[url] = monotonic()
+
+    mocker.patch.object(client, '_handle_response', side_effect=handle_response)
+    token = encrypted_str('some bearer token')
+    start = monotonic()
+    for i in range(8):
+        record = client._new_record(HttpUrl(f'https://slow.example.com/{i}'), token, delivered_payload)
+        record.attempt_number = 2
+        client.retry_scheduler.schedule(record, start)
+    fast = client._new_record(HttpUrl('https://fast.example.com/'), token, delivered_payload)
+    fast.attempt_number = 2
+    client.retry_scheduler.schedule(fast, start + 0.01)
+
+    await asyncio.sleep(0.1)
+    # The slow host's retries wait in the heap for its one slot, not in the workers
+    assert delivered['https://fast.example.com/'] - start < 0.1
+    assert client.retry_scheduler.attempting <= 1
+    await client.retry_scheduler.stop()
+
+
+@pytest.mark.asyncio
+@patch('notify_aia.clients.callback.processing.CallbackAsyncClient.client')
+async def test_wb_try_callback_request_returns_retry_delay(
+    mock_client: MagicMock,
+    delivered_payload: RequestPayload,
+    get_app: Naia,
+    enc_key: Tuple[str],
+    encrypted_str: Callable[[str], str],
+) -> None:
+    await initialize_app(get_app, enc_key)
+    get_app.callback_client.set_retry_wait(wait_fixed(5))
+    mock_client.post.side_effect = aiohttp.ClientResponseError(MagicMock(), (), status=500)
+
+    delay = await get_app.callback_client.try_callback_request(
+        url=HttpUrl('https://localhost/'),
+        encrypted_token=encrypted_str('some bearer token'),
+        payload=delivered_payload,
+        attempt_number=3,
+    )
+    assert delay == 5
+
+
+@pytest.mark.asyncio
+@patch('notify_aia.clients.callback.processing.CallbackAsyncClient.client')
+async def test_wb_attempt_feeds_concurrency_limiter(
+    mock_client: MagicMock,
+    delivered_payload: RequestPayload,
+    get_app: Naia,
+    enc_key: Tuple[str],
+    encrypted_str: Callable[[str], str],
+) -> None:
+    await initialize_app(get_app, enc_key)
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=8, decrease_cooldown=0)
+    get_app.callback_client.set_concurrency_limiter(limiter)
+    mock_client.post.side_effect = aiohttp.ClientResponseError(MagicMock(), (), status=429)
+
+    await get_app.callback_client.try_callback_request(
+        url=HttpUrl('https://service.example.com/callback'),
+        encrypted_token=encrypted_str('some bearer token'),
+        payload=delivered_payload,
+    )
+    assert get_app.callback_client.host_limits() == {'service.example.com': 4}
+    assert limiter.in_flight() == 0
+
+
+@pytest.mark.asyncio
+async def test_ut_default_limiter_capped_by_connector() -> None:
+    cc = CallbackAsyncClient(connector=aiohttp.TCPConnector(limit_per_host=7))
+    assert cc._concurrency_limiter.max_limit == 7
+
+
+@pytest.mark.asyncio
+@patch('notify_aia.clients.callback.processing.CallbackAsyncClient.client')
+async def test_wb_attempt_feeds_circuit_breaker(
+    mock_client: MagicMock,
+    delivered_payload: RequestPayload,
+    get_app: Naia,
+    enc_key: Tuple[str],
+    encrypted_str: Callable[[str], str],
+) -> None:
+    await initialize_app(get_app, enc_key)
+    get_app.callback_client.set_circuit_breaker(CircuitBreaker(window_size=2, min_calls=2))
+    mock_client.post.side_effect = aiohttp.ClientConnectionError('refused')
+
+    for _ in range(2):
+        await get_app.callback_client.try_callback_request(
+            url=HttpUrl('https://down.example.com/callback'),
+            encrypted_token=encrypted_str('some bearer token'),
+            # A new notification each time, duplicates are dropped before the attempt
+            payload=delivered_payload.model_copy(update={'notification_id': uuid4()}),
+        )
+    assert get_app.callback_client.host_circuits() == {'down.example.com': 'open'}
+
+
+def test_ut_serialize_matches_session_json_serialize(delivered_payload: RequestPayload) -> None:
+    body = CallbackAsyncClient._serialize(delivered_payload)
+    # What aiohttp sent for json=, with the session's json_serialize, before the body was serialized up front
+    expected = aiohttp.JsonPayload(CallbackAsyncClient._convert_model(delivered_payload), dumps=ujson.dumps)
+    assert body == expected._value
+
+
+@pytest.mark.asyncio
+@patch('notify_aia.clients.callback.processing.CallbackAsyncClient.client')
+async def test_wb_retries_reuse_body_and_headers(
+    mock_client: MagicMock,
+    delivered_payload: RequestPayload,
+    get_app: Naia,
+    enc_key: Tuple[str],
+    encrypted_str: Callable[[str], str],
+    service_response: Callable[..., MagicMock],
+) -> None:
+    await initialize_app(get_app, enc_key)
+    client = get_app.callback_client
+    client.set_retry_wait(wait_fixed(0))
+    mock_client.post.side_effect = [aiohttp.ClientResponseError(MagicMock(), (), status=500)] * 2 + [service_response()]
+
+    retries = RETRIES.collect().get(('500',), 0)
+    await client.send_callback_request(
+        url=HttpUrl('https://localhost/'),
+        encrypted_token=encrypted_str('some bearer token'),
+        payload=delivered_payload,
+    )
+    await wait_for_calls(mock_client.post, 3)
+    assert RETRIES.collect()[('500',)] == retries + 2
+    assert DELIVERY_LATENCY.collect()[('localhost', 'error')][-1] >= 2
+    first, *retries = mock_client.post.call_args_list
+    assert all(call.kwargs['data'] is first.kwargs['data'] for call in retries)
+    assert first.kwargs['headers'] == {
+        'Content-Type': 'application/json',
+        'Authorization': 'Bearer some bearer token',
+    }
+    await client.retry_scheduler.stop()
+
+
+@pytest.mark.asyncio
+@patch('notify_aia.clients.callback.processing.CallbackAsyncClient.client')
+async def test_wb_priority_lanes(
+    mock_client: MagicMock,
+    delivered_payload: RequestPayload,
+    get_app: Naia,
+    enc_key: Tuple[str],
+    encrypted_str: Callable[[str], str],
+    mocker: MockerFixture,
+    service_response: Callable[..., MagicMock],
+) -> None:
+    await initialize_app(get_app, enc_key)
+    client = get_app.callback_client
+    client.set_retry_wait(wait_fixed(0))
+    client.set_priority_lanes(PriorityLanes(rules={('sms', 'delivered'): 'high'}))
+    acquire = mocker.spy(client.concurrency_limiter, 'acquire')
+    mock_client.post.side_effect = [
+        aiohttp.ClientResponseError(MagicMock(), (), status=500),
+        service_response(),
+        service_response(),
+    ]
+
+    await client.send_callback_request(
+        url=HttpUrl('https://localhost/'),
+        encrypted_token=encrypted_str('some bearer token'),
+        payload=delivered_payload,
+    )
+    await wait_for_calls(mock_client.post, 2)
+    await client.send_callback_request(
+        url=HttpUrl('https://localhost/'),
+        encrypted_token=encrypted_str('some bearer token'),
+        payload=delivered_payload.model_copy(update={'notification_id': uuid4(), 'notification_type': 'email'}),
+        priority='high',
+    )
+    assert [call.args[1] for call in acquire.call_args_list] == [HIGH_LANE, RETRY_LANE, HIGH_LANE]
+    await client.retry_scheduler.stop()
+
+
+@pytest.mark.asyncio
+async def test_wb_records_are_compact(callback_data: Dict[str, Any]) -> None:
+    client = CallbackAsyncClient()
+    callback_data['payload']['provider_payload'] = {'sid': 'SM' + 'a' * 32, 'status': 'delivered'}
+    bodies = [ujson.dumps(callback_data)] * 500
+
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        callbacks = [RequestCallback.model_validate_json(body) for body in bodies]
+        models = tracemalloc.get_traced_memory()[0] - baseline
+        records = [client.to_record(callback) for callback in callbacks]
+        del callbacks
+        gc.collect()
+        compact = tracemalloc.get_traced_memory()[0] - baseline
+    finally:
+        tracemalloc.stop()
+    # Only the URL, encrypted token, and serialized body are held once the models are dropped
+    assert compact * 3 < models
+    assert records[0].body == CallbackAsyncClient._serialize(RequestCallback.model_validate_json(bodies[0]).payload)
+
+
+@pytest.mark.asyncio
+async def test_wb_response_body_discarded_by_default(service_response: Callable[..., MagicMock]) -> None:
+    cc = CallbackAsyncClient()
+    resp = service_response(200, b'x' * 100).__aenter__.return_value
+    with patch('notify_aia.clients.callback.processing.log') as mock_log:
+        await cc._handle_response(resp, 'https://localhost/')
+    mock_log.assert_called_once_with('debug', 'callback.response', url='https://localhost/', status=200, body=None)
+    # Read to the end, the connection goes back to the pool
+    assert not resp.close.called
+    resp.content.read.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_wb_response_body_captured_and_truncated(service_response: Callable[..., MagicMock]) -> None:
+    cc = CallbackAsyncClient()
+    cc.set_response_limits(capture_bytes=10, drain_limit=16)
+    with patch('notify_aia.clients.callback.processing.log') as mock_log:
+        resp = service_response(400, b'{"error": "bad"}', reason='Bad Request').__aenter__.return_value
+        await cc._handle_response(resp, 'https://localhost/')
+        assert not resp.close.called
+
+        # Past the drain limit the connection is closed rather than read to the end
+        resp = service_response(404, b'not found ' + b'.' * 40, reason='Not Found').__aenter__.return_value
+        await cc._handle_response(resp, 'https://localhost/')
+        assert resp.close.called
+    assert [call.kwargs['body'] for call in mock_log.call_args_list] == ['{"error": ...', 'not found ...']
+    assert [call.kwargs['reason'] for call in mock_log.call_args_list] == ['Bad Request', 'Not Found']
+
+
+@pytest.mark.asyncio
+async def test_wb_retryable_response_raises_after_reading(service_response: Callable[..., MagicMock]) -> None:
+    cc = CallbackAsyncClient()
+    cc.set_response_limits(capture_bytes=64)
+    resp = service_response(503, b'busy').__aenter__.return_value
+    with pytest.raises(aiohttp.ClientResponseError):
+        await cc._handle_response(resp, 'https://localhost/')
+    assert resp.content.read.await_count == 2
+    assert not resp.close.called
+
+
+@pytest.mark.asyncio
+@patch('notify_aia.clients.callback.processing.CallbackAsyncClient.client')
+async def test_wb_deadline_policy_drops_late_retry(
+    mock_client: MagicMock,
+    delivered_payload: RequestPayload,
+    get_app: Naia,
+    enc_key: Tuple[str],
+    encrypted_str: Callable[[str], str],
+) -> None:
+    await initialize_app(get_app, enc_key)
+    client = get_app.callback_client
+    client.set_retry_wait(wait_fixed(30))
+    client.set_deadline_policy(DeadlinePolicy({'sms': 5}, default=3600))
+    mock_client.post.side_effect = aiohttp.ClientResponseError(MagicMock(), (), status=503)
+
+    expired = ATTEMPTS_PER_CALLBACK.collect().get(('expired',), [0])[-1]
+    await client.send_callback_request(
+        url=HttpUrl('https://localhost/'),
+        encrypted_token=encrypted_str('some bearer token'),
+        payload=delivered_payload,
+    )
+    # The retry would be due after the deadline, the callback is dropped instead of waiting for it
+    assert client.retry_scheduler.pending() == 0
+    assert ATTEMPTS_PER_CALLBACK.collect()[('expired',)][-1] == expired + 1
+    # The attempt timeout shrinks to the time left
+    assert mock_client.post.call_args.kwargs['timeout'].total == pytest.approx(5, abs=0.5)
+
+    await client.send_callback_request(
+        url=HttpUrl('https://localhost/'),
+        encrypted_token=encrypted_str('some bearer token'),
+        payload=delivered_payload.model_copy(update={'notification_id': uuid4(), 'notification_type': 'email'}),
+    )
+    assert client.retry_scheduler.pending() == 1
+    assert mock_client.post.call_args.kwargs['timeout'].total == 10
+    await client.retry_scheduler.stop()
+
+
+@pytest.mark.asyncio
+@patch('notify_aia.clients.callback.processing.CallbackAsyncClient.client')
+async def test_wb_expires_at_drops_stale_callbacks(
+    mock_client: MagicMock,
+    delivered_payload: RequestPayload,
+    get_app: Naia,
+    enc_key: Tuple[str],
+    encrypted_str: Callable[[str], str],
+) -> None:
+    await initialize_app(get_app, enc_key)
+    client = get_app.callback_client
+    now = datetime.now(timezone.utc)
+
+    await client.send_callback_request(
+        url=HttpUrl('https://localhost/'),
+        encrypted_token=encrypted_str('some bearer token'),
+        payload=delivered_payload,
+        expires_at=now - timedelta(seconds=1),
+    )
+    # Requested for after it expires
+    await client.send_callback_request(
+        url=HttpUrl('https://localhost/'),
+        encrypted_token=encrypted_str('some bearer token'),
+        payload=delivered_payload.model_copy(update={'notification_id': uuid4()}),
+        deliver_at=now + timedelta(minutes=5),
+        expires_at=now + timedelta(minutes=1),
+    )
+    delay = await client.try_callback_request(
+        url=HttpUrl('https://localhost/'),
+        encrypted_token=encrypted_str('some bearer token'),
+        payload=delivered_payload.model_copy(update={'notification_id': uuid4()}),
+        expires_at=now - timedelta(seconds=1),
+    )
+    assert delay is None
+    mock_client.post.assert_not_called()
+    assert client.retry_scheduler.pending() == 0
+
+
+@pytest.mark.asyncio
+@patch('notify_aia.clients.callback.processing.CallbackAsyncClient.client')
+async def test_wb_deadline_passes_waiting_for_slot(
+    mock_client: MagicMock,
+    delivered_payload: RequestPayload,
+    get_app: Naia,
+    enc_key: Tuple[str],
+    encrypted_str: Callable[[str], str],
+) -> None:
+    await initialize_app(get_app, enc_key)
+    client = get_app.callback_client
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=1, latency_target=0)
+    client.set_concurrency_limiter(limiter)
+    await limiter.acquire('service.example.com')
+
+    delay = await client.try_callback_request(
+        url=HttpUrl('https://service.example.com/callback'),
+        encrypted_token=encrypted_str('some bearer token'),
+        payload=delivered_payload,
+        expires_at=datetime.now(timezone.utc) + timedelta(seconds=0.05),
+    )
+    assert delay is None
+    mock_client.post.assert_not_called()
+    # The waiter gave up its place, and the host is not blamed for it
+    assert limiter.in_flight() == 1
+    assert client.host_circuits() == {'service.example.com': 'closed'}
@@ -1,8 +1,10 @@
-from typing import Callable, Tuple
-from unittest.mock import MagicMock, patch
+from typing import Any, Callable, Dict, Tuple
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
+import ujson
 from fastapi.testclient import TestClient
+from pytest_mock import MockerFixture
 
 from notify_aia.clients.callback import rest as naia_rest
 from notify_aia.clients.callback.processing import CallbackAsyncClient
@@ -23,10 +25,11 @@ async def test_wb_exercise_happy_path(
     enc_key: Tuple[str],
     encrypted_str: Callable[[str], str],
     delivered_payload: naia_rest.RequestPayload,
+    service_response: Callable[..., MagicMock],
 ) -> None:
     get_app.initialize_app(encryption_keys=enc_key)
     client = TestClient(get_app)
-    mock_post.return_value = {'message': 'ok'}
+    mock_post.post.return_value = service_response()
     bearer_token = encrypted_str('some bearer token')
 
     data = {
@@ -38,3 +41,223 @@ async def test_wb_exercise_happy_path(
     response = client.post('/callback/send', json=data)
     assert response.status_code == 202
     assert response.json() == {'message': 'Accepted'}
+
+
+@pytest.mark.asyncio
+@patch('notify_aia.clients.callback.processing.CallbackAsyncClient.send_records')
+async def test_wb_send_batch_all_accepted(
+    mock_send: MagicMock,
+    get_app: Naia,
+    enc_key: Tuple[str],
+    callback_data: Dict[str, Any],
+) -> None:
+    get_app.initialize_app(encryption_keys=enc_key)
+    client = TestClient(get_app)
+
+    response = client.post('/callback/send-batch', json=[callback_data] * 3)
+    assert response.status_code == 202
+    assert response.json()['accepted'] == 3
+    assert response.json()['rejected'] == 0
+    # The whole batch is handed off in one call
+    mock_send.assert_called_once()
+    assert len(mock_send.call_args.args[0]) == 3
+
+
+@pytest.mark.asyncio
+@patch('notify_aia.clients.callback.processing.CallbackAsyncClient.send_records')
+async def test_wb_send_batch_partial_reject(
+    mock_send: MagicMock,
+    get_app: Naia,
+    enc_key: Tuple[str],
+    callback_data: Dict[str, Any],
+) -> None:
+    get_app.initialize_app(encryption_keys=enc_key)
+    client = TestClient(get_app)
+    bad_url = {**callback_data, 'url': 'not a url'}
+
+    response = client.post('/callback/send-batch', json=[callback_data, bad_url, 'garbage'])
+    assert response.status_code == 202
+    body = response.json()
+    assert (body['accepted'], body['rejected']) == (1, 2)
+    assert [result['accepted'] for result in body['results']] == [True, False, False]
+    assert body['results'][1]['error'].startswith('url:')
+    assert body['results'][2]['error'].startswith('item:')
+    assert len(mock_send.call_args.args[0]) == 1
+
+
+@pytest.mark.asyncio
+@patch('notify_aia.clients.callback.processing.CallbackAsyncClient.send_records')
+async def test_wb_send_batch_all_rejected(
+    mock_send: MagicMock,
+    get_app: Naia,
+    enc_key: Tuple[str],
+) -> None:
+    get_app.initialize_app(encryption_keys=enc_key)
+    client = TestClient(get_app)
+
+    response = client.post('/callback/send-batch', json=[{}])
+    assert response.status_code == 202
+    assert response.json()['rejected'] == 1
+    mock_send.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_ut_send_unknown_priority_rejected(
+    get_app: Naia,
+    enc_key: Tuple[str],
+    callback_data: Dict[str, Any],
+) -> None:
+    get_app.initialize_app(encryption_keys=enc_key)
+    client = TestClient(get_app)
+
+    response = client.post('/callback/send', json={**callback_data, 'priority': 'urgent'})
+    assert response.status_code == 422
+    assert response.json()['error'].startswith("priority: Unknown lane 'urgent'")
+
+
+@pytest.mark.asyncio
+@patch('notify_aia.clients.callback.processing.CallbackAsyncClient.send_records')
+async def test_wb_send_batch_unknown_priority_rejected(
+    mock_send: MagicMock,
+    get_app: Naia,
+    enc_key: Tuple[str],
+    callback_data: Dict[str, Any],
+) -> None:
+    get_app.initialize_app(encryption_keys=enc_key)
+    client = TestClient(get_app)
+
+    response = client.post(
+        '/callback/send-batch', json=[{**callback_data, 'priority': 'high'}, {**callback_data, 'priority': 'urgent'}]
+    )
+    assert response.status_code == 202
+    body = response.json()
+    assert [result['accepted'] for result in body['results']] == [True, False]
+    assert body['results'][1]['error'].startswith('priority:')
+    assert len(mock_send.call_args.args[0]) == 1
+
+
+@pytest.mark.asyncio
+async def test_ut_send_batch_too_large(
+    get_app: Naia,
+    enc_key: Tuple[str],
+    callback_data: Dict[str, Any],
+    mocker: MockerFixture,
+) -> None:
+    mocker.patch.object(naia_rest, '_MAX_BATCH_SIZE', 2)
+    get_app.initialize_app(encryption_keys=enc_key)
+    client = TestClient(get_app)
+
+    response = client.post('/callback/send-batch', json=[callback_data] * 3)
+    assert response.status_code == 413
+
+
+@pytest.mark.asyncio
+@patch('notify_aia.clients.callback.processing.CallbackAsyncClient.send_records')
+async def test_wb_send_stream(
+    mock_send: MagicMock,
+    get_app: Naia,
+    enc_key: Tuple[str],
+    callback_data: Dict[str, Any],
+) -> None:
+    get_app.initialize_app(encryption_keys=enc_key)
+    client = TestClient(get_app)
+    lines = [ujson.dumps(callback_data), '', '{not json', ujson.dumps(callback_data)]
+
+    response = client.post(
+        '/callback/send-stream',
+        content='\n'.join(lines).encode(),
+        headers={'Content-Type': 'application/x-ndjson'},
+    )
+    assert response.status_code == 202
+    body = response.json()
+    # Blank lines are skipped, not rejected
+    assert (body['accepted'], body['rejected']) == (2, 1)
+    assert body['results'][1]['error'].startswith('item: Invalid JSON')
+    assert len(mock_send.call_args.args[0]) == 2
+
+
+@pytest.mark.asyncio
+async def test_ut_send_stream_too_large(
+    get_app: Naia,
+    enc_key: Tuple[str],
+    callback_data: Dict[str, Any],
+    mocker: MockerFixture,
+) -> None:
+    mocker.patch.object(naia_rest, '_MAX_BATCH_SIZE', 1)
+    get_app.initialize_app(encryption_keys=enc_key)
+    client = TestClient(get_app)
+
+    response = client.post('/callback/send-stream', content=f'{ujson.dumps(callback_data)}\n' * 2)
+    assert response.status_code == 413
+
+
+@pytest.mark.asyncio
+@patch('notify_aia.clients.callback.processing.CallbackAsyncClient.send_records')
+async def test_ut_send_stream_line_too_long(
+    mock_send: MagicMock,
+    get_app: Naia,
+    enc_key: Tuple[str],
+    callback_data: Dict[str, Any],
+    mocker: MockerFixture,
+) -> None:
+    mocker.patch.object(naia_rest, '_MAX_LINE_BYTES', 1024)
+    get_app.initialize_app(encryption_keys=enc_key)
+    client = TestClient(get_app)
+
+    # Streamed without newlines, rejected before the whole body is held
+    response = client.post('/callback/send-stream', content=(b'x' * 512 for _ in range(8)))
+    assert response.status_code == 413
+    assert response.json() == {'error': 'Line exceeds the maximum of 1024 bytes'}
+    mock_send.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_wb_send_with_queue_puts_job(
+    get_app: Naia,
+    enc_key: Tuple[str],
+    callback_data: Dict[str, Any],
+) -> None:
+    queue = AsyncMock()
+    get_app.initialize_app(encryption_keys=enc_key)
+    get_app.callback_queue = queue
+    client = TestClient(get_app)
+
+    response = client.post('/callback/send', json=callback_data)
+    assert response.status_code == 202
+    (bodies,) = queue.put.call_args.args
+    assert naia_rest.RequestCallback.model_validate_json(bodies[0]).encrypted_token == callback_data['encrypted_token']
+
+
+@pytest.mark.asyncio
+async def test_wb_send_batch_with_queue_puts_once(
+    get_app: Naia,
+    enc_key: Tuple[str],
+    callback_data: Dict[str, Any],
+) -> None:
+    queue = AsyncMock()
+    get_app.initialize_app(encryption_keys=enc_key)
+    get_app.callback_queue = queue
+    client = TestClient(get_app)
+
+    response = client.post('/callback/send-batch', json=[callback_data, {}, callback_data])
+    assert response.json()['accepted'] == 2
+    queue.put.assert_called_once()
+    assert len(queue.put.call_args.args[0]) == 2
+
+
+@pytest.mark.asyncio
+async def test_wb_send_batch_with_queue_groups_deliver_at(
+    get_app: Naia,
+    enc_key: Tuple[str],
+    callback_data: Dict[str, Any],
+) -> None:
+    queue = AsyncMock()
+    get_app.initialize_app(encryption_keys=enc_key)
+    get_app.callback_queue = queue
+    client = TestClient(get_app)
+    delayed = {**callback_data, 'deliver_at': '2030-01-01T00:00:00+00:00'}
+
+    response = client.post('/callback/send-batch', json=[callback_data, delayed, delayed])
+    assert response.json()['accepted'] == 3
+    puts = {call.kwargs['due_at']: len(call.args[0]) for call in queue.put.call_args_list}
+    assert puts == {None: 1, 1893456000.0: 2}
@@ -0,0 +1,81 @@
+import os
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from time import monotonic, time
+from typing import List
+
+import pytest
+from pydantic.networks import HttpUrl
+
+from notify_aia.clients.callback.priority import HIGH_LANE
+from notify_aia.clients.callback.processing import CallbackAsyncClient, CallbackRecord
+from notify_aia.clients.callback.rest import RequestCallback, RequestPayload
+from notify_aia.clients.callback.spill import RetrySpillFile, spill_to_queue
+from notify_aia.clients.scheduler import RetryScheduler
+from notify_aia.queue.sqlite import SqliteQueueBackend
+
+
+async def deliver(record: CallbackRecord) -> None:
+    pass
+
+
+@pytest.mark.asyncio
+async def test_wb_spill_file_round_trip(tmp_path: Path, delivered_payload: RequestPayload) -> None:
+    path = str(tmp_path / 'retries.jsonl')
+    client = CallbackAsyncClient()
+    record = client._new_record(HttpUrl('https://localhost/'), 'token', delivered_payload, b'salt', priority='high')
+    record.attempt_number = 3
+    record.start_time = monotonic() - 30
+    record.deadline = monotonic() + 300
+    await RetrySpillFile(path, client.retry_scheduler).write([(monotonic() + 60, record)])
+
+    scheduler = RetryScheduler(deliver)
+    await RetrySpillFile(path, scheduler).start()
+    ((due, restored),) = scheduler.take_pending()
+    assert not os.path.exists(path)
+    assert due == pytest.approx(monotonic() + 60, abs=1)
+    assert monotonic() - restored.start_time == pytest.approx(30, abs=1)
+    assert restored.deadline == pytest.approx(monotonic() + 300, abs=1)
+    for slot in ('url', 'host', 'encrypted_token', 'body', 'attempt_number', 'legacy_salt', 'notification_id', 'lane'):
+        assert getattr(restored, slot) == getattr(record, slot)
+    assert restored.lane is HIGH_LANE
+    await client.close_client()
+
+
+@pytest.mark.asyncio
+async def test_wb_spill_file_missing(tmp_path: Path) -> None:
+    scheduler = RetryScheduler(deliver)
+    await RetrySpillFile(str(tmp_path / 'retries.jsonl'), scheduler).start()
+    assert scheduler.pending() == 0
+
+
+@pytest.mark.asyncio
+async def test_wb_spill_to_queue(tmp_path: Path, delivered_payload: RequestPayload) -> None:
+    queue = SqliteQueueBackend(str(tmp_path / 'naia.db'))
+    await queue.open()
+    client = CallbackAsyncClient()
+    record = client._new_record(
+        HttpUrl('https://localhost/'),
+        'token',
+        delivered_payload,
+        expires_at=datetime.now(timezone.utc) + timedelta(minutes=5),
+    )
+    record.attempt_number = 4
+    record.start_time = monotonic() - 30
+    legacy = client._new_record(HttpUrl('https://localhost/'), 'token', delivered_payload, b'salt')
+
+    left: List[object] = await spill_to_queue(queue, [(monotonic() - 1, record), (monotonic(), legacy)])
+    assert left == [(pytest.approx(monotonic(), abs=1), legacy)]
+    (job,) = await queue.claim(10)
+    assert job.due_at <= time()
+    # Three attempts were made, the first 30 seconds ago
+    assert job.attempts == 3
+    assert job.created_at == pytest.approx(time() - 30, abs=1)
+    callback = RequestCallback.model_validate_json(job.body)
+    assert callback.payload == delivered_payload
+    assert callback.encrypted_token == 'token'
+    assert callback.priority == 'normal'
+    assert callback.expires_at is not None
+    assert callback.expires_at.timestamp() == pytest.approx(time() + 300, abs=1)
+    await queue.close()
+    await client.close_client()
@@ -0,0 +1,280 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncGenerator, Callable, Dict, Generator, Tuple
+from unittest.mock import AsyncMock
+
+import pytest
+import pytest_asyncio
+
+from notify_aia.clients.callback.processing import CallbackAsyncClient
+from notify_aia.clients.callback.rest import RequestCallback, RequestPayload
+from notify_aia.clients.callback.sqs import SqsCallbackConsumer
+from notify_aia.clients.limiter import AdaptiveConcurrencyLimiter
+from notify_aia.naia import Naia
+
+
+@pytest.fixture()
+def callback_body(
+    encrypted_str: Callable[[str], str],
+    delivered_payload: RequestPayload,
+) -> str:
+    callback = RequestCallback(
+        url='https://localhost/',  # type: ignore[arg-type]
+        encrypted_token=encrypted_str('some bearer token'),
+        payload=delivered_payload,
+    )
+    return callback.model_dump_json()
+
+
+@pytest_asyncio.fixture()
+async def consumer() -> AsyncGenerator[SqsCallbackConsumer, Any]:
+    client = CallbackAsyncClient()
+    client.try_callback_request = AsyncMock(return_value=None)  # type: ignore[method-assign]
+    consumer = SqsCallbackConsumer('https://sqs.local/queue', client)
+    consumer._sqs = AsyncMock()
+    consumer._sqs.delete_message_batch.return_value = {'Successful': [{}]}
+    yield consumer
+
+
+async def handle(consumer: SqsCallbackConsumer, message: Dict[str, Any]) -> None:
+    ((callback, bearer_token),) = await consumer.callback_client.decode_callbacks([message['Body']])
+    await consumer._handle(message, callback, bearer_token)
+
+
+def message(body: str, receive_count: int = 1) -> Dict[str, Any]:
+    return {
+        'MessageId': 'id',
+        'ReceiptHandle': f'handle-{receive_count}',
+        'Body': body,
+        'Attributes': {'ApproximateReceiveCount': str(receive_count), 'SentTimestamp': '1700000000000'},
+    }
+
+
+@pytest.mark.asyncio
+async def test_wb_delivered_message_is_deleted(consumer: SqsCallbackConsumer, callback_body: str) -> None:
+    await handle(consumer, message(callback_body, receive_count=3))
+    assert consumer.callback_client.try_callback_request.call_args.kwargs['attempt_number'] == 3  # type: ignore[attr-defined]
+    assert consumer._pending_deletes == ['handle-3']
+
+    await consumer._flush_deletes()
+    consumer._sqs.delete_message_batch.assert_called_once()
+    assert consumer.stats()['delivered'] == 1
+    assert consumer.stats()['deleted'] == 1
+
+
+@pytest.mark.asyncio
+async def test_wb_retry_extends_visibility(consumer: SqsCallbackConsumer, callback_body: str) -> None:
+    consumer.callback_client.try_callback_request.return_value = 4.2  # type: ignore[attr-defined]
+
+    await handle(consumer, message(callback_body))
+    consumer._sqs.change_message_visibility.assert_called_once_with(
+        QueueUrl='https://sqs.local/queue',
+        ReceiptHandle='handle-1',
+        VisibilityTimeout=5,
+    )
+    assert consumer._pending_deletes == []
+    assert consumer.retried == 1
+
+
+@pytest.mark.asyncio
+async def test_wb_long_attempt_stays_invisible(consumer: SqsCallbackConsumer, callback_body: str) -> None:
+    consumer.visibility_timeout = 0.03
+
+    async def slow_attempt(**kwargs: Any) -> None:
+        await asyncio.sleep(0.05)
+
+    consumer.callback_client.try_callback_request.side_effect = slow_attempt  # type: ignore[attr-defined]
+    await handle(consumer, message(callback_body))
+    calls = consumer._sqs.change_message_visibility.call_args_list
+    assert len(calls) >= 2
+    assert all(call.kwargs['VisibilityTimeout'] == 1 for call in calls)
+    await asyncio.sleep(0.03)
+    assert consumer._sqs.change_message_visibility.call_count == len(calls)
+    assert consumer._pending_deletes == ['handle-1']
+
+
+@pytest.mark.asyncio
+async def test_ut_attempt_error_is_logged(consumer: SqsCallbackConsumer, callback_body: str) -> None:
+    consumer.callback_client.try_callback_request.side_effect = RuntimeError('boom')  # type: ignore[attr-defined]
+    consumer._sqs.change_message_visibility.side_effect = RuntimeError('boom')
+
+    await handle(consumer, message(callback_body))
+    assert consumer._pending_deletes == []
+    assert consumer._free == consumer.max_in_flight + 1
+
+
+@pytest.mark.asyncio
+async def test_wb_busy_host_messages_are_deferred(consumer: SqsCallbackConsumer, callback_body: str) -> None:
+    consumer.callback_client.set_concurrency_limiter(AdaptiveConcurrencyLimiter(initial_limit=1))
+    messages = [message(callback_body, receive_count=i) for i in (1, 2)]
+    decoded = await consumer.callback_client.decode_callbacks([message['Body'] for message in messages])
+    consumer._free -= 2
+
+    consumer._dispatch([(message, *callback) for message, callback in zip(messages, decoded)])
+    await asyncio.gather(*consumer._in_flight)
+    consumer.callback_client.try_callback_request.assert_called_once()  # type: ignore[attr-defined]
+    # Sent again rather than made visible again, so the deferral does not count as an attempt
+    consumer._sqs.change_message_visibility.assert_not_called()
+    consumer._sqs.send_message.assert_called_once_with(
+        QueueUrl='https://sqs.local/queue',
+        MessageBody=callback_body,
+        DelaySeconds=1,
+        MessageAttributes={
+            'NaiaAttempts': {'DataType': 'Number', 'StringValue': '1'},
+            'NaiaSentTimestamp': {'DataType': 'Number', 'StringValue': '1700000000000'},
+        },
+    )
+    assert sorted(consumer._pending_deletes) == ['handle-1', 'handle-2']
+    assert consumer._free == consumer.max_in_flight
+
+
+@pytest.mark.asyncio
+async def test_wb_requeued_message_keeps_attempts(consumer: SqsCallbackConsumer, callback_body: str) -> None:
+    requeued = message(callback_body, receive_count=1)
+    requeued['Attributes']['SentTimestamp'] = '1800000000000'
+    requeued['MessageAttributes'] = {
+        'NaiaAttempts': {'DataType': 'Number', 'StringValue': '2'},
+        'NaiaSentTimestamp': {'DataType': 'Number', 'StringValue': '1700000000000'},
+    }
+
+    await handle(consumer, requeued)
+    kwargs = consumer.callback_client.try_callback_request.call_args.kwargs  # type: ignore[attr-defined]
+    assert kwargs['attempt_number'] == 3
+    # The age of the callback counts from the original send
+    assert kwargs['start_time'] == pytest.approx(time.monotonic() - (time.time() - 1700000000), abs=5)
+
+
+@pytest.mark.asyncio
+async def test_wb_pollers_share_small_capacity(consumer: SqsCallbackConsumer, callback_body: str) -> None:
+    consumer.pollers = 4
+    consumer.max_in_flight = consumer._free = 20
+    consumer.wait_time_seconds = 0
+
+    async def slow_attempt(**kwargs: Any) -> None:
+        await asyncio.sleep(0.01)
+
+    consumer.callback_client.try_callback_request.side_effect = slow_attempt  # type: ignore[attr-defined]
+
+    async def receive_message(MaxNumberOfMessages: int, **kwargs: Any) -> Dict[str, Any]:
+        await asyncio.sleep(0)
+        return {'Messages': [message(callback_body) for _ in range(MaxNumberOfMessages)]}
+
+    consumer._sqs.receive_message.side_effect = receive_message
+    pollers = [asyncio.create_task(consumer._poll()) for _ in range(consumer.pollers)]
+    await asyncio.sleep(0.2)
+    for poller in pollers:
+        poller.cancel()
+    await asyncio.gather(*pollers, return_exceptions=True)
+    # Receiving kept going as attempts finished, never more than the capacity at once
+    sizes = [call.kwargs['MaxNumberOfMessages'] for call in consumer._sqs.receive_message.call_args_list]
+    assert consumer.delivered > 40
+    assert all(1 <= size <= 10 for size in sizes)
+    await asyncio.gather(*consumer._in_flight)
+    assert consumer._free == 20
+
+
+@pytest.mark.asyncio
+async def test_ut_cancelled_poll_releases_capacity(consumer: SqsCallbackConsumer) -> None:
+    async def receive_message(**kwargs: Any) -> Dict[str, Any]:
+        await asyncio.sleep(60)
+        return {}
+
+    consumer._sqs.receive_message.side_effect = receive_message
+    poller = asyncio.create_task(consumer._poll())
+    await asyncio.sleep(0.01)
+    assert consumer._free == consumer.max_in_flight - 10
+    poller.cancel()
+    await asyncio.gather(poller, return_exceptions=True)
+    assert consumer._free == consumer.max_in_flight
+
+
+@pytest.mark.asyncio
+async def test_wb_deliver_at_defers_attempt(consumer: SqsCallbackConsumer, callback_body: str) -> None:
+    deliver_at = datetime.now(timezone.utc) + timedelta(minutes=10)
+    body = RequestCallback.model_validate_json(callback_body).model_copy(update={'deliver_at': deliver_at})
+
+    messages = [message(body.model_dump_json())]
+    decoded = await consumer.callback_client.decode_callbacks([message['Body'] for message in messages])
+    consumer._free -= 1
+
+    consumer._dispatch([(message, *callback) for message, callback in zip(messages, decoded)])
+    await asyncio.gather(*consumer._in_flight)
+    consumer.callback_client.try_callback_request.assert_not_called()  # type: ignore[attr-defined]
+    delay = consumer._sqs.send_message.call_args.kwargs['DelaySeconds']
+    assert 595 <= delay <= 600
+    assert consumer._pending_deletes == ['handle-1']
+    assert consumer._free == consumer.max_in_flight
+
+
+@pytest.mark.asyncio
+async def test_ut_invalid_message_is_dropped(consumer: SqsCallbackConsumer) -> None:
+    await handle(consumer, message('{"not": "a callback"}'))
+    consumer.callback_client.try_callback_request.assert_not_called()  # type: ignore[attr-defined]
+    assert consumer._pending_deletes == ['handle-1']
+    assert consumer.dropped == 1
+
+
+@pytest.mark.asyncio
+async def test_wb_deletes_are_batched_by_ten(consumer: SqsCallbackConsumer) -> None:
+    consumer._pending_deletes = [f'handle-{i}' for i in range(25)]
+    await consumer._flush_deletes()
+    sizes = [len(call.kwargs['Entries']) for call in consumer._sqs.delete_message_batch.call_args_list]
+    assert sizes == [10, 10, 5]
+
+
+@pytest.mark.asyncio
+async def test_wb_full_batch_is_deleted_immediately(consumer: SqsCallbackConsumer) -> None:
+    for i in range(10):
+        consumer._delete(f'handle-{i}')
+    await asyncio.gather(*consumer._in_flight)
+    consumer._sqs.delete_message_batch.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_wb_initialize_app_sqs_consumer(get_app: Naia, enc_key: Tuple[str]) -> None:
+    get_app.initialize_app(enc_key, callback_sqs_queue_url='https://sqs.local/queue')
+    _, _, consumer = get_app._services
+    assert isinstance(consumer, SqsCallbackConsumer)
+    assert consumer.callback_client is get_app.callback_client
+
+
+@pytest.fixture()
+def moto_endpoint() -> Generator[str, Any, Any]:
+    moto_server = pytest.importorskip('moto.server')
+    server = moto_server.ThreadedMotoServer(port=0, verbose=False)
+    server.start()
+    host, port = server.get_host_and_port()
+    yield f'http://{host}:{port}'
+    server.stop()
+
+
+@pytest.mark.asyncio
+async def test_wb_consume_from_local_sqs(moto_endpoint: str, callback_body: str) -> None:
+    client_kwargs = {
+        'endpoint_url': moto_endpoint,
+        'region_name': 'us-east-1',
+        'aws_access_key_id': 'test',
+        'aws_secret_access_key': 'test',
+    }
+    callback_client = CallbackAsyncClient()
+    callback_client.try_callback_request = AsyncMock(return_value=None)  # type: ignore[method-assign]
+    consumer = SqsCallbackConsumer(
+        '', callback_client, pollers=2, wait_time_seconds=1, delete_interval=0.05, **client_kwargs
+    )
+    async with consumer.session.create_client('sqs', **client_kwargs) as sqs:
+        consumer.queue_url = (await sqs.create_queue(QueueName='naia-callbacks'))['QueueUrl']
+        for _ in range(15):
+            await sqs.send_message(QueueUrl=consumer.queue_url, MessageBody=callback_body)
+
+        await consumer.start()
+        for _ in range(100):
+            if consumer.deleted == 15:
+                break
+            await asyncio.sleep(0.05)
+        await consumer.stop()
+
+        assert consumer.delivered == 15
+        assert consumer.deleted == 15
+        attributes = await sqs.get_queue_attributes(QueueUrl=consumer.queue_url, AttributeNames=['All'])
+        assert attributes['Attributes']['ApproximateNumberOfMessages'] == '0'
@@ -0,0 +1,145 @@
+import asyncio
+from typing import Any, Callable, List, Tuple
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import aiohttp
+import pytest
+from tenacity import stop_after_attempt, wait_fixed
+
+from notify_aia.clients.jobs.processing import JobAsyncClient
+from notify_aia.clients.jobs.templates import JobAuth, JobResponse, JobResult, RequestTemplate
+from notify_aia.naia import Naia
+
+PROFILE = RequestTemplate(
+    'profile',
+    'https://profile.example.com/v1/profiles/{profile_id}',
+    auth=JobAuth.BEARER,
+)
+CONTACT = RequestTemplate(
+    'contact',
+    'https://contact.example.com/v1/{profile_id}/contact',
+    method='put',
+    body=lambda params: {'email': params['email']},
+    response=JobResponse.TEXT,
+)
+
+
+def respond(mock_client: MagicMock, *responses: Any) -> None:
+    """Make client.request return each of `responses`, a status to read or an exception to raise, in turn."""
+    contexts = []
+    for response in responses:
+        context = MagicMock()
+        if isinstance(response, BaseException):
+            context.__aenter__.side_effect = response
+        else:
+            resp = MagicMock(status=response)
+            resp.raise_for_status.side_effect = aiohttp.ClientResponseError(MagicMock(), (), status=response)
+            resp.json = AsyncMock(return_value={'status': response})
+            resp.text = AsyncMock(return_value=str(response))
+            context.__aenter__.return_value = resp
+        contexts.append(context)
+    mock_client.request.side_effect = contexts
+
+
+async def wait_for_results(results: List[JobResult], count: int = 1) -> None:
+    for _ in range(100):
+        if len(results) >= count:
+            return
+        await asyncio.sleep(0.01)
+
+
+def test_ut_render_url() -> None:
+    assert PROFILE.render_url({'profile_id': 'a/b c'}) == 'https://profile.example.com/v1/profiles/a%2Fb%20c'
+    with pytest.raises(ValueError, match='requires parameter'):
+        PROFILE.render_url({})
+
+
+@pytest.mark.asyncio
+async def test_wb_prepare_rejects() -> None:
+    client = JobAsyncClient()
+    client.register(PROFILE)
+    with pytest.raises(KeyError, match='Unknown job template'):
+        client.prepare('missing', {})
+    with pytest.raises(ValueError, match='encrypted_token'):
+        client.prepare('profile', {'profile_id': '1'})
+
+
+@pytest.mark.asyncio
+@patch('notify_aia.clients.jobs.processing.JobAsyncClient.client')
+async def test_wb_submit_bearer_json(
+    mock_client: MagicMock,
+    get_app: Naia,
+    enc_key: Tuple[str],
+    encrypted_str: Callable[[str], str],
+) -> None:
+    results: List[JobResult] = []
+    get_app.initialize_app(enc_key, job_templates=[PROFILE], job_sink=results.append)
+    respond(mock_client, 200)
+    assert get_app.job_client is not None
+
+    job_id = await get_app.job_client.submit('profile', {'profile_id': '1'}, encrypted_str('token'), job_id='job-1')
+    assert job_id == 'job-1'
+    mock_client.request.assert_called_once_with(
+        'GET',
+        'https://profile.example.com/v1/profiles/1',
+        data=None,
+        headers={'Authorization': 'Bearer token'},
+    )
+    (result,) = results
+    assert (result.ok, result.status, result.body, result.attempts) == (True, 200, {'status': 200}, 1)
+    assert result.params == {'profile_id': '1'}
+
+
+@pytest.mark.asyncio
+@patch('notify_aia.clients.jobs.processing.JobAsyncClient.client')
+async def test_wb_submit_retries_to_async_sink(mock_client: MagicMock) -> None:
+    results: List[JobResult] = []
+
+    async def sink(result: JobResult) -> None:
+        results.append(result)
+
+    client = JobAsyncClient(sink=sink)
+    client.set_retry_wait(wait_fixed(0))
+    client.register(CONTACT)
+    respond(mock_client, 503, aiohttp.ClientConnectionError('refused'), 200)
+
+    await client.submit('contact', {'profile_id': '1', 'email': 'a@b.c'})
+    # Connection errors are not retried by the default criteria
+    await wait_for_results(results)
+    (result,) = results
+    assert (result.ok, result.status, result.attempts) == (False, None, 2)
+    assert isinstance(result.error, aiohttp.ClientConnectionError)
+    method, _ = mock_client.request.call_args.args
+    assert method == 'PUT'
+    assert mock_client.request.call_args.kwargs['data'] == b'{"email":"a@b.c"}'
+    assert mock_client.request.call_args.kwargs['headers'] == {'Content-Type': 'application/json'}
+    await client.retry_scheduler.stop()
+
+
+@pytest.mark.asyncio
+@patch('notify_aia.clients.jobs.processing.JobAsyncClient.client')
+async def test_wb_template_retry_policy(mock_client: MagicMock) -> None:
+    results: List[JobResult] = []
+    client = JobAsyncClient(sink=results.append)
+    client.set_retry_wait(wait_fixed(0))
+    client.register(RequestTemplate('once', 'https://once.example.com/', retry_stop=stop_after_attempt(1)))
+    client.register(RequestTemplate('rejected', 'https://rejected.example.com/', response=JobResponse.NONE))
+    respond(mock_client, 500, 404)
+
+    await client.submit('once', {})
+    await client.submit('rejected', {})
+    assert [(result.status, result.body, result.attempts) for result in results] == [(500, None, 1), (404, None, 1)]
+    assert not any(result.ok for result in results)
+
+
+@pytest.mark.asyncio
+async def test_wb_naia_shares_callback_client(get_app: Naia, enc_key: Tuple[str]) -> None:
+    get_app.initialize_app(enc_key, job_templates=[PROFILE, CONTACT])
+    callback_client, job_client = get_app.callback_client, get_app.job_client
+    assert job_client is not None
+    assert job_client.connector is callback_client.connector
+    assert job_client._concurrency_limiter is callback_client.concurrency_limiter
+    assert job_client._fair_scheduler is callback_client.fair_scheduler
+    assert job_client._circuit_breaker is callback_client.circuit_breaker
+    assert sorted(job_client.templates) == ['contact', 'profile']
+    assert job_client.retry_scheduler in get_app._services
@@ -0,0 +1,52 @@
+from typing import Callable, Tuple
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from notify_aia.clients.jobs.templates import JobAuth, RequestTemplate
+from notify_aia.naia import Naia
+
+PROFILE = RequestTemplate('profile', 'https://profile.example.com/{profile_id}', auth=JobAuth.BEARER)
+
+
+@pytest.mark.asyncio
+@patch('notify_aia.clients.jobs.processing.JobAsyncClient.run')
+async def test_wb_submit_job(
+    mock_run: MagicMock,
+    get_app: Naia,
+    enc_key: Tuple[str],
+    encrypted_str: Callable[[str], str],
+) -> None:
+    get_app.initialize_app(enc_key, job_templates=[PROFILE])
+    client = TestClient(get_app)
+
+    data = {'params': {'profile_id': '1'}, 'encrypted_token': encrypted_str('token'), 'job_id': 'job-1'}
+    response = client.post('/jobs/profile', json=data)
+    assert response.status_code == 202
+    assert response.json() == {'job_id': 'job-1'}
+    (record,) = mock_run.call_args.args
+    assert (record.url, record.job_id, record.attempt_number) == ('https://profile.example.com/1', 'job-1', 1)
+    assert get_app.admission.in_flight() == 0
+
+
+@pytest.mark.asyncio
+@patch('notify_aia.clients.jobs.processing.JobAsyncClient.run')
+async def test_wb_submit_job_rejected(mock_run: MagicMock, get_app: Naia, enc_key: Tuple[str]) -> None:
+    get_app.initialize_app(enc_key, job_templates=[PROFILE])
+    client = TestClient(get_app)
+
+    response = client.post('/jobs/missing', json={})
+    assert response.status_code == 404
+    assert response.json() == {'error': 'Unknown job template missing'}
+    response = client.post('/jobs/profile', json={'encrypted_token': 'token'})
+    assert response.status_code == 422
+    assert response.json() == {'error': "Job template profile requires parameter 'profile_id'"}
+    mock_run.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_wb_no_jobs_router_without_templates(get_app: Naia, enc_key: Tuple[str]) -> None:
+    get_app.initialize_app(enc_key)
+    assert get_app.job_client is None
+    assert TestClient(get_app).post('/jobs/profile', json={}).status_code == 404
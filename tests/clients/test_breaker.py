@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+from pytest_mock import MockerFixture
+
+from notify_aia.clients import breaker as naia_breaker
+from notify_aia.clients.breaker import CircuitBreaker
+
+
+async def fail(breaker: CircuitBreaker, host: str, times: int) -> None:
+    for _ in range(times):
+        await breaker.acquire(host)
+        breaker.record(host, False)
+
+
+@pytest.mark.asyncio
+async def test_wb_closed_until_failure_rate() -> None:
+    breaker = CircuitBreaker(window_size=4, min_calls=4, failure_rate=0.75)
+    await fail(breaker, 'a.com', 2)
+    await breaker.acquire('a.com')
+    breaker.record('a.com', True)
+    assert breaker.states() == {'a.com': 'closed'}
+
+    await fail(breaker, 'a.com', 1)
+    assert breaker.states() == {'a.com': 'open'}
+
+
+@pytest.mark.asyncio
+async def test_wb_open_circuit_parks_requests() -> None:
+    breaker = CircuitBreaker(window_size=2, min_calls=2, open_seconds=60)
+    await fail(breaker, 'a.com', 2)
+
+    parked = asyncio.create_task(breaker.acquire('a.com'))
+    await asyncio.sleep(0.01)
+    assert not parked.done()
+    # Other hosts are not affected
+    await asyncio.wait_for(breaker.acquire('b.com'), 1)
+    parked.cancel()
+
+
+@pytest.mark.asyncio
+async def test_wb_half_open_probe_success_releases_parked(mocker: MockerFixture) -> None:
+    clock = mocker.patch.object(naia_breaker, 'monotonic', return_value=100.0)
+    breaker = CircuitBreaker(window_size=2, min_calls=2, open_seconds=30)
+    await fail(breaker, 'a.com', 2)
+
+    clock.return_value = 131.0
+    # First request after open_seconds is the probe
+    assert await breaker.acquire('a.com')
+    assert breaker.states() == {'a.com': 'half_open'}
+    assert breaker.probing('a.com')
+    parked = [asyncio.create_task(breaker.acquire('a.com')) for _ in range(3)]
+    await asyncio.sleep(0.01)
+    assert not any(task.done() for task in parked)
+
+    breaker.record('a.com', True, probe=True)
+    await asyncio.wait_for(asyncio.gather(*parked), 1)
+    assert breaker.states() == {'a.com': 'closed'}
+    assert not breaker.probing('a.com')
+
+
+@pytest.mark.asyncio
+async def test_wb_half_open_probe_failure_reopens(mocker: MockerFixture) -> None:
+    clock = mocker.patch.object(naia_breaker, 'monotonic', return_value=100.0)
+    breaker = CircuitBreaker(window_size=2, min_calls=2, open_seconds=30)
+    await fail(breaker, 'a.com', 2)
+
+    clock.return_value = 131.0
+    probe = await breaker.acquire('a.com')
+    breaker.record('a.com', False, probe)
+    assert breaker.states() == {'a.com': 'open'}
+
+
+@pytest.mark.asyncio
+async def test_ut_probe_without_outcome_frees_slot(mocker: MockerFixture) -> None:
+    clock = mocker.patch.object(naia_breaker, 'monotonic', return_value=100.0)
+    breaker = CircuitBreaker(window_size=2, min_calls=2, open_seconds=30)
+    await fail(breaker, 'a.com', 2)
+
+    clock.return_value = 131.0
+    probe = await breaker.acquire('a.com')
+    waiting = asyncio.create_task(breaker.acquire('a.com'))
+    await asyncio.sleep(0.01)
+    # e.g. the probe was cancelled
+    breaker.record('a.com', None, probe)
+    await asyncio.wait_for(waiting, 1)
+    assert breaker.states() == {'a.com': 'half_open'}
+
+
+@pytest.mark.asyncio
+async def test_wb_late_outcome_does_not_decide_half_open(mocker: MockerFixture) -> None:
+    clock = mocker.patch.object(naia_breaker, 'monotonic', return_value=100.0)
+    breaker = CircuitBreaker(window_size=2, min_calls=2, open_seconds=30)
+    # Admitted while closed, finishing after the circuit opened and went half open
+    assert not await breaker.acquire('a.com')
+    await fail(breaker, 'a.com', 2)
+
+    clock.return_value = 131.0
+    assert await breaker.acquire('a.com')
+    breaker.record('a.com', True)
+    assert breaker.states() == {'a.com': 'half_open'}
+    assert breaker.probing('a.com')
+    breaker.record('a.com', False)
+    assert breaker.states() == {'a.com': 'half_open'}
+
+    breaker.record('a.com', True, probe=True)
+    assert breaker.states() == {'a.com': 'closed'}
@@ -0,0 +1,108 @@
+import asyncio
+from typing import List, Tuple
+
+import pytest
+from pytest_mock import MockerFixture
+
+from notify_aia.clients.fairness import DeficitRoundRobin
+from notify_aia.naia import Naia
+
+
+async def queue_requests(scheduler: DeficitRoundRobin, hosts: List[str], order: List[str]) -> List[asyncio.Task[None]]:
+    async def request(host: str) -> None:
+        await scheduler.acquire(host)
+        order.append(host)
+
+    tasks = [asyncio.create_task(request(host)) for host in hosts]
+    await asyncio.sleep(0)
+    return tasks
+
+
+async def drain(scheduler: DeficitRoundRobin, count: int) -> None:
+    for _ in range(count):
+        scheduler.release()
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_wb_acquire_within_capacity() -> None:
+    scheduler = DeficitRoundRobin(capacity=2)
+    await scheduler.acquire('a.com')
+    await scheduler.acquire('b.com')
+    assert scheduler.in_flight() == 2
+    assert scheduler.waiting() == {}
+
+
+@pytest.mark.asyncio
+async def test_wb_round_robin_between_hosts() -> None:
+    scheduler = DeficitRoundRobin(capacity=1)
+    await scheduler.acquire('noisy.com')
+    order: List[str] = []
+    # A burst from one host queued ahead of a quiet host
+    await queue_requests(scheduler, ['noisy.com'] * 4 + ['quiet.com'] * 2, order)
+    assert scheduler.waiting() == {'noisy.com': 4, 'quiet.com': 2}
+
+    await drain(scheduler, 6)
+    assert order == ['noisy.com', 'quiet.com', 'noisy.com', 'quiet.com', 'noisy.com', 'noisy.com']
+    assert scheduler.waiting() == {}
+
+
+@pytest.mark.asyncio
+async def test_wb_weighted_shares() -> None:
+    scheduler = DeficitRoundRobin(capacity=1, weights={'big.com': 2, 'small.com': 0.5})
+    await scheduler.acquire('other.com')
+    order: List[str] = []
+    await queue_requests(scheduler, ['big.com'] * 6 + ['other.com'] * 3 + ['small.com'] * 2, order)
+
+    await drain(scheduler, 11)
+    assert order == [
+        *('big.com', 'big.com', 'other.com'),
+        # small.com earns a request every second round
+        *('big.com', 'big.com', 'other.com', 'small.com'),
+        *('big.com', 'big.com', 'other.com'),
+        'small.com',
+    ]
+
+
+@pytest.mark.asyncio
+async def test_wb_cancelled_waiter_skipped() -> None:
+    scheduler = DeficitRoundRobin(capacity=1)
+    await scheduler.acquire('a.com')
+    order: List[str] = []
+    cancelled, _ = await queue_requests(scheduler, ['a.com', 'b.com'], order)
+    cancelled.cancel()
+    await asyncio.sleep(0)
+
+    await drain(scheduler, 1)
+    assert order == ['b.com']
+    assert scheduler.in_flight() == 1
+
+
+def test_ut_weights_positive() -> None:
+    with pytest.raises(ValueError, match='positive'):
+        DeficitRoundRobin(weights={'a.com': 0})
+
+
+@pytest.mark.asyncio
+async def test_wb_client_shares_connections(get_app: Naia, enc_key: Tuple[str], mocker: MockerFixture) -> None:
+    get_app.initialize_app(enc_key)
+    client = get_app.callback_client
+    client.set_fair_scheduler(DeficitRoundRobin(capacity=1))
+    release = asyncio.Event()
+    order: List[str] = []
+
+    async def limited_post(host: str, *args: object) -> None:
+        await client._acquire(host)
+        order.append(host)
+        await release.wait()
+        client.fair_scheduler.release()
+        client._concurrency_limiter.release(host, 0.0, False)
+
+    posts = [asyncio.create_task(limited_post(host)) for host in ['slow.com'] * 5 + ['fast.com']]
+    await asyncio.sleep(0.01)
+    assert order == ['slow.com']
+    assert client.fair_scheduler.waiting() == {'slow.com': 4, 'fast.com': 1}
+    release.set()
+    await asyncio.gather(*posts)
+    # The quiet host waits one turn rather than for the whole burst
+    assert order.index('fast.com') == 2
@@ -0,0 +1,106 @@
+import asyncio
+from typing import List
+
+import pytest
+
+from notify_aia.clients.callback.priority import HIGH_LANE, RETRY_LANE, PriorityLanes
+from notify_aia.clients.lanes import DEFAULT_LANE, Lane, LaneQueue
+from notify_aia.clients.limiter import AdaptiveConcurrencyLimiter
+
+
+def fill(queue: LaneQueue, lane: Lane, count: int) -> List['asyncio.Future[None]']:
+    waiters: List['asyncio.Future[None]'] = []
+    for _ in range(count):
+        waiters.append(asyncio.get_running_loop().create_future())
+        queue.append(waiters[-1], lane)
+    return waiters
+
+
+@pytest.mark.asyncio
+async def test_wb_lane_shares() -> None:
+    queue = LaneQueue()
+    lanes = {id(waiter): 'normal' for waiter in fill(queue, DEFAULT_LANE, 12)}
+    lanes.update({id(waiter): 'high' for waiter in fill(queue, HIGH_LANE, 16)})
+    lanes.update({id(waiter): 'retry' for waiter in fill(queue, RETRY_LANE, 2)})
+    assert len(queue) == 30
+
+    order = [lanes[id(queue.popleft())] for _ in range(13)]
+    # One round: each lane's share of turns, in the order the lanes started waiting
+    assert order == ['normal'] * 4 + ['high'] * 8 + ['retry']
+    assert len(queue) == 17
+
+
+@pytest.mark.asyncio
+async def test_wb_lane_fractional_share() -> None:
+    queue = LaneQueue()
+    rare = Lane('rare', 0.5)
+    (rare_waiter,) = fill(queue, rare, 1)
+    fill(queue, Lane('other', 1.0), 3)
+    order = [queue.popleft() is rare_waiter for _ in range(3)]
+    # The rare lane earns a turn every second round
+    assert order == [False, True, False]
+
+
+@pytest.mark.asyncio
+async def test_wb_lane_remove_and_cancelled() -> None:
+    queue = LaneQueue()
+    first, second = fill(queue, DEFAULT_LANE, 2)
+    assert first in queue
+    queue.remove(first)
+    assert first not in queue
+    with pytest.raises(ValueError):
+        queue.remove(first)
+
+    second.cancel()
+    assert queue.popleft() is second
+    assert len(queue) == 0
+    with pytest.raises(IndexError):
+        queue.popleft()
+
+
+def test_ut_lane_share_positive() -> None:
+    with pytest.raises(ValueError, match='positive'):
+        Lane('never', 0)
+
+
+def test_ut_priority_lane_rules() -> None:
+    lanes = PriorityLanes(rules={('sms', 'delivered'): 'high', ('email', None): 'retry', (None, 'failed'): 'high'})
+    assert lanes.lane_for('sms', 'delivered') is HIGH_LANE
+    assert lanes.lane_for('email', 'failed') is RETRY_LANE
+    assert lanes.lane_for('push', 'failed') is HIGH_LANE
+    assert lanes.lane_for('sms', 'sending') is DEFAULT_LANE
+    # Named by the caller, unknown names fall back to the rules
+    assert lanes.lane_for('sms', 'sending', priority='high') is HIGH_LANE
+    assert lanes.lane_for('sms', 'delivered', priority='urgent') is HIGH_LANE
+    assert lanes.retry is RETRY_LANE
+
+
+def test_ut_priority_lane_rules_known_lanes() -> None:
+    with pytest.raises(ValueError, match='Unknown priority lane'):
+        PriorityLanes(rules={('sms', None): 'urgent'})
+
+
+@pytest.mark.asyncio
+async def test_wb_high_lane_overtakes_host_backlog() -> None:
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=1, latency_target=0)
+    await limiter.acquire('service.com')
+    order: List[str] = []
+
+    async def acquire(name: str, lane: Lane) -> None:
+        await limiter.acquire('service.com', lane)
+        order.append(name)
+
+    bulk = [asyncio.create_task(acquire('bulk', DEFAULT_LANE)) for _ in range(20)]
+    await asyncio.sleep(0)
+    otp = asyncio.create_task(acquire('otp', HIGH_LANE))
+    await asyncio.sleep(0)
+
+    limiter.release('service.com', latency=1.0, overloaded=False)
+    await asyncio.sleep(0)
+    for _ in range(5):
+        limiter.release('service.com', latency=1.0, overloaded=False)
+        await asyncio.sleep(0)
+    # Served within the normal lane's first turn rather than after the whole backlog
+    assert order.index('otp') == 4
+    for task in [*bulk, otp]:
+        task.cancel()
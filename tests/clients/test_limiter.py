@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+from notify_aia.clients.limiter import AdaptiveConcurrencyLimiter
+
+
+@pytest.mark.asyncio
+async def test_wb_acquire_within_limit() -> None:
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=2)
+    await limiter.acquire('a.com')
+    await limiter.acquire('a.com')
+    # Hosts are limited independently
+    await limiter.acquire('b.com')
+    assert limiter.in_flight('a.com') == 2
+    assert limiter.in_flight() == 3
+    assert limiter.limits() == {'a.com': 2, 'b.com': 2}
+
+
+@pytest.mark.asyncio
+async def test_wb_acquire_waits_for_release() -> None:
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=1, latency_target=0)
+    await limiter.acquire('a.com')
+    waiter = asyncio.create_task(limiter.acquire('a.com'))
+    await asyncio.sleep(0)
+    assert not waiter.done()
+
+    limiter.release('a.com', latency=1.0, overloaded=False)
+    await asyncio.wait_for(waiter, 1)
+    assert limiter.in_flight('a.com') == 1
+
+
+@pytest.mark.asyncio
+async def test_wb_additive_increase() -> None:
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=2, max_limit=3)
+    for _ in range(10):
+        await limiter.acquire('a.com')
+        await limiter.acquire('a.com')
+        limiter.release('a.com', latency=0.01, overloaded=False)
+        limiter.release('a.com', latency=0.01, overloaded=False)
+    # Capped by max_limit
+    assert limiter.limits()['a.com'] == 3
+
+
+@pytest.mark.asyncio
+async def test_wb_no_increase_when_slow_or_idle() -> None:
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=2, latency_target=0.5)
+    for latency in (5.0, 0.01):
+        for _ in range(10):
+            await limiter.acquire('a.com')
+            limiter.release('a.com', latency=latency, overloaded=False)
+    # Slow responses do not grow the limit, neither do fast ones that only use 1 of the 2 slots
+    assert limiter.limits()['a.com'] == 2
+
+
+@pytest.mark.asyncio
+async def test_wb_multiplicative_decrease_with_cooldown() -> None:
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=40, decrease_cooldown=60)
+    for _ in range(3):
+        await limiter.acquire('a.com')
+    for _ in range(3):
+        limiter.release('a.com', latency=10.0, overloaded=True)
+    # The failures came from the same window so the limit is only cut once
+    assert limiter.limits()['a.com'] == 20
+
+
+@pytest.mark.asyncio
+async def test_wb_decrease_respects_min_limit() -> None:
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=2, min_limit=1, decrease_cooldown=0)
+    for _ in range(5):
+        await limiter.acquire('a.com')
+        limiter.release('a.com', latency=10.0, overloaded=True)
+    assert limiter.limits()['a.com'] == 1
+
+
+@pytest.mark.asyncio
+async def test_ut_cancelled_waiter_does_not_leak_slot() -> None:
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=1)
+    await limiter.acquire('a.com')
+    waiter = asyncio.create_task(limiter.acquire('a.com'))
+    await asyncio.sleep(0)
+    waiter.cancel()
+    await asyncio.gather(waiter, return_exceptions=True)
+
+    limiter.release('a.com', latency=10.0, overloaded=False)
+    assert limiter.in_flight('a.com') == 0
+    await asyncio.wait_for(limiter.acquire('a.com'), 1)
+
+
+@pytest.mark.asyncio
+async def test_ut_available() -> None:
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=2)
+    assert limiter.available('unseen.com') == 2
+    await limiter.acquire('a.com')
+    assert limiter.available('a.com') == 1
+    await limiter.acquire('a.com')
+    waiter = asyncio.create_task(limiter.acquire('a.com'))
+    await asyncio.sleep(0)
+    assert limiter.available('a.com') == 0
+    limiter.release('a.com', 0.1, False)
+    await waiter
+    # Handed to the waiter
+    assert limiter.available('a.com') == 0
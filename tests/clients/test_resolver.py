@@ -0,0 +1,147 @@
+import asyncio
+import socket
+from typing import Any, Dict, List, Union
+
+import pytest
+from aiohttp.abc import AbstractResolver
+
+from notify_aia.clients.async_client import AsyncClient
+from notify_aia.clients.resolver import CachingResolver
+from notify_aia.metrics import DNS_LATENCY, DNS_LOOKUPS
+
+
+class FakeResolver(AbstractResolver):
+    """Answer from a dict of host to address, or addresses, or raise OSError, counting the queries."""
+
+    def __init__(self, addresses: Dict[str, Union[str, List[str]]]) -> None:
+        self.addresses = addresses
+        self.queries: List[str] = []
+        self.closed = False
+        self.delay = 0.0
+
+    async def resolve(self, host: str, port: int = 0, family: int = socket.AF_INET) -> List[Any]:
+        self.queries.append(host)
+        await asyncio.sleep(self.delay)
+        if host not in self.addresses:
+            raise socket.gaierror(socket.EAI_NONAME, 'Name or service not known')
+        addresses = self.addresses[host]
+        return [
+            {'hostname': host, 'host': address, 'port': port, 'family': family, 'proto': 0, 'flags': 0}
+            for address in ([addresses] if isinstance(addresses, str) else addresses)
+        ]
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+def lookups(result: str) -> float:
+    return DNS_LOOKUPS.collect().get((result,), 0)
+
+
+@pytest.mark.asyncio
+async def test_wb_burst_shares_one_query() -> None:
+    fake = FakeResolver({'service.com': '10.0.0.1'})
+    fake.delay = 0.01
+    resolver = CachingResolver(fake)
+    misses, coalesced, hits = lookups('miss'), lookups('coalesced'), lookups('hit')
+    queries = DNS_LATENCY.collect().get(('ok',), [0])[-1]
+
+    answers = await asyncio.gather(*(resolver.resolve('service.com', 443) for _ in range(20)))
+    assert all(answer[0]['host'] == '10.0.0.1' for answer in answers)
+    await resolver.resolve('service.com', 443)
+    assert fake.queries == ['service.com']
+    assert (lookups('miss'), lookups('coalesced'), lookups('hit')) == (misses + 1, coalesced + 19, hits + 1)
+    assert DNS_LATENCY.collect()[('ok',)][-1] == queries + 1
+    await resolver.close()
+    assert fake.closed
+
+
+@pytest.mark.asyncio
+async def test_wb_failures_cached_briefly() -> None:
+    fake = FakeResolver({})
+    resolver = CachingResolver(fake, negative_ttl=0.05)
+    negative_hits = lookups('negative_hit')
+
+    for _ in range(3):
+        with pytest.raises(socket.gaierror):
+            await resolver.resolve('missing.com')
+    assert fake.queries == ['missing.com']
+    assert lookups('negative_hit') == negative_hits + 2
+
+    await asyncio.sleep(0.05)
+    fake.addresses['missing.com'] = '10.0.0.2'
+    (answer,) = await resolver.resolve('missing.com')
+    assert answer['host'] == '10.0.0.2'
+
+
+@pytest.mark.asyncio
+async def test_wb_hot_host_refreshed_before_expiry() -> None:
+    fake = FakeResolver({'service.com': '10.0.0.1'})
+    resolver = CachingResolver(fake, ttl=0.1, prefetch=0.06)
+    await resolver.resolve('service.com')
+    # Outside the prefetch window
+    await resolver.resolve('service.com')
+    assert len(fake.queries) == 1
+
+    await asyncio.sleep(0.05)
+    fake.addresses['service.com'] = '10.0.0.3'
+    (answer,) = await resolver.resolve('service.com')
+    # Answered from the cache while the refresh runs in the background
+    assert answer['host'] == '10.0.0.1'
+    await asyncio.sleep(0)
+    assert len(fake.queries) == 2
+
+    await asyncio.sleep(0.06)
+    (answer,) = await resolver.resolve('service.com')
+    # The refreshed answer, without waiting for a query
+    assert answer['host'] == '10.0.0.3'
+    assert len(fake.queries) == 2
+
+
+@pytest.mark.asyncio
+async def test_wb_failed_refresh_keeps_answer() -> None:
+    fake = FakeResolver({'service.com': '10.0.0.1'})
+    resolver = CachingResolver(fake, ttl=0.1, prefetch=0.1)
+    await resolver.resolve('service.com')
+    del fake.addresses['service.com']
+    await resolver.resolve('service.com')
+    await asyncio.sleep(0.01)
+    assert len(fake.queries) == 2
+    (answer,) = await resolver.resolve('service.com')
+    assert answer['host'] == '10.0.0.1'
+
+
+@pytest.mark.asyncio
+async def test_wb_addresses_rotate() -> None:
+    fake = FakeResolver({'service.com': ['10.0.0.1', '10.0.0.2', '10.0.0.3']})
+    resolver = CachingResolver(fake)
+
+    first = [[answer['host'] for answer in await resolver.resolve('service.com')] for _ in range(4)]
+    assert first == [
+        ['10.0.0.1', '10.0.0.2', '10.0.0.3'],
+        ['10.0.0.2', '10.0.0.3', '10.0.0.1'],
+        ['10.0.0.3', '10.0.0.1', '10.0.0.2'],
+        ['10.0.0.1', '10.0.0.2', '10.0.0.3'],
+    ]
+    assert fake.queries == ['service.com']
+
+
+@pytest.mark.asyncio
+async def test_ut_oldest_host_dropped() -> None:
+    fake = FakeResolver({'a.com': '10.0.0.1', 'b.com': '10.0.0.2', 'c.com': '10.0.0.3'})
+    resolver = CachingResolver(fake, max_hosts=2)
+    for host in ('a.com', 'b.com', 'c.com', 'a.com'):
+        await resolver.resolve(host)
+    assert fake.queries == ['a.com', 'b.com', 'c.com', 'a.com']
+    assert resolver.cached_hosts() == 2
+
+
+@pytest.mark.asyncio
+async def test_wb_client_closes_resolver() -> None:
+    fake = FakeResolver({})
+    ac = AsyncClient(resolver=fake)
+    assert ac.connector._resolver is fake
+    assert ac.client is not None
+    await ac.close_client()
+    assert fake.closed
+    assert isinstance(AsyncClient().resolver, CachingResolver)
@@ -0,0 +1,122 @@
+import asyncio
+from time import monotonic
+from typing import List
+
+import pytest
+
+from notify_aia.clients.scheduler import RetryRecord, RetryScheduler
+
+
+def record(url: str) -> RetryRecord:
+    return RetryRecord(url, 'localhost', 'token', {}, 2, monotonic())
+
+
+@pytest.mark.asyncio
+async def test_wb_scheduler_delivers_in_due_order() -> None:
+    delivered: List[str] = []
+
+    async def deliver(rec: RetryRecord) -> None:
+        delivered.append(rec.url)
+
+    scheduler = RetryScheduler(deliver, workers=1)
+    await scheduler.start()
+    now = monotonic()
+    scheduler.schedule(record('late'), now + 0.06)
+    scheduler.schedule(record('early'), now + 0.02)
+    scheduler.schedule(record('now'), now)
+    assert scheduler.pending() == 3
+    await asyncio.sleep(0.1)
+    assert delivered == ['now', 'early', 'late']
+    assert scheduler.pending() == 0
+    await scheduler.stop()
+
+
+@pytest.mark.asyncio
+async def test_wb_scheduler_earlier_record_wakes_timer() -> None:
+    delivered: List[str] = []
+
+    async def deliver(rec: RetryRecord) -> None:
+        delivered.append(rec.url)
+
+    scheduler = RetryScheduler(deliver)
+    await scheduler.start()
+    scheduler.schedule(record('far'), monotonic() + 60)
+    await asyncio.sleep(0.01)
+    # The timer is sleeping for 60 seconds, not polling
+    scheduler.schedule(record('soon'), monotonic())
+    await asyncio.sleep(0.01)
+    assert delivered == ['soon']
+    assert scheduler.pending() == 1
+    await scheduler.stop()
+    assert not scheduler.running
+
+
+@pytest.mark.asyncio
+async def test_wb_scheduler_bounds_concurrent_deliveries() -> None:
+    in_flight = 0
+    peak = 0
+
+    async def deliver(rec: RetryRecord) -> None:
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+
+    scheduler = RetryScheduler(deliver, workers=3)
+    for _ in range(12):
+        scheduler.schedule(record('x'), monotonic())
+    await asyncio.sleep(0.1)
+    assert peak == 3
+    assert scheduler.pending() == 0
+    await scheduler.stop()
+
+
+@pytest.mark.asyncio
+async def test_ut_scheduler_survives_deliver_exception() -> None:
+    delivered: List[str] = []
+
+    async def deliver(rec: RetryRecord) -> None:
+        if rec.url == 'bad':
+            raise RuntimeError('boom')
+        delivered.append(rec.url)
+
+    scheduler = RetryScheduler(deliver, workers=1)
+    scheduler.schedule(record('bad'), monotonic())
+    scheduler.schedule(record('good'), monotonic())
+    await asyncio.sleep(0.02)
+    assert delivered == ['good']
+    await scheduler.stop()
+
+
+def test_ut_retry_record_has_no_dict() -> None:
+    assert not hasattr(record('x'), '__dict__')
+
+
+@pytest.mark.asyncio
+async def test_wb_scheduler_pause_hands_over_pending() -> None:
+    release = asyncio.Event()
+    delivered: List[str] = []
+
+    async def deliver(rec: RetryRecord) -> None:
+        delivered.append(rec.url)
+        await release.wait()
+
+    scheduler = RetryScheduler(deliver, workers=1)
+    await scheduler.start()
+    now = monotonic()
+    scheduler.schedule(record('attempting'), now)
+    scheduler.schedule(record('ready'), now)
+    scheduler.schedule(record('waiting'), now + 60)
+    await asyncio.sleep(0.01)
+    assert scheduler.attempting == 1
+
+    scheduler.pause()
+    release.set()
+    await asyncio.sleep(0.01)
+    # The attempt in progress finished, nothing else was started
+    assert delivered == ['attempting']
+    assert scheduler.attempting == 0
+    assert [rec.url for _, rec in scheduler.take_pending()] == ['ready', 'waiting']
+    assert scheduler.pending() == 0
+    await scheduler.stop()
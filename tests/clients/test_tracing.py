@@ -0,0 +1,75 @@
+import asyncio
+from typing import Any, AsyncGenerator, Dict, List
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+
+from notify_aia.clients.callback.processing import CallbackAsyncClient
+from notify_aia.clients.tracing import MetricsPhaseSink, RequestPhases, SlowRequestLogSink, SpanExportSink
+from notify_aia.metrics import PHASE_LATENCY
+
+
+@pytest_asyncio.fixture()
+async def server_url() -> AsyncGenerator[str, Any]:
+    async def handler(request: web.Request) -> web.Response:
+        await asyncio.sleep(0.02)
+        return web.Response(text='ok')
+
+    app = web.Application()
+    app.router.add_post('/callback', handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    yield f'http://127.0.0.1:{port}/callback'
+    await runner.cleanup()
+
+
+@pytest.mark.asyncio
+async def test_wb_tracing_disabled_by_default() -> None:
+    client = CallbackAsyncClient()
+    assert client.trace_configs == []
+    assert client.client.trace_configs == []
+    await client.close_client()
+
+
+@pytest.mark.asyncio
+async def test_wb_trace_sinks_receive_phases(server_url: str) -> None:
+    phases: List[RequestPhases] = []
+    spans: List[Dict[str, Any]] = []
+    client = CallbackAsyncClient(
+        trace_sinks=[phases.append, MetricsPhaseSink(), SlowRequestLogSink(0.0), SpanExportSink(spans.append)],
+    )
+    for _ in range(2):
+        async with client.client.post(server_url, data=b'{}') as resp:
+            assert resp.status == 200
+            await resp.read()
+    await client.close_client()
+
+    first, second = phases
+    assert (first.status, first.reused, second.reused) == (200, False, True)
+    assert first.connect > 0
+    assert second.connect == 0
+    for timing in phases:
+        # The handler sleeps before responding
+        assert timing.first_byte >= 0.02
+        assert timing.total >= timing.queued + timing.dns + timing.connect + timing.first_byte
+    assert PHASE_LATENCY.collect()[('127.0.0.1', 'first_byte')][-1] >= 2
+
+    span = spans[0]
+    assert span['attributes']['http.response.status_code'] == 200
+    assert [event['name'] for event in span['events']] == ['queued', 'dns', 'connect', 'request_sent', 'first_byte']
+    assert span['end_time_unix_nano'] >= span['events'][-1]['time_unix_nano'] - 1000
+
+
+@pytest.mark.asyncio
+async def test_ut_trace_sink_exception_is_contained(server_url: str) -> None:
+    def broken(phases: RequestPhases) -> None:
+        raise RuntimeError('boom')
+
+    client = CallbackAsyncClient(trace_sinks=[broken])
+    async with client.client.post(server_url, data=b'{}') as resp:
+        assert resp.status == 200
+    await client.close_client()
@@ -1,12 +1,15 @@
 import datetime
-from typing import Any, Callable, Generator, Tuple
+from typing import Any, Callable, Dict, Generator, Tuple
+from unittest.mock import AsyncMock, MagicMock
 from uuid import uuid4
 
+import aiohttp
 import pytest
 from cryptography.fernet import Fernet
 from itsdangerous import URLSafeSerializer
 
 from notify_aia import Naia
+from notify_aia.clients.callback.processing import CallbackAsyncClient
 from notify_aia.clients.callback.rest import RequestPayload
 
 
@@ -40,6 +43,28 @@ def legacy_verify_str(enc_key: Tuple[str]) -> Generator[Callable[[str], str], An
     yield _wrapper
 
 
+@pytest.fixture()
+def service_response() -> Generator[Callable[..., MagicMock], Any, Any]:
+    def _wrapper(status: int = 200, body: bytes = b'', reason: str = 'OK') -> MagicMock:
+        # What client.post returns, the body arrives in chunks of at most 4 bytes
+        stream = bytearray(body)
+
+        async def read(n: int = 4) -> bytes:
+            chunk = bytes(stream[: min(n, 4)])
+            del stream[: len(chunk)]
+            return chunk
+
+        resp = MagicMock(status=status, reason=reason)
+        resp.content.read = AsyncMock(side_effect=read)
+        resp.content.readany = AsyncMock(side_effect=read)
+        resp.raise_for_status.side_effect = aiohttp.ClientResponseError(MagicMock(), (), status=status)
+        context = MagicMock()
+        context.__aenter__.return_value = resp
+        return context
+
+    yield _wrapper
+
+
 @pytest.fixture()
 def delivered_payload() -> RequestPayload:
     return RequestPayload(
@@ -51,3 +76,15 @@ def delivered_payload() -> RequestPayload:
         sent_at=datetime.datetime.now(datetime.UTC),
         notification_type='sms',
     )
+
+
+@pytest.fixture()
+def callback_data(
+    encrypted_str: Callable[[str], str],
+    delivered_payload: RequestPayload,
+) -> Dict[str, Any]:
+    return {
+        'url': 'https://localhost/',
+        'encrypted_token': encrypted_str('some bearer token'),
+        'payload': CallbackAsyncClient._convert_model(delivered_payload),
+    }
@@ -0,0 +1,200 @@
+import asyncio
+from pathlib import Path
+from typing import Any, AsyncGenerator, Callable, Tuple
+from unittest.mock import AsyncMock
+
+import pytest
+import pytest_asyncio
+from pytest_mock import MockerFixture
+
+from notify_aia.clients.callback import processing as naia_processing
+from notify_aia.clients.callback.processing import CallbackAsyncClient
+from notify_aia.clients.callback.rest import RequestCallback, RequestPayload
+from notify_aia.clients.limiter import AdaptiveConcurrencyLimiter
+from notify_aia.queue.base import QueuedJob
+from notify_aia.queue.dispatcher import QueueDispatcher
+from notify_aia.queue.sqlite import SqliteQueueBackend
+
+
+@pytest_asyncio.fixture()
+async def queue(tmp_path: Path) -> AsyncGenerator[SqliteQueueBackend, Any]:
+    queue = SqliteQueueBackend(str(tmp_path / 'naia.db'))
+    await queue.open()
+    yield queue
+    await queue.close()
+
+
+@pytest.fixture()
+def callback_body(
+    enc_key: Tuple[str],
+    encrypted_str: Callable[[str], str],
+    delivered_payload: RequestPayload,
+) -> bytes:
+    callback = RequestCallback(
+        url='https://localhost/',  # type: ignore[arg-type]
+        encrypted_token=encrypted_str('some bearer token'),
+        payload=delivered_payload,
+    )
+    return callback.model_dump_json().encode()
+
+
+async def deliver(dispatcher: QueueDispatcher, job: QueuedJob) -> None:
+    ((callback, bearer_token),) = await dispatcher.callback_client.decode_callbacks([job.body])
+    await dispatcher._deliver(job, callback, bearer_token)
+
+
+@pytest.mark.asyncio
+async def test_wb_deliver_success_completes_job(queue: SqliteQueueBackend, callback_body: bytes) -> None:
+    client = CallbackAsyncClient()
+    client.try_callback_request = AsyncMock(return_value=None)  # type: ignore[method-assign]
+    dispatcher = QueueDispatcher(queue, client)
+    await queue.put([callback_body])
+
+    (job,) = await queue.claim(1)
+    await deliver(dispatcher, job)
+    assert client.try_callback_request.call_args.kwargs['attempt_number'] == 1
+    assert client.try_callback_request.call_args.kwargs['bearer_token'] == 'some bearer token'
+    assert await queue.pending() == 0
+
+
+@pytest.mark.asyncio
+async def test_wb_deliver_retry_is_rescheduled(queue: SqliteQueueBackend, callback_body: bytes) -> None:
+    client = CallbackAsyncClient()
+    client.try_callback_request = AsyncMock(return_value=60.0)  # type: ignore[method-assign]
+    dispatcher = QueueDispatcher(queue, client)
+    await queue.put([callback_body])
+
+    (job,) = await queue.claim(1)
+    await deliver(dispatcher, job)
+    assert await queue.pending() == 1
+    # Not due for another minute
+    assert await queue.claim(1) == []
+
+
+@pytest.mark.asyncio
+async def test_ut_deliver_drops_invalid_job(queue: SqliteQueueBackend) -> None:
+    client = CallbackAsyncClient()
+    client.try_callback_request = AsyncMock()  # type: ignore[method-assign]
+    dispatcher = QueueDispatcher(queue, client)
+    await queue.put([b'{"not": "a callback"}'])
+
+    (job,) = await queue.claim(1)
+    await deliver(dispatcher, job)
+    client.try_callback_request.assert_not_called()
+    assert await queue.pending() == 0
+
+
+@pytest.mark.asyncio
+async def test_ut_deliver_drops_invalid_token(queue: SqliteQueueBackend, callback_body: bytes) -> None:
+    client = CallbackAsyncClient()
+    client.try_callback_request = AsyncMock()  # type: ignore[method-assign]
+    dispatcher = QueueDispatcher(queue, client)
+    callback = RequestCallback.model_validate_json(callback_body)
+    await queue.put([callback.model_copy(update={'encrypted_token': 'not a token'}).model_dump_json().encode()])
+
+    (job,) = await queue.claim(1)
+    await deliver(dispatcher, job)
+    client.try_callback_request.assert_not_called()
+    assert await queue.pending() == 0
+
+
+@pytest.mark.asyncio
+async def test_wb_busy_host_jobs_are_parked(queue: SqliteQueueBackend, callback_body: bytes) -> None:
+    client = CallbackAsyncClient()
+    client.set_concurrency_limiter(AdaptiveConcurrencyLimiter(initial_limit=1))
+    client.try_callback_request = AsyncMock(return_value=None)  # type: ignore[method-assign]
+    dispatcher = QueueDispatcher(queue, client)
+    await queue.put([callback_body] * 3)
+    jobs = await queue.claim(3)
+    writes = queue.writes
+
+    await dispatcher._dispatch(jobs)
+    await asyncio.gather(*dispatcher._in_flight)
+    # One attempt for the host's one slot, the others wait in memory without holding a slot or being rewritten
+    assert client.try_callback_request.call_count == 1
+    assert dispatcher.parked == 2
+    assert queue.writes == writes + 1
+
+    for _ in range(2):
+        await dispatcher._unpark()
+        await asyncio.gather(*dispatcher._in_flight)
+    assert client.try_callback_request.call_count == 3
+    assert dispatcher.parked == 0
+    assert await queue.pending() == 0
+
+
+@pytest.mark.asyncio
+async def test_wb_saturated_host_jobs_are_not_rewritten(
+    queue: SqliteQueueBackend, callback_body: bytes, mocker: MockerFixture
+) -> None:
+    client = CallbackAsyncClient()
+    mocker.patch.object(client, 'host_capacity', return_value=0)
+    client.try_callback_request = AsyncMock(return_value=None)  # type: ignore[method-assign]
+    dispatcher = QueueDispatcher(queue, client, concurrency=10, max_parked=20, defer_seconds=60)
+    await queue.put([callback_body] * 50)
+    writes = queue.writes
+
+    dispatcher._task = asyncio.create_task(dispatcher._run())
+    await asyncio.sleep(0.3)
+    await dispatcher.drain()
+    client.try_callback_request.assert_not_called()
+    assert dispatcher.parked == 20
+    # Nothing was rewritten while the host was busy, and claiming stopped once enough jobs were waiting
+    assert queue.writes == writes
+    assert len(await queue.claim(50)) == 30
+
+    await dispatcher.stop()
+    await queue.open()
+    assert [job.attempts for job in await queue.claim(50)] == [0] * 50
+
+
+@pytest.mark.asyncio
+async def test_wb_parked_jobs_are_written_back_after_park_seconds(
+    queue: SqliteQueueBackend, callback_body: bytes, mocker: MockerFixture
+) -> None:
+    client = CallbackAsyncClient()
+    mocker.patch.object(client, 'host_capacity', return_value=0)
+    dispatcher = QueueDispatcher(queue, client, park_seconds=0.05, defer_seconds=0)
+    await queue.put([callback_body] * 2)
+
+    await dispatcher._dispatch(await queue.claim(2))
+    assert dispatcher.parked == 2
+    await asyncio.sleep(0.06)
+    await dispatcher._unpark()
+    assert dispatcher.parked == 0
+    assert [job.attempts for job in await queue.claim(2)] == [0, 0]
+
+
+@pytest.mark.asyncio
+async def test_wb_decode_callbacks_decrypts_batch_once(
+    queue: SqliteQueueBackend, callback_body: bytes, mocker: MockerFixture
+) -> None:
+    spy = mocker.spy(naia_processing, 'decrypt_many_async')
+    await queue.put([callback_body, b'garbage', callback_body])
+
+    prepared = await CallbackAsyncClient.decode_callbacks([job.body for job in await queue.claim(3)])
+    spy.assert_called_once()
+    assert [bearer_token for _, bearer_token in prepared] == ['some bearer token', None, 'some bearer token']
+
+
+@pytest.mark.asyncio
+async def test_wb_start_drains_existing_jobs(tmp_path: Path, callback_body: bytes) -> None:
+    queue = SqliteQueueBackend(str(tmp_path / 'naia.db'))
+    await queue.open()
+    await queue.put([callback_body] * 3)
+    await queue.close()
+
+    client = CallbackAsyncClient()
+    client.try_callback_request = AsyncMock(return_value=None)  # type: ignore[method-assign]
+    dispatcher = QueueDispatcher(queue, client, concurrency=2, poll_interval=0.01)
+    await dispatcher.start()
+    for _ in range(100):
+        if client.try_callback_request.call_count == 3:
+            break
+        await asyncio.sleep(0.01)
+    await dispatcher.stop()
+    assert client.try_callback_request.call_count == 3
+
+    await queue.open()
+    assert await queue.pending() == 0
+    await queue.close()
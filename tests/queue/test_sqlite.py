@@ -0,0 +1,107 @@
+import asyncio
+from pathlib import Path
+from time import time
+
+import pytest
+
+from notify_aia.queue.sqlite import SqliteQueueBackend
+
+
+@pytest.fixture()
+def db_path(tmp_path: Path) -> str:
+    return str(tmp_path / 'naia.db')
+
+
+@pytest.mark.asyncio
+async def test_wb_put_claim_complete(db_path: str) -> None:
+    queue = SqliteQueueBackend(db_path)
+    await queue.open()
+    await queue.put([b'one', b'two'])
+    assert await queue.pending() == 2
+
+    jobs = await queue.claim(10)
+    assert [job.body for job in jobs] == [b'one', b'two']
+    assert all(job.attempts == 0 for job in jobs)
+    # Leased jobs are not handed out twice
+    assert await queue.claim(10) == []
+
+    await queue.complete([job.job_id for job in jobs])
+    assert await queue.pending() == 0
+    await queue.close()
+
+
+@pytest.mark.asyncio
+async def test_wb_claim_respects_limit_and_due_at(db_path: str) -> None:
+    queue = SqliteQueueBackend(db_path)
+    await queue.open()
+    await queue.put([b'later'], due_at=time() + 60)
+    await queue.put([b'a', b'b', b'c'])
+
+    jobs = await queue.claim(2)
+    assert [job.body for job in jobs] == [b'a', b'b']
+    assert [job.body for job in await queue.claim(10)] == [b'c']
+    await queue.close()
+
+
+@pytest.mark.asyncio
+async def test_wb_retry_reschedules(db_path: str) -> None:
+    queue = SqliteQueueBackend(db_path)
+    await queue.open()
+    await queue.put([b'flaky'])
+    (job,) = await queue.claim(1)
+
+    await queue.retry(job.job_id, 1, time() + 60)
+    assert await queue.claim(1) == []
+    await queue.retry(job.job_id, 2, time())
+    (job,) = await queue.claim(1)
+    assert job.attempts == 2
+    await queue.close()
+
+
+@pytest.mark.asyncio
+async def test_wb_reopen_resumes_leased_and_scheduled_jobs(db_path: str) -> None:
+    queue = SqliteQueueBackend(db_path)
+    await queue.open()
+    await queue.put([b'in flight', b'retrying'])
+    in_flight, retrying = await queue.claim(2)
+    await queue.retry(retrying.job_id, 3, time())
+    # Simulate a crash - the in flight job is never completed
+    await queue.close()
+
+    queue = SqliteQueueBackend(db_path)
+    await queue.open()
+    jobs = {job.body: job.attempts for job in await queue.claim(10)}
+    assert jobs == {b'in flight': 0, b'retrying': 3}
+    await queue.close()
+
+
+@pytest.mark.asyncio
+async def test_wb_concurrent_puts_share_commits(db_path: str) -> None:
+    queue = SqliteQueueBackend(db_path)
+    await queue.open()
+
+    await asyncio.gather(*(queue.put([str(i).encode()]) for i in range(50)))
+    assert await queue.pending() == 50
+    assert queue.writes == 50
+    assert queue.commits < 5
+    await queue.close()
+
+
+@pytest.mark.asyncio
+async def test_wb_put_wakes_waiters(db_path: str) -> None:
+    queue = SqliteQueueBackend(db_path)
+    await queue.open()
+
+    waiter = asyncio.create_task(queue.wait_for_jobs(10))
+    await queue.put([b'wake up'])
+    await asyncio.wait_for(waiter, 1)
+    await queue.close()
+
+
+@pytest.mark.asyncio
+async def test_ut_use_before_open(db_path: str) -> None:
+    queue = SqliteQueueBackend(db_path)
+    with pytest.raises(RuntimeError, match='open'):
+        await queue.claim(1)
+    with pytest.raises(RuntimeError, match='open'):
+        await queue.wait_for_jobs(0)
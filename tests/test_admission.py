@@ -0,0 +1,124 @@
+import asyncio
+import time
+from typing import Any, Dict, Tuple
+
+import pytest
+from fastapi.testclient import TestClient
+
+from notify_aia.admission import Admission, AdmissionController
+from notify_aia.clients.callback.processing import CallbackRecord
+from notify_aia.naia import Naia
+
+
+def test_ut_admission_accept() -> None:
+    assert AdmissionController().check() is Admission.ACCEPT
+
+
+def test_wb_admission_in_flight_limits() -> None:
+    admission = AdmissionController(soft_in_flight=2, hard_in_flight=4)
+    admission.admit(2, 100)
+    assert admission.check() is Admission.THROTTLE
+    admission.admit(2, 100)
+    assert admission.check() is Admission.SHED
+    admission.release(4, 200)
+    assert admission.check() is Admission.ACCEPT
+    assert admission.stats() == {'draining': False, 'in_flight': 0, 'queued_bytes': 0, 'loop_lag': 0.0}
+
+
+def test_wb_admission_queued_bytes_sources() -> None:
+    admission = AdmissionController(soft_queued_bytes=1_000, hard_queued_bytes=2_000)
+    retries = {'count': 3, 'bytes': 1_500}
+    admission.add_sources(lambda: retries['count'], lambda: retries['bytes'])
+    admission.admit(1, 100)
+    assert (admission.in_flight(), admission.queued_bytes()) == (4, 1_600)
+    assert admission.check() is Admission.THROTTLE
+    retries['bytes'] = 2_000
+    assert admission.check() is Admission.SHED
+
+
+def test_wb_admission_loop_lag_limits() -> None:
+    admission = AdmissionController(soft_loop_lag=0.1, hard_loop_lag=0.5)
+    admission.loop_lag = 0.2
+    assert admission.check() is Admission.THROTTLE
+    admission.loop_lag = 0.6
+    assert admission.check() is Admission.SHED
+
+
+@pytest.mark.asyncio
+async def test_wb_admission_samples_loop_lag() -> None:
+    admission = AdmissionController(lag_interval=0.01)
+    await admission.start()
+    await asyncio.sleep(0.02)
+    # Block the loop so the next sample wakes late
+    time.sleep(0.1)
+    await asyncio.sleep(0.02)
+    await admission.stop()
+    assert admission.loop_lag > 0.01
+    assert admission._monitor is None
+
+
+@pytest.mark.asyncio
+async def test_wb_admission_counts_scheduled_retries(get_app: Naia, enc_key: Tuple[str]) -> None:
+    get_app.initialize_app(enc_key)
+    scheduler = get_app.callback_client.retry_scheduler
+    record = CallbackRecord('https://localhost/', 'localhost', 'token', b'{"a":1}', 2, 0.0)
+    scheduler.schedule(record, due=time.monotonic() + 60)
+    assert (get_app.admission.in_flight(), get_app.admission.queued_bytes()) == (1, 7)
+    await scheduler.stop()
+
+
+@pytest.mark.asyncio
+async def test_wb_send_throttled(get_app: Naia, enc_key: Tuple[str], callback_data: Dict[str, Any]) -> None:
+    get_app.initialize_app(enc_key, admission=AdmissionController(soft_in_flight=1, retry_after=3))
+    get_app.admission.admit(1, 0)
+    client = TestClient(get_app)
+
+    response = client.post('/callback/send', json=callback_data)
+    assert response.status_code == 429
+    assert response.headers['retry-after'] == '3'
+    assert client.get('/ready').status_code == 503
+
+
+@pytest.mark.asyncio
+async def test_wb_send_stream_shed(get_app: Naia, enc_key: Tuple[str]) -> None:
+    get_app.initialize_app(enc_key, admission=AdmissionController(soft_in_flight=1, hard_in_flight=1))
+    get_app.admission.admit(1, 0)
+    client = TestClient(get_app)
+
+    response = client.post('/callback/send-stream', content=b'not read\n')
+    assert response.status_code == 503
+    assert response.headers['retry-after'] == '1'
+    assert 'naia_admission_rejections_total{decision="shed"}' in client.get('/metrics').text
+
+
+@pytest.mark.asyncio
+async def test_wb_send_batch_released(get_app: Naia, enc_key: Tuple[str], callback_data: Dict[str, Any]) -> None:
+    get_app.initialize_app(enc_key)
+    sent = []
+
+    async def send_records(records: Any) -> None:
+        sent.append(get_app.admission.stats())
+
+    get_app.callback_client.send_records = send_records  # type: ignore[method-assign]
+    client = TestClient(get_app)
+
+    response = client.post('/callback/send-batch', json=[callback_data] * 2)
+    assert response.status_code == 202
+    # Counted while the first attempts are made, released after
+    assert sent[0]['in_flight'] == 2
+    assert sent[0]['queued_bytes'] == int(response.request.headers['content-length'])
+    assert get_app.admission.in_flight() == 0
+
+
+@pytest.mark.asyncio
+async def test_wb_ready(get_app: Naia, enc_key: Tuple[str]) -> None:
+    get_app.initialize_app(enc_key)
+    response = TestClient(get_app).get('/ready')
+    assert response.status_code == 200
+    assert response.json() == {
+        'status': 'accept',
+        'draining': False,
+        'in_flight': 0,
+        'queued_bytes': 0,
+        'loop_lag': 0.0,
+    }
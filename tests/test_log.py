@@ -0,0 +1,87 @@
+import io
+import threading
+from typing import List
+
+import ujson
+
+from notify_aia import log as naia_log
+from notify_aia.log import LogPipeline
+
+
+class BlockingStream(io.StringIO):
+    def __init__(self) -> None:
+        super().__init__()
+        self.release = threading.Event()
+
+    def write(self, s: str) -> int:
+        self.release.wait(5)
+        return super().write(s)
+
+
+def lines(stream: io.StringIO) -> List[dict]:
+    return [ujson.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_wb_pipeline_writes_json_lines() -> None:
+    stream = io.StringIO()
+    pipeline = LogPipeline(stream=stream)
+    assert pipeline.emit('info', 'callback.post', {'url': 'https://localhost/', 'error': ValueError('nope')})
+    pipeline.close()
+    (line,) = lines(stream)
+    assert line['level'] == 'info'
+    assert line['event'] == 'callback.post'
+    assert line['url'] == 'https://localhost/'
+    # Fields are formatted on the writer thread
+    assert line['error'] == 'nope'
+    assert pipeline.stats()['written'] == 1
+
+
+def test_ut_pipeline_filters_level() -> None:
+    stream = io.StringIO()
+    pipeline = LogPipeline(stream=stream, level='warning')
+    assert not pipeline.emit('info', 'callback.post', {})
+    assert pipeline.emit('error', 'callback.gave_up', {})
+    pipeline.close()
+    assert [line['event'] for line in lines(stream)] == ['callback.gave_up']
+
+
+def test_wb_pipeline_samples_events() -> None:
+    stream = io.StringIO()
+    pipeline = LogPipeline(stream=stream, sample_rates={'callback.post': 0.0})
+    for _ in range(10):
+        pipeline.emit('info', 'callback.post', {})
+    pipeline.emit('info', 'callback.response', {})
+    pipeline.close()
+    assert [line['event'] for line in lines(stream)] == ['callback.response']
+    assert pipeline.stats()['sampled'] == 10
+
+
+def test_wb_pipeline_rate_limits_events() -> None:
+    stream = io.StringIO()
+    pipeline = LogPipeline(stream=stream, rate_limits={'callback.post': 5})
+    for _ in range(20):
+        pipeline.emit('info', 'callback.post', {})
+    pipeline.close()
+    assert len(lines(stream)) == 5
+    assert pipeline.stats()['rate_limited'] == 15
+
+
+def test_wb_pipeline_drops_when_full() -> None:
+    stream = BlockingStream()
+    pipeline = LogPipeline(stream=stream, max_queue=3)
+    results = [pipeline.emit('info', 'callback.post', {'i': i}) for i in range(10)]
+    # The writer holds at most one batch, the queue the rest, emit never waits
+    assert results.count(False) == pipeline.stats()['dropped'] >= 6
+    stream.release.set()
+    pipeline.close()
+    assert pipeline.stats()['written'] == results.count(True)
+
+
+def test_wb_init_logging_replaces_pipeline() -> None:
+    stream = io.StringIO()
+    naia_log.init_logging(stream=stream, level='debug')
+    naia_log.log('debug', 'callback.post', url='https://localhost/')
+    naia_log.close_logging()
+    assert [line['event'] for line in lines(stream)] == ['callback.post']
+    assert naia_log.log_stats()['written'] == 1
+    naia_log.init_logging()
@@ -0,0 +1,93 @@
+import threading
+from typing import Any, Dict, Tuple
+
+import pytest
+from fastapi.testclient import TestClient
+
+from notify_aia.metrics import OTHER_HOST, HostLabels, MetricsRegistry
+from notify_aia.naia import Naia
+
+
+def test_wb_counter_render() -> None:
+    registry = MetricsRegistry()
+    retries = registry.counter('naia_test_retries_total', 'Retries', labels=('reason',))
+    retries.inc('503')
+    retries.inc('503')
+    retries.inc('Time"out', amount=2.5)
+    assert retries.collect() == {('503',): 2.0, ('Time"out',): 2.5}
+    assert list(retries.render()) == [
+        '# HELP naia_test_retries_total Retries',
+        '# TYPE naia_test_retries_total counter',
+        'naia_test_retries_total{reason="503"} 2',
+        'naia_test_retries_total{reason="Time\\"out"} 2.5',
+    ]
+
+
+def test_wb_histogram_render() -> None:
+    registry = MetricsRegistry()
+    latency = registry.histogram('naia_test_seconds', 'Latency', labels=('host',), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        latency.observe(value, 'localhost')
+    assert list(latency.render())[2:] == [
+        'naia_test_seconds_bucket{host="localhost",le="0.1"} 2',
+        'naia_test_seconds_bucket{host="localhost",le="1"} 3',
+        'naia_test_seconds_bucket{host="localhost",le="+Inf"} 4',
+        'naia_test_seconds_sum{host="localhost"} 3.65',
+        'naia_test_seconds_count{host="localhost"} 4',
+    ]
+
+
+def test_ut_metric_label_count_checked() -> None:
+    counter = MetricsRegistry().counter('naia_test_total', 'Total', labels=('reason',))
+    with pytest.raises(ValueError, match='expects labels'):
+        counter.inc()
+
+
+def test_wb_metrics_merge_thread_shards() -> None:
+    counter = MetricsRegistry().counter('naia_test_total', 'Total')
+
+    def record() -> None:
+        for _ in range(1000):
+            counter.inc()
+
+    threads = [threading.Thread(target=record) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert counter.collect() == {(): 4000.0}
+
+
+def test_ut_host_labels_capped() -> None:
+    hosts = HostLabels(max_hosts=2)
+    assert [hosts(host) for host in ('a', 'b', 'c', 'a', 'd')] == ['a', 'b', OTHER_HOST, 'a', OTHER_HOST]
+
+
+@pytest.mark.asyncio
+async def test_wb_gauge_reads_awaitable() -> None:
+    registry = MetricsRegistry()
+
+    async def depth() -> int:
+        return 7
+
+    registry.gauge('naia_test_depth', 'Depth', depth)
+    assert (await registry.render()).endswith('naia_test_depth 7\n')
+
+
+@pytest.mark.asyncio
+async def test_wb_metrics_route(get_app: Naia, enc_key: Tuple[str], callback_data: Dict[str, Any]) -> None:
+    get_app.initialize_app(encryption_keys=enc_key)
+    get_app.callback_client.send_record = _noop  # type: ignore[method-assign]
+    client = TestClient(get_app)
+    client.post('/callback/send', json=callback_data)
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/plain; version=0.0.4')
+    assert 'naia_ingest_latency_seconds_count{route="/callback/send",status="202"}' in response.text
+    assert 'naia_callbacks_in_flight 0' in response.text
+    assert 'naia_retries_scheduled 0' in response.text
+
+
+async def _noop(*args: Any, **kwargs: Any) -> None:
+    pass
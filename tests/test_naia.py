@@ -1,12 +1,21 @@
-from typing import Tuple
+import asyncio
+import os
+from pathlib import Path
+from time import monotonic
+from typing import List, Tuple
 
 import pytest
+from pydantic.networks import HttpUrl
 from pytest_mock import MockerFixture
 
 from notify_aia import Naia
+from notify_aia.admission import Admission
 from notify_aia.clients.async_client import AsyncClient
 from notify_aia.clients.callback.processing import CallbackAsyncClient
-from notify_aia.clients.callback.rest import callback_router
+from notify_aia.clients.callback.rest import RequestPayload, callback_router
+from notify_aia.queue.dispatcher import QueueDispatcher
+from notify_aia.queue.sqlite import SqliteQueueBackend
+from notify_aia.services import LifespanService
 
 
 def test_wb_empty_init(get_app: Naia) -> None:
@@ -80,3 +89,82 @@ async def test_ut_routers_manual_setup(get_app: Naia, enc_key: Tuple[str], mocke
     get_app.initialize_app(encryption_keys=enc_key, routers=(callback_router,))
     # Should have one router (the default)
     mock_routers.assert_called_once()
+
+
+class RecordingService(LifespanService):
+    def __init__(self, name: str, events: List[str]) -> None:
+        self.name = name
+        self.events = events
+
+    async def start(self) -> None:
+        self.events.append(f'start {self.name}')
+
+    async def stop(self) -> None:
+        self.events.append(f'stop {self.name}')
+
+
+@pytest.mark.asyncio
+async def test_wb_naia_lifespan_services(get_app: Naia, enc_key: Tuple[str]) -> None:
+    events: List[str] = []
+    get_app.initialize_app(enc_key)
+    get_app.add_service(RecordingService('first', events))
+    get_app.add_service(RecordingService('second', events))
+    async with get_app.lifespan(get_app):
+        assert events == ['start first', 'start second']
+    assert events[2:] == ['stop second', 'stop first']
+
+
+def test_wb_naia_lifespan_is_default(get_app: Naia) -> None:
+    assert get_app.router.lifespan_context == get_app.lifespan
+
+
+@pytest.mark.asyncio
+async def test_wb_initialize_app_callback_queue(get_app: Naia, enc_key: Tuple[str], tmp_path: Path) -> None:
+    queue = SqliteQueueBackend(str(tmp_path / 'naia.db'))
+    get_app.initialize_app(enc_key, callback_queue=queue)
+    assert get_app.callback_queue is queue
+    scheduler, admission, dispatcher = get_app._services
+    assert admission is get_app.admission
+    assert scheduler is get_app.callback_client.retry_scheduler
+    assert isinstance(dispatcher, QueueDispatcher)
+    async with get_app.lifespan(get_app):
+        assert await queue.pending() == 0
+
+
+@pytest.mark.asyncio
+async def test_wb_naia_drain_spills_retries(
+    get_app: Naia,
+    enc_key: Tuple[str],
+    tmp_path: Path,
+    delivered_payload: RequestPayload,
+) -> None:
+    path = str(tmp_path / 'retries.jsonl')
+    get_app.initialize_app(enc_key, retry_spill_path=path)
+    client = get_app.callback_client
+    async with get_app.lifespan(get_app):
+        record = client._new_record(HttpUrl('https://localhost/'), 'token', delivered_payload)
+        client.retry_scheduler.schedule(record, monotonic() + 60)
+    # Shed while the app shuts down
+    assert get_app.admission.check() is Admission.SHED
+    assert os.path.exists(path)
+
+    app = Naia()
+    app.initialize_app(enc_key, retry_spill_path=path)
+    async with app.lifespan(app):
+        assert app.callback_client.retry_scheduler.pending() == 1
+        app.callback_client.retry_scheduler.take_pending()
+
+
+@pytest.mark.asyncio
+async def test_wb_naia_drain_report(get_app: Naia, enc_key: Tuple[str], delivered_payload: RequestPayload) -> None:
+    get_app.initialize_app(enc_key, drain_deadline=0.1)
+    client = get_app.callback_client
+    record = client._new_record(HttpUrl('https://localhost/'), 'token', delivered_payload)
+    client.retry_scheduler.schedule(record, monotonic() + 60)
+    # One attempt finishes while draining, one is cut off at the deadline
+    get_app.admission.admit(2, 0)
+    asyncio.get_running_loop().call_later(0.01, get_app.admission.release, 1, 0)
+
+    # Nowhere to spill the waiting retry
+    assert await get_app.drain() == {'drained': 1, 'spilled': 0, 'lost': 2}
+    await client.retry_scheduler.stop()